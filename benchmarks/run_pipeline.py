@@ -0,0 +1,219 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+# End-to-end benchmark of run_local_video_generation. Renders synthetic stories of varied lengths
+# against synthetic footage and music and a local TTS stand-in, and writes per-stage wall time,
+# CPU time and peak RSS as JSON so results can be compared across versions.
+#
+#   python -m benchmarks.run_pipeline --words 40 150 400 --modes single multi
+#
+# Needs the ffmpeg binary on PATH, plus Whisper when run with --subtitles whisper.
+
+PROJECT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+DEFAULT_WORK_DIR = os.path.join(PROJECT_PATH, "temp", "benchmarks")
+SCHEMA_VERSION = 1
+
+# (module, function, stage) for every pipeline step that is timed. Functions are looked up through
+# their module at call time, so wrapping the module attribute measures the real code path.
+STAGE_FUNCTIONS = (
+    ('reddit_shorts.main', 'generate_tiktok_tts_for_story', 'tts'),
+    ('reddit_shorts.main', 'generate_reddit_story_image', 'image'),
+    ('reddit_shorts.create_short', '_script_timed_subtitles', 'subtitles'),
+    ('reddit_shorts.create_short', '_load_narration_audio', 'whisper'),
+    ('reddit_shorts.create_short', '_transcribe_to_subtitles', 'whisper'),
+    ('reddit_shorts.create_short', 'music_bed', 'music'),
+    ('reddit_shorts.create_short', '_process_music', 'music'),
+    ('reddit_shorts.create_short', '_mix_audio', 'mix'),
+    ('reddit_shorts.create_short', '_encode', 'encode'),
+)
+# In single-pass mode the mix (and the trim of the cached music bed) is part of the encode's filter graph
+FOLDED_INTO_ENCODE = {'single': ['mix'], 'multi': []}
+
+
+def _command_output(*command: str) -> str | None:
+    try:
+        return subprocess.run(command, capture_output=True, text=True, cwd=PROJECT_PATH, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment_info() -> dict:
+    try:
+        from importlib.metadata import version
+        package_version = version("Reddit_Shorts")
+    except Exception:
+        package_version = None
+    ffmpeg_version = _command_output("ffmpeg", "-version")
+    return {
+        'package_version': package_version,
+        'git_commit': _command_output("git", "rev-parse", "HEAD"),
+        'git_dirty': bool(_command_output("git", "status", "--porcelain", "--untracked-files=no")),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg_version.splitlines()[0] if ffmpeg_version else None,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the short video pipeline stage by stage with synthetic media and a local TTS stand-in.")
+    parser.add_argument("--words", type=int, nargs="+", default=[40, 150, 400], help="Story lengths to render, in words (default: 40 150 400).")
+    parser.add_argument("--modes", nargs="+", choices=("single", "multi"), default=["single", "multi"], help="Render paths to benchmark (default: both).")
+    parser.add_argument("--subtitles", choices=("script", "whisper"), default="script", help="Subtitle timing source (default: script).")
+    parser.add_argument("--whisper-model", default=None, help="Whisper model for --subtitles whisper (default: configured model).")
+    parser.add_argument("--profile", default=None, help="Render profile (default: standard).")
+    parser.add_argument("--repeat", type=int, default=1, help="Renders per story length and mode (default: 1).")
+    parser.add_argument("--tts-latency", type=float, default=0.0, help="Seconds added to every stub TTS request to model the network (default: 0).")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="Where synthetic media is generated and kept between runs.")
+    parser.add_argument("--output", default=None, help="Results file (default: <work-dir>/results/pipeline-<timestamp>.json).")
+    parser.add_argument("--keep-videos", action="store_true", default=False, help="Keep the rendered shorts instead of deleting them after measuring.")
+    return parser.parse_args()
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    from benchmarks.synthetic_media import make_footage, make_music, make_story
+    from benchmarks.stage_metrics import RSSSampler, StageRecorder, HAVE_PROC
+    from benchmarks.tts_stub import StubTTSServer
+
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    print("Generating synthetic footage and music...")
+    footage_path = make_footage(os.path.join(args.work_dir, "media", "bench_footage.mp4"))
+    music_path = make_music(os.path.join(args.work_dir, "media", "bench_music.mp3"))
+
+    stub = StubTTSServer(latency=args.tts_latency).start()
+    # Read by the TTS client on every call. The TTS cache is switched off before reddit_shorts is
+    # imported, so every run pays for synthesis like a first render does.
+    os.environ['TIKTOK_TTS_ENDPOINTS'] = stub.write_endpoints(os.path.join(args.work_dir, "tts_endpoints.json"))
+    os.environ['SHORTS_TTS_CACHE_MB'] = '0'
+
+    import importlib
+    from reddit_shorts import main as pipeline
+    from reddit_shorts import create_short
+    from reddit_shorts.get_reddit_stories import build_story
+
+    # Every story gets the synthetic music bed, whatever music type it is classified as
+    create_short.music = [(music_path, 0.2, music_type) for music_type in ("general", "storytime", "creepy")]
+
+    sampler = RSSSampler().start()
+    recorder = StageRecorder(sampler)
+    for module_name, attr, stage in STAGE_FUNCTIONS:
+        recorder.wrap(importlib.import_module(module_name), attr, stage)
+
+    whisper_load = None
+    if args.subtitles == "whisper":
+        from reddit_shorts.whisper_models import get_whisper_model, whisper_model_stats
+        # Loaded up front so the first story's Whisper stage measures transcription, not the model load
+        get_whisper_model(args.whisper_model)
+        whisper_load = whisper_model_stats()
+
+    runs = []
+    try:
+        for mode in args.modes:
+            for word_count in args.words:
+                for repeat in range(args.repeat):
+                    title, text = make_story(word_count, seed=repeat)
+                    story = build_story(title, text)
+                    print(f"\n=== {mode} pass, {word_count} words, run {repeat + 1}/{args.repeat} ===")
+
+                    recorder.reset()
+                    requests_before = stub.requests
+                    with recorder.measure('total'):
+                        video_path = pipeline.run_local_video_generation(
+                            story=story,
+                            voice='en_us_002',
+                            background_video=footage_path,
+                            single_pass=(mode == "single"),
+                            subtitle_timing=args.subtitles,
+                            whisper_model=args.whisper_model,
+                            render_profile=args.profile,
+                        )
+                    stages = recorder.snapshot()
+                    total = stages.pop('total')
+                    runs.append({
+                        'mode': mode,
+                        'words': word_count,
+                        'repeat': repeat,
+                        'ok': bool(video_path),
+                        'video_seconds': _video_seconds(video_path),
+                        'output_bytes': os.path.getsize(video_path) if video_path and os.path.exists(video_path) else None,
+                        'tts_requests': stub.requests - requests_before,
+                        'total': total,
+                        'stages': stages,
+                        # Negative when stages overlap (the TTS tracks, title card, footage and music run concurrently)
+                        'unattributed_wall_s': round(total['wall_s'] - sum(s['wall_s'] for s in stages.values()), 4),
+                        'folded_into_encode': FOLDED_INTO_ENCODE[mode],
+                    })
+                    _clean_up(video_path, args.keep_videos)
+    finally:
+        sampler.stop()
+        stub.stop()
+
+    return {
+        'schema_version': SCHEMA_VERSION,
+        'benchmark': 'pipeline',
+        'started_at': started_at,
+        'environment': environment_info(),
+        'settings': {
+            'words': args.words,
+            'modes': args.modes,
+            'subtitles': args.subtitles,
+            'whisper_model': args.whisper_model,
+            'profile': args.profile,
+            'repeat': args.repeat,
+            'tts_latency_s': args.tts_latency,
+            'rss_source': 'proc_tree' if HAVE_PROC else 'ru_maxrss',
+        },
+        'whisper_load': whisper_load,
+        'runs': runs,
+    }
+
+
+def _video_seconds(video_path: str | None) -> float | None:
+    if not video_path or not os.path.exists(video_path):
+        return None
+    from reddit_shorts.create_short import get_video_duration
+    return round(get_video_duration(video_path), 3)
+
+
+def _clean_up(video_path: str | None, keep_video: bool) -> None:
+    # Title cards stay in memory (and in the title card cache when a plan is kept), so only the video is left behind
+    if not keep_video and video_path and os.path.exists(video_path):
+        os.remove(video_path)
+
+
+def print_summary(results: dict) -> None:
+    print("\nmode    words  ok    total_s  " + "  ".join(f"{stage:>10}" for stage in ('tts', 'image', 'subtitles', 'whisper', 'music', 'mix', 'encode')))
+    for run in results['runs']:
+        cells = []
+        for stage in ('tts', 'image', 'subtitles', 'whisper', 'music', 'mix', 'encode'):
+            timing = run['stages'].get(stage)
+            cells.append(f"{timing['wall_s']:>10.2f}" if timing else f"{'-':>10}")
+        print(f"{run['mode']:<7} {run['words']:>5}  {str(run['ok']):<5} {run['total']['wall_s']:>8.2f}  " + "  ".join(cells))
+
+
+def run() -> None:
+    args = parse_args()
+    sys.path.insert(0, PROJECT_PATH)
+    started = time.time()
+    results = run_benchmark(args)
+
+    output_path = args.output or os.path.join(
+        args.work_dir, "results", f"pipeline-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print_summary(results)
+    print(f"\nBenchmark finished in {time.time() - started:.1f}s. Results written to {output_path}")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,147 @@
+import functools
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage wall time, CPU time and peak RSS. Most of the pipeline's work happens in ffmpeg child
+# processes, so CPU time includes reaped children and RSS is summed over this process and its
+# descendants. Stages are measured one story at a time, so process-wide counters are attributable.
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+HAVE_PROC = os.path.exists('/proc/self/statm')
+
+
+def _rss_of(pid: str) -> int:
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def tree_rss() -> int:
+    """RSS in bytes of this process plus all its descendants (ffmpeg, ffprobe), read from /proc."""
+    children = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                # The command name may contain spaces; the fields after it are fixed
+                ppid = f.read().rsplit(')', 1)[1].split()[1]
+        except (OSError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(pid)
+
+    total = 0
+    pending = [str(os.getpid())]
+    while pending:
+        pid = pending.pop()
+        total += _rss_of(pid)
+        pending.extend(children.get(pid, ()))
+    return total
+
+
+def max_rss() -> int:
+    """Fallback without /proc: the high-water mark of this process and its largest reaped child, in bytes."""
+    scale = 1 if sys.platform == 'darwin' else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+def cpu_seconds() -> float:
+    """CPU time of this process (all threads) plus its reaped children."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class RSSSampler:
+    """Polls the process tree's RSS in a background thread and tracks the peak for every open measurement."""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self._peaks = {}  # measurement token -> peak bytes
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> 'RSSSampler':
+        if HAVE_PROC:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _sample(self) -> int:
+        rss = tree_rss() if HAVE_PROC else max_rss()
+        with self._lock:
+            for token, peak in self._peaks.items():
+                if rss > peak:
+                    self._peaks[token] = rss
+        return rss
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def open(self) -> object:
+        token = object()
+        with self._lock:
+            self._peaks[token] = 0
+        self._sample()
+        return token
+
+    def close(self, token: object) -> int:
+        self._sample()
+        with self._lock:
+            return self._peaks.pop(token)
+
+
+class StageRecorder:
+    """Accumulates wall time, CPU time, call count and peak RSS per named stage."""
+
+    def __init__(self, sampler: RSSSampler):
+        self.sampler = sampler
+        self.stages = {}
+
+    def reset(self) -> None:
+        self.stages = {}
+
+    @contextmanager
+    def measure(self, stage: str):
+        token = self.sampler.open()
+        wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, cpu_seconds() - cpu_start
+            peak = self.sampler.close(token)
+            totals = self.stages.setdefault(stage, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_bytes': 0})
+            totals['calls'] += 1
+            totals['wall_s'] += wall
+            totals['cpu_s'] += cpu
+            totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'], peak)
+
+    def wrap(self, module, attr: str, stage: str) -> None:
+        """Replaces module.attr with a version that records its calls under `stage`. Callers look the function
+        up through the module at call time, so the pipeline code itself stays untouched."""
+        original = getattr(module, attr)
+
+        @functools.wraps(original)
+        def measured(*args, **kwargs):
+            with self.measure(stage):
+                return original(*args, **kwargs)
+
+        setattr(module, attr, measured)
+
+    def snapshot(self) -> dict:
+        return {
+            stage: {**totals, 'wall_s': round(totals['wall_s'], 4), 'cpu_s': round(totals['cpu_s'], 4)}
+            for stage, totals in self.stages.items()
+        }
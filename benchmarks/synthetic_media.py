@@ -0,0 +1,72 @@
+import os
+import random
+
+import ffmpeg
+
+# Synthetic inputs for the pipeline benchmarks, generated with ffmpeg's lavfi sources so the
+# suite runs without real footage, music or network access. testsrc2 has moving, detailed
+# content, so x264 has about as much work to do as on gameplay footage.
+
+WORDS = (
+    "the", "a", "my", "our", "their", "friend", "neighbor", "roommate", "boss", "sister", "landlord",
+    "apartment", "office", "car", "kitchen", "wedding", "party", "dog", "phone", "money", "week",
+    "told", "asked", "found", "refused", "laughed", "yelled", "left", "called", "borrowed", "promised",
+    "suddenly", "never", "always", "again", "later", "really", "quietly", "honestly", "everyone",
+    "because", "after", "before", "while", "until", "and", "but", "so", "then", "that", "with",
+)
+
+
+def make_footage(path: str, duration: float = 120.0, width: int = 1920, height: int = 1080, fps: int = 30) -> str:
+    """Writes landscape test footage like the gameplay clips in resources/footage. Skipped if it already exists."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        (
+            ffmpeg
+            .input(f'testsrc2=size={width}x{height}:rate={fps}:duration={duration}', f='lavfi')
+            .output(path, **{'c:v': 'libx264', 'preset': 'veryfast', 'crf': '20', 'pix_fmt': 'yuv420p'})
+            .run(overwrite_output=True, quiet=True)
+        )
+    return path
+
+
+def make_music(path: str, duration: float = 45.0) -> str:
+    """Writes a stereo music stand-in. Shorter than long narrations on purpose, so the music loop path is exercised."""
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        left = ffmpeg.input(f'sine=frequency=220:duration={duration}', f='lavfi')
+        right = ffmpeg.input(f'sine=frequency=330:duration={duration}', f='lavfi')
+        (
+            ffmpeg
+            .filter([left, right], 'amerge', inputs=2)
+            .output(path, **{'c:a': 'libmp3lame', 'b:a': '128k', 'ar': 44100})
+            .run(overwrite_output=True, quiet=True)
+        )
+    return path
+
+
+def make_speech_mp3(duration: float) -> bytes:
+    """MP3 bytes in the format the TikTok endpoints return (24 kHz mono), `duration` seconds long."""
+    audio, _ = (
+        ffmpeg
+        .input(f'sine=frequency=180:duration={duration:.3f}', f='lavfi')
+        .output('pipe:', format='mp3', **{'c:a': 'libmp3lame', 'b:a': '64k', 'ar': 24000, 'ac': 1})
+        .run(capture_stdout=True, capture_stderr=True)
+    )
+    return audio
+
+
+def make_story(word_count: int, seed: int = 0) -> tuple[str, str]:
+    """A deterministic title and story body of word_count words, with punctuation so the TTS splitter sees real chunk boundaries."""
+    rng = random.Random(seed * 7919 + word_count)
+    title = f"My {rng.choice(WORDS)} {rng.choice(WORDS)} story ({word_count} words)"
+    sentences = []
+    remaining = word_count
+    while remaining > 0:
+        length = min(remaining, rng.randint(6, 18))
+        words = [rng.choice(WORDS) for _ in range(length)]
+        if length > 8:
+            words[length // 2] += ","
+        sentence = " ".join(words)
+        sentences.append(sentence[0].upper() + sentence[1:] + rng.choice((".", ".", ".", "!", "?")))
+        remaining -= length
+    return title, " ".join(sentences)
@@ -0,0 +1,106 @@
+import base64
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic_media import make_speech_mp3
+
+# Local stand-in for the endpoints in reddit_shorts/tiktok_voice/data/config.json. It speaks the same
+# protocol (POST {"text", "voice"} -> {"<response key>": base64 MP3}) and returns a tone whose length
+# follows the text, at roughly TikTok's speaking rate, so the rest of the pipeline sees realistic durations.
+
+# path -> response key, mirroring the two public endpoints
+STUB_ENDPOINTS = {
+    '/api/generation': 'data',
+    '/api/tiktok-tts': 'base64',
+}
+WORDS_PER_SECOND = 2.6
+
+
+def speech_duration(text: str) -> float:
+    return max(0.3, len(text.split()) / WORDS_PER_SECOND + 0.15)
+
+
+class StubTTSServer:
+    """Runs the stand-in on 127.0.0.1 in a background thread. `latency` (seconds) is added to every request to model the network."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self._audio = {}  # rounded duration -> MP3 bytes; encoding the same tone again would only benchmark the stub
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _speech(self, text: str) -> bytes:
+        duration = round(speech_duration(text) * 20) / 20
+        with self._lock:
+            audio = self._audio.get(duration)
+        if audio is None:
+            audio = make_speech_mp3(duration)
+            with self._lock:
+                self._audio[duration] = audio
+        return audio
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real endpoints, so connection reuse is measured
+
+            def do_POST(self):
+                response_key = STUB_ENDPOINTS.get(self.path)
+                if response_key is None:
+                    self.send_error(404)
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    audio = stub._speech(payload['text'])
+                except Exception as e:
+                    self.send_error(400, str(e))
+                    return
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                body = json.dumps({response_key: base64.b64encode(audio).decode('ascii')}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # One line per chunk would drown out the pipeline's own output
+
+        return Handler
+
+    def write_endpoints(self, path: str) -> str:
+        """Writes a config.json-style endpoint list pointing at this server, for TIKTOK_TTS_ENDPOINTS."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump([{'url': self.base_url + url_path, 'response': key} for url_path, key in STUB_ENDPOINTS.items()], f, indent=4)
+        return path
+
+    def start(self) -> 'StubTTSServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tts-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
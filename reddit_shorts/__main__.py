@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from reddit_shorts.main import main
+from reddit_shorts.main import run
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(run())
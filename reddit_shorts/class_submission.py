@@ -5,7 +5,7 @@ import os
 from praw.models import MoreComments
 from praw.models.comment_forest import CommentForest
 from reddit_shorts.config import project_path
-from reddit_shorts.query_db import check_if_video_exists, write_to_db, check_for_admin_posts
+from reddit_shorts.query_db import existing_videos, write_to_db, check_for_admin_posts
 from reddit_shorts.class_comment import Comment
 from reddit_shorts.utils import tts_for_platform, contains_bad_words
 
@@ -92,33 +92,33 @@ class Submission:
         suitable_submission = False
         comments = submission.comments
 
-        for index, comment in enumerate(comments):
+        # Collect every comment of the right length first, then check them all against the DB in one query
+        candidates = []
+        for comment in comments:
             if isinstance(comment, MoreComments):
                 continue
 
             comment_data = Comment.process_comment(comment, submission_author)
-            top_comment_body = comment_data.body
-            top_comment_author = comment_data.author
-            top_comment_id = comment_data.id
 
-            total_length = len(submission_title) + len(submission_text) + len(top_comment_body) + len(platform_tts)
+            total_length = len(submission_title) + len(submission_text) + len(comment_data.body) + len(platform_tts)
             print(f"{subreddit_name}:{submission_title} Total:{total_length}")
 
-            if total_length < min_character_len:
-                continue
+            if min_character_len <= total_length <= max_character_len:
+                candidates.append((comment_data, total_length))
 
-            if total_length <= max_character_len:
-                video_exists = check_if_video_exists(submission_id, top_comment_id)
-                if video_exists is False:
-                    suitable_submission = True
-                    break
+        uploaded = existing_videos([(submission_id, str(comment_data.id)) for comment_data, _ in candidates])
 
-                else:
-                    continue
+        for comment_data, total_length in candidates:
+            if (submission_id, str(comment_data.id)) not in uploaded:
+                top_comment_body = comment_data.body
+                top_comment_author = comment_data.author
+                top_comment_id = comment_data.id
+                suitable_submission = True
+                break
 
-            if index == len(comments) - 1:
-                print('reached the end of the comments')
-                return None
+        else:
+            print('reached the end of the comments')
+            return None
 
         if suitable_submission is True:
             print("Found a suitable submission!")
@@ -12,6 +12,108 @@ stories_file_path = os.path.join(project_path, "stories.txt")
 output_video_path = os.path.join(project_path, "generated_shorts")
 os.makedirs(output_video_path, exist_ok=True) # Ensure the directory exists
 
+# Render the whole short (narration concat, music bed, mix and video) in one ffmpeg invocation.
+# Set SHORTS_SINGLE_PASS=0 to fall back to the step-by-step renderer that writes intermediate MP3s.
+single_pass_render = os.environ.get('SHORTS_SINGLE_PASS', '1') != '0'
+
+# Whisper model used for subtitles. Models are loaded once per process (see whisper_models.py).
+whisper_model_sizes = ("tiny.en", "base.en", "small.en")
+whisper_model_size = os.environ.get('SHORTS_WHISPER_MODEL', "tiny.en")
+# Load the Whisper model in the background when the web app starts so the first render doesn't pay for it.
+whisper_warm_up_on_start = os.environ.get('SHORTS_WHISPER_WARM_UP', '1') != '0'
+# Long narrations are cut into pieces of about SHORTS_WHISPER_PIECE_SECONDS (at TTS chunk boundaries or
+# pauses) and transcribed on SHORTS_WHISPER_WORKERS worker processes, each with its own model and an
+# equal share of the cores. 1 worker transcribes the whole narration in this process.
+whisper_workers = int(os.environ.get('SHORTS_WHISPER_WORKERS', str(max(1, min(4, (os.cpu_count() or 1) // 2)))))
+whisper_piece_seconds = float(os.environ.get('SHORTS_WHISPER_PIECE_SECONDS', "30"))
+
+# "script" times subtitles from the narration text and the measured TTS chunk durations (no ASR);
+# "whisper" transcribes the rendered narration instead. Script timing falls back to Whisper when
+# chunk durations aren't available (e.g. narration that didn't come from the TikTok TTS client).
+subtitle_timing = os.environ.get('SHORTS_SUBTITLE_TIMING', "script")
+# How a chunk's duration is shared between its words: "syllable" or "proportional" (to word length)
+subtitle_weighting = os.environ.get('SHORTS_SUBTITLE_WEIGHTING', "syllable")
+# Consecutive words shown for less than this many seconds are merged into one subtitle event
+subtitle_min_event = float(os.environ.get('SHORTS_SUBTITLE_MIN_EVENT', "0.25"))
+
+# Fonts bundled with the project (resources/fonts), used for the title card and passed to libass
+# as its fonts directory, so renders don't depend on the fonts installed on the machine
+fonts_dir = os.environ.get('SHORTS_FONTS_DIR', os.path.join(project_path, "resources", "fonts"))
+
+# On-disk cache of synthesized TTS chunks, keyed by text, voice and backend (see tts_cache.py).
+# Least recently used chunks are evicted past the size cap; SHORTS_TTS_CACHE_MB=0 disables the cache.
+tts_cache_path = os.path.join(project_path, "temp", "cache", "tts")
+tts_cache_max_bytes = int(os.environ.get('SHORTS_TTS_CACHE_MB', '512')) * 2**20
+
+# Music tracks looped, crossfaded and set to their volume, ready to mix (see music_bed.py). One bed
+# is built per track and multiple of SHORTS_MUSIC_BED_BUCKET seconds, then trimmed per render.
+music_bed_cache_dir = os.path.join(project_path, "temp", "cache", "music_beds")
+music_bed_bucket = float(os.environ.get('SHORTS_MUSIC_BED_BUCKET', "60"))
+
+# Loudness measurements of music files and TTS voices (see loudness_index.py). Narration is brought to
+# SHORTS_NARRATION_LUFS and music beds to SHORTS_MUSIC_LUFS (so the music sits under the voice) with a
+# single linear loudnorm pass. The per-track volumes in `music` below are only used for tracks that
+# can't be measured.
+loudness_index_path = os.path.join(project_path, "temp", "cache", "loudness_index.db")
+narration_loudness_target = float(os.environ.get('SHORTS_NARRATION_LUFS', "-16"))
+music_loudness_target = float(os.environ.get('SHORTS_MUSIC_LUFS', "-30"))
+loudness_true_peak = -1.5  # dBTP
+loudness_range = 11.0  # LU
+
+# Vertical 1080x1920 proxies of the background footage (see footage_proxy.py, `shorts-prepare-footage`).
+# Renders use a proxy automatically when it is newer than its source.
+footage_proxy_path = os.path.join(project_path, "resources", "footage_proxies")
+footage_proxy_fps = 30
+footage_proxy_gop = 15  # frames between keyframes; keeps random seeks cheap
+
+# Rendered title cards, as PNGs named by a hash of their inputs (see make_submission_image.py).
+# Renders take cards from memory; a card is only written here when a kept render plan needs it.
+title_card_cache_dir = os.path.join(project_path, "temp", "cache", "title_cards")
+
+# Byte-offset indexes of story files, with content-hash story IDs (see story_store.py)
+story_index_dir = os.path.join(project_path, "temp", "cache", "story_index")
+
+# Persistent story selection queue (see story_queue.py). SHORTS_STORY_ORDER picks the next story
+# "fifo" (file order), "random" or "weighted". A claim older than SHORTS_STORY_CLAIM_TIMEOUT seconds
+# belongs to a worker that died and is handed out again; a story that fails to render
+# story_max_attempts times is rejected.
+story_queue_path = os.path.join(project_path, "temp", "cache", "story_queue.db")
+story_selection_order = os.environ.get('SHORTS_STORY_ORDER', "random")
+story_claim_timeout = float(os.environ.get('SHORTS_STORY_CLAIM_TIMEOUT', str(3 * 60 * 60)))
+story_max_attempts = 3
+
+# SQLite ledger of uploaded (submission, top comment) pairs and admin posts (see query_db.py).
+# Resolved against the project rather than the working directory; SHORTS_DB overrides it.
+shorts_db_path = os.environ.get('SHORTS_DB', os.path.join(project_path, "shorts.db"))
+
+# SQLite index of ffprobe results keyed by path, size and mtime (see probe_index.py)
+probe_index_path = os.path.join(project_path, "temp", "cache", "probe_index.db")
+
+# JSON lines log of pipeline timing spans (see tracing.py). SHORTS_TRACE_LOG overrides the path; set it
+# to an empty string to turn the log off. The log is rotated once it grows past SHORTS_TRACE_LOG_MB.
+trace_log_path = os.environ.get('SHORTS_TRACE_LOG', os.path.join(project_path, "temp", "traces", "spans.jsonl"))
+trace_log_max_bytes = int(os.environ.get('SHORTS_TRACE_LOG_MB', '64')) * 2**20
+
+# Web UI render queue: renders running at once, and jobs accepted (queued + running) before /api/generate returns 503
+web_render_workers = int(os.environ.get('SHORTS_WEB_WORKERS', '2'))
+web_max_pending_jobs = int(os.environ.get('SHORTS_WEB_MAX_PENDING', '20'))
+
+# Default per-stage concurrency caps for batch renders (shorts --all / --count / --story-id).
+# TTS is network-bound; Whisper and x264 each saturate several cores on their own.
+cpu_count = os.cpu_count() or 1
+batch_tts_concurrency = 8
+batch_whisper_concurrency = 1
+batch_encode_concurrency = max(1, cpu_count // 8)
+# Throughput mode: split the cores evenly between the encodes allowed to run at once (the batch
+# encode concurrency, or SHORTS_WEB_WORKERS in the web app) instead of giving every encode its
+# render profile's thread count. Turned on per batch with --throughput.
+encode_throughput = os.environ.get('SHORTS_ENCODE_THROUGHPUT', '0') == '1'
+
+# Stages of one story's render that may run at once (see pipeline_dag.py); 1 runs them one after another.
+# SHORTS_PROCESS_STAGES lists stages (e.g. "image") to run in a worker process instead of a thread.
+story_stage_workers = int(os.environ.get('SHORTS_STAGE_WORKERS', "4"))
+process_stages = tuple(name.strip() for name in os.environ.get('SHORTS_PROCESS_STAGES', "").split(",") if name.strip())
+
 video_resources_path = os.path.join(project_path, "resources", "footage")
 if not os.path.exists(video_resources_path):
     # Fallback for when installed as a package and resources are alongside modules
@@ -59,7 +161,7 @@ for file_name in music_resources: # Renamed 'file' to 'file_name'
             elif "creepy" in file_name.lower():
                 music_type = "creepy"
             
-            # Example: Assign different volumes based on type or filename, or just a default
+            # Fallback volumes for tracks whose loudness can't be measured (see loudness_index.py)
             volume = 0.2
             if music_type == "storytime":
                 volume = 0.35
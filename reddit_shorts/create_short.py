@@ -1,15 +1,31 @@
 import os
+import json
 import whisper
 import math
 import random
 import ffmpeg
+import numpy as np
 import shutil # For cleaning up temp directories
 
-from whisper.utils import get_writer
-
 # project_path is derived in config.py and used for temp paths if not overridden
-from reddit_shorts.config import project_path as default_project_path, footage, music, output_video_path as global_output_video_path
+from reddit_shorts.config import project_path as default_project_path, footage, music, output_video_path as global_output_video_path, single_pass_render
+from reddit_shorts.config import subtitle_timing, subtitle_weighting, subtitle_min_event, fonts_dir, narration_loudness_target
+from reddit_shorts.loudness_index import normalise, voice_loudness
+from reddit_shorts.music_bed import music_bed
+from reddit_shorts.make_submission_image import TitleCard, generate_reddit_story_image
+from reddit_shorts.footage_proxy import fresh_proxy_for, PROXY_WIDTH, PROXY_HEIGHT
+from reddit_shorts.probe_index import stream_info
+from reddit_shorts.render_profiles import RenderProfile, get_render_profile, encoder_threads, DEFAULT_RENDER_PROFILE
+from reddit_shorts.stage_limits import stage_slot
+from reddit_shorts.subtitles import build_word_timings, chunk_boundaries, merge_short_words, write_ass
+from reddit_shorts.tracing import span, traced_ffmpeg_run
 from reddit_shorts.utils import random_choice_music
+from reddit_shorts.whisper_models import transcribe_words
+
+SPACE_BETWEEN_TTS = 0.5  # seconds of silence between the title and content narration
+MUSIC_FADE_OUT = 5  # seconds
+VIDEO_FADE_OUT = 3  # seconds
+RENDER_PLAN_FILE = "render_plan.json"  # kept in temp/<story_id> next to the TTS tracks so a draft can be promoted
 
 
 def get_audio_duration(track: str) -> float: # Changed to accept path directly
@@ -17,8 +33,8 @@ def get_audio_duration(track: str) -> float: # Changed to accept path directly
         # print(f"Warning: Audio track {track} not found or is None. Returning 0 duration.")
         return 0.0
     try:
-        probe = ffmpeg.probe(track)
-        audio_info = next(s for s in probe['streams'] if s['codec_type'] == 'audio')
+        # Served from the probe index when the file is unchanged, so no ffprobe spawn on a hit
+        audio_info = stream_info(track, 'audio')
         duration = float(audio_info['duration'])
         return duration
     except Exception as e:
@@ -31,8 +47,7 @@ def get_video_duration(track: str) -> float: # Changed to accept path directly
         print(f"Warning: Video track {track} not found. Returning 0 duration.")
         return 0.0
     try:
-        probe = ffmpeg.probe(track)
-        video_info = next(stream for stream in probe['streams'] if stream['codec_type'] == 'video')
+        video_info = stream_info(track, 'video')
         duration = float(video_info['duration'])
         return duration
     except Exception as e:
@@ -40,12 +55,389 @@ def get_video_duration(track: str) -> float: # Changed to accept path directly
         return 0.0
 
 
+def choose_footage(background_video: str | None = None) -> str | None:
+    """The requested background video if it exists, otherwise a random one from the footage directory."""
+    if background_video and os.path.exists(background_video):
+        print(f"Using selected background video: {background_video}")
+        return background_video
+    if footage: # Fallback to random if selection is invalid or not provided
+        print(f"Warning: Selected background video '{background_video}' not found, not provided, or invalid. Using a random video from config.")
+        video_to_use = random.choice(footage)
+        print(f"Randomly selected background video: {video_to_use}")
+        return video_to_use
+    print("Error: No background footage available (neither selected nor in config). Please check config and resources directory.")
+    return None
+
+
+def choose_music(music_type: str) -> tuple[str | None, float]:
+    """(path, volume) of a random music bed for the music type, or (None, 0.0) if there's no music."""
+    if not music:
+        print("Warning: No music available. Video will be created without music.")
+        return None, 0.0
+    return random_choice_music(music, music_type)
+
+
+def _output_options(profile: RenderProfile) -> dict:
+    """Encoder options for the final libx264/AAC pass, taken from the render profile."""
+    options = {
+        'c:v': 'libx264',
+        'preset': profile.preset, # 'medium' for publishing, 'ultrafast' for drafts
+        'crf': str(profile.crf), # Constant Rate Factor (18-28 is typical, lower is better quality)
+        'threads': str(encoder_threads(profile)), # Explicit, so concurrent encodes don't each take every core
+        'c:a': 'aac',
+        'b:a': profile.audio_bitrate,
+        'movflags': '+faststart' # Good for web video
+    }
+    if profile.tune:
+        options['tune'] = profile.tune
+    if profile.keyint:
+        options['g'] = str(profile.keyint)
+    if profile.maxrate:
+        # Capped CRF: quality-driven, but never above maxrate over a bufsize window
+        options['maxrate'] = profile.maxrate
+        options['bufsize'] = profile.bufsize
+    return options
+
+
+def _has_subtitles(subtitles_path: str | None) -> bool:
+    return bool(subtitles_path) and os.path.exists(subtitles_path) and os.path.getsize(subtitles_path) > 0
+
+
+def load_render_plan(story_id: str) -> dict | None:
+    """Reads the render plan a draft left in temp/<story_id>, or None if there is nothing to promote."""
+    plan_path = os.path.join(default_project_path, "temp", story_id, RENDER_PLAN_FILE)
+    try:
+        with open(plan_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"No render plan found for story {story_id}. Render a draft with keep_artifacts first.")
+    except Exception as e:
+        print(f"Error reading render plan {plan_path}: {e}")
+    return None
+
+
+def _finish_render(temp_processing_dir: str, plan: dict, rendered: bool, keep_artifacts: bool) -> None:
+    """Keeps the intermediate artifacts and the render plan for a later promote, or removes the temp directory."""
+    if rendered and keep_artifacts:
+        try:
+            with open(os.path.join(temp_processing_dir, RENDER_PLAN_FILE), 'w') as f:
+                json.dump(plan, f, indent=2)
+            print(f"Render artifacts kept in {temp_processing_dir} for promotion.")
+            return
+        except Exception as e:
+            print(f"Error writing render plan: {e}. Cleaning up artifacts.")
+    shutil.rmtree(temp_processing_dir, ignore_errors=True)
+    print(f"Temporary processing directory {temp_processing_dir} cleaned up.")
+
+
+def _write_subtitles(timed_words: list, subtitles_path: str) -> int:
+    """Writes the styled ASS file the render burns in, with very short consecutive words merged into one event.
+    Returns the number of events."""
+    events = merge_short_words(timed_words, subtitle_min_event)
+    write_ass(events, subtitles_path)
+    return len(events)
+
+
+def _transcribe_to_subtitles(audio, subtitles_path: str, whisper_model: str | None = None, boundaries: list[float] | None = None) -> None:
+    """Runs Whisper over `audio` (a file path or a 16 kHz float32 array) and writes its word timings as ASS subtitles to subtitles_path.
+    A long narration is transcribed in parallel pieces, cut at `boundaries` (seconds between TTS chunks) when given."""
+    try:
+        print("Starting Whisper transcription for subtitles...")
+        if isinstance(audio, str):
+            audio = whisper.load_audio(audio)
+        # The model is resident for the whole process (and in each transcription worker); whisper_model picks
+        # tiny.en/base.en/small.en (config default otherwise)
+        with stage_slot("whisper"):
+            timed_words = transcribe_words(audio, whisper_model, boundaries=boundaries, language="en", fp16=False, task="transcribe")
+        events = _write_subtitles(timed_words, subtitles_path)
+        print(f"Subtitles generated ({events} events): {subtitles_path}")
+    except Exception as e:
+        print(f"Error during Whisper transcription: {e}. Subtitles might be missing.")
+        # Fallback: an empty file, which the render skips
+        with open(subtitles_path, 'w') as f:
+            f.write("")
+
+
+def _script_timed_subtitles(title_chunks: list | None, content_chunks: list | None, title_duration: float, content_duration: float,
+                            subtitles_path: str, weighting: str = subtitle_weighting) -> bool:
+    """Writes word-level ASS subtitles straight from the narration script and its measured TTS chunk durations.
+    Returns False when chunk timings are missing for one of the tracks, so the caller can fall back to Whisper."""
+    if (title_duration > 0 and not title_chunks) or (content_duration > 0 and not content_chunks):
+        return False
+    try:
+        with span("subtitles.script", weighting=weighting) as subtitle_span:
+            timed_words = build_word_timings(
+                title_chunks if title_duration > 0 else None,
+                content_chunks if content_duration > 0 else None,
+                SPACE_BETWEEN_TTS,
+                weighting,
+                title_duration=title_duration,
+                content_duration=content_duration
+            )
+            events = _write_subtitles(timed_words, subtitles_path)
+            subtitle_span.set(words=len(timed_words), events=events)
+            subtitle_span.bytes_out = os.path.getsize(subtitles_path)
+        print(f"Subtitles timed from the script ({len(timed_words)} words): {subtitles_path}")
+        return True
+    except Exception as e:
+        print(f"Error timing subtitles from the script: {e}. Falling back to Whisper.")
+        return False
+
+
+def _load_narration_audio(title_track: str | None, content_track: str | None):
+    """Decodes the narration tracks straight into the 16 kHz array Whisper consumes, with the same
+    silence gap the render graph inserts, so no combined MP3 has to be written just for transcription."""
+    pieces = []
+    if title_track:
+        pieces.append(whisper.load_audio(title_track))
+        if content_track:
+            pieces.append(np.zeros(int(SPACE_BETWEEN_TTS * whisper.audio.SAMPLE_RATE), dtype=np.float32))
+    if content_track:
+        pieces.append(whisper.load_audio(content_track))
+    return np.concatenate(pieces)
+
+
+def _clip_background_video(video_to_use: str, soundduration: float, profile: RenderProfile, start_ss: float | None = None):
+    """Picks a random segment of the background footage (looping it if needed), crops it to 9:16 and scales it to the profile size.
+    When a fresh proxy of the footage exists it is used instead, and the crop (and at full size the scale) is already done.
+    Pass start_ss to reuse the segment of an earlier render. Returns (stream, start_ss), or (None, None) on failure."""
+    proxy_path = fresh_proxy_for(video_to_use)
+    if proxy_path:
+        print(f"Using footage proxy: {proxy_path}")
+        video_to_use = proxy_path
+
+    video_duration = get_video_duration(video_to_use) # Use video_to_use
+    video_input_options = {}
+
+    if video_duration == 0.0:
+        print(f"Error: Background video {video_to_use} has zero duration. Cannot use this video.") # Use video_to_use
+        return None, None
+
+    if soundduration > video_duration:
+        print(f"Narration duration ({soundduration:.2f}s) is longer than background video ({video_duration:.2f}s). Looping video.")
+        # Pick a random start point within the original video's duration for the first segment
+        if start_ss is None:
+            start_ss = random.uniform(0, video_duration) if video_duration > 0 else 0
+        video_input_options['ss'] = f"{start_ss:.4f}" # Format to string with precision
+        video_input_options['stream_loop'] = -1  # Loop indefinitely
+        video_input_options['t'] = f"{soundduration:.4f}" # Trim the looped stream to soundduration
+    else:
+        # Narration is shorter or equal to video duration, pick a random segment
+        max_start_point = video_duration - soundduration
+        if start_ss is None:
+            start_ss = random.uniform(0, max_start_point) if max_start_point > 0 else 0
+        video_input_options['ss'] = f"{start_ss:.4f}"
+        video_input_options['t'] = f"{soundduration:.4f}"
+
+    resource_video = ffmpeg.input(video_to_use, **video_input_options) # Use video_to_use
+    if not proxy_path:
+        resource_video = resource_video.crop(x='(iw-ow)/2', y='(ih-oh)/2', width='ih*9/16', height='ih')
+    if not proxy_path or (profile.width, profile.height) != (PROXY_WIDTH, PROXY_HEIGHT):
+        resource_video = resource_video.filter('scale', width=profile.width, height=profile.height)
+    if profile.fps:
+        resource_video = resource_video.filter('fps', fps=profile.fps)
+    return resource_video.filter('setpts', 'PTS-STARTPTS'), start_ss # Reset timestamps after trimming/looping
+
+
+def _title_card_input(title_card):
+    """ffmpeg input for the title card and the bytes to feed it on stdin. A rendered TitleCard goes in as one
+    raw RGBA frame over a pipe; a path (a kept render plan's card) is read from disk. (None, None) if there's no card."""
+    if isinstance(title_card, TitleCard):
+        return ffmpeg.input('pipe:', format='rawvideo', pix_fmt='rgba', s=f'{title_card.width}x{title_card.height}'), title_card.rgba
+    if not (title_card and os.path.exists(title_card)):
+        print(f"Warning: Title card {title_card} not found. Video will not have image overlay.")
+        return None, None
+    return ffmpeg.input(title_card), None
+
+
+def _compose_video_stream(main_stream, soundduration: float, title_card, title_tts_duration: float, subtitles_path: str | None,
+                          profile: RenderProfile):
+    """Applies the fade out, the title card overlay and the burned-in subtitles (unless subtitles_path is None) to the clipped background video.
+    Returns the stream and the bytes to pass to the encode as ffmpeg's stdin (the title card, or None)."""
+    # Image Overlay
+    # Determine title display duration - should be duration of title TTS if available
+    # If no title TTS, maybe show for a fixed short duration, or not at all.
+    # For now, if title_tts_duration is 0, overlay won't show based on 'between(t,0,{title_tts_duration})'
+    # which is fine. Or set a minimum (e.g. 2-3s) if title_track_path is None but image exists.
+    overlay_stream, card_bytes = _title_card_input(title_card)
+    if overlay_stream:
+        # Scale image, limit width to 1000px at 1080 wide
+        overlay_stream = overlay_stream.filter('scale', w=f'min({1000 * profile.width // PROXY_WIDTH},iw)', h='-1')
+
+    # Apply fade out to video
+    main_stream = ffmpeg.filter(main_stream, 'fade', type='out', start_time=max(0, soundduration-VIDEO_FADE_OUT), duration=VIDEO_FADE_OUT)
+
+    if overlay_stream and title_tts_duration > 0:
+        main_stream = ffmpeg.overlay(main_stream, overlay_stream, x='(W-w)/2', y='(H-h)/3', enable=f'between(t,0,{title_tts_duration})')
+    elif overlay_stream: # If title TTS is 0 but image exists, maybe show for a fixed short time? For now, it won't show.
+        print("Title TTS duration is 0 or title track not found, image overlay based on title duration might not show.")
+        # Example: Show for first 3 seconds if no title TTS: enable='between(t,0,3)'
+        # main_stream = ffmpeg.overlay(main_stream, overlay_stream, x='(W-w)/2', y='(H-h)/3', enable='between(t,0,3)')
+
+    if subtitles_path is None:
+        print(f"Subtitles disabled for the {profile.name} profile.")
+    elif _has_subtitles(subtitles_path):
+        # The ASS file carries its own style, so the lighter ass filter renders it as is. Fonts are
+        # looked up in the project's fonts directory first, ahead of the system font cache.
+        subtitle_options = {'fontsdir': fonts_dir} if os.path.isdir(fonts_dir) else {}
+        main_stream = ffmpeg.filter(main_stream, 'ass', filename=subtitles_path, **subtitle_options)
+    else:
+        print("Subtitle file is missing or empty. Skipping subtitles filter.")
+
+    # Only fed to ffmpeg when the overlay is actually in the graph; otherwise nothing reads the pipe
+    return main_stream, card_bytes if overlay_stream and title_tts_duration > 0 else None
+
+
+def _process_music(bed_path: str, soundduration: float, processed_music_path: str) -> str | None:
+    """Trims the music bed (already looped and at the track volume) to the narration length and fades it out."""
+    try:
+        traced_ffmpeg_run(
+            ffmpeg
+            .input(bed_path)
+            .filter('atrim', start=0, end=soundduration)
+            .filter('afade', t='out', st=max(0, soundduration-MUSIC_FADE_OUT), d=MUSIC_FADE_OUT)
+            .output(processed_music_path),
+            "ffmpeg.process_music", overwrite_output=True, quiet=True
+        )
+        return processed_music_path
+    except Exception as e:
+        print(f"Error processing music: {e}. Continuing without music.")
+        return None # No music if processing fails
+
+
+def _mix_audio(tts_combined_path: str, processed_music_path: str, soundduration: float, mixed_audio_file_path: str):
+    """Mixes the narration with the processed music bed. Returns the audio stream to put in the video."""
+    narration_audio_stream = ffmpeg.input(tts_combined_path)
+    background_music_stream = ffmpeg.input(processed_music_path)
+    try:
+        traced_ffmpeg_run(
+            ffmpeg
+            .filter([narration_audio_stream, background_music_stream], 'amix', inputs=2, duration='first', dropout_transition=str(soundduration))
+            .output(mixed_audio_file_path),
+            "ffmpeg.mix", overwrite_output=True, quiet=True
+        )
+        return ffmpeg.input(mixed_audio_file_path)
+    except Exception as e:
+        print(f"Error mixing narration and music: {e}. Using narration only.")
+        return narration_audio_stream # Fallback to narration only
+
+
+def _encode(main_stream, audio_stream_node, short_file_path: str, profile: RenderProfile, stdin_bytes: bytes | None = None) -> bool:
+    """Runs the final libx264/AAC encode, feeding stdin_bytes (the title card) to ffmpeg's stdin. Returns True on success."""
+    try:
+        with stage_slot("encode"):
+            traced_ffmpeg_run(
+                ffmpeg.output(main_stream, audio_stream_node, short_file_path, **_output_options(profile)),
+                "ffmpeg.encode", overwrite_output=True, quiet=False, # Set quiet=False for more ffmpeg output if debugging
+                input=stdin_bytes
+            )
+        print(f"Video processing complete. Output: {short_file_path}")
+        return True
+    except ffmpeg.Error as e:
+        print(f"FFmpeg Error during final video assembly: {e.stderr.decode('utf8') if e.stderr else 'Unknown FFmpeg error'}")
+        return False
+    except Exception as e:
+        print(f"Generic error during final video assembly: {e}")
+        return False
+
+
+def _normalised_narration(narration, voice: str | None, narrator_title_track_path: str | None, narrator_content_track_path: str | None):
+    """Brings the narration to narration_loudness_target with one linear loudnorm pass, using the voice's stored
+    loudness. A voice without a measurement is measured once from this narration (the content track, being longer)."""
+    if not voice:
+        return narration
+    measurement = voice_loudness(voice, narrator_content_track_path or narrator_title_track_path)
+    return normalise(narration, measurement, narration_loudness_target) if measurement else narration
+
+
+def _build_single_pass_audio(narrator_title_track_path: str | None, narrator_content_track_path: str | None, resource_music_link: str | None,
+                             resource_music_volume: float, soundduration: float, voice: str | None = None):
+    """Builds the narration concat, silence padding, music trim/fade and amix as filter graph nodes.
+    Only the music bed may be built here (once per track and duration bucket); the returned stream
+    feeds straight into the final encode."""
+    audio_segments = []
+    if narrator_title_track_path:
+        audio_segments.append(ffmpeg.input(narrator_title_track_path))
+        if narrator_content_track_path:
+            audio_segments.append(ffmpeg.input(f'aevalsrc=0:d={SPACE_BETWEEN_TTS}', f='lavfi'))
+    if narrator_content_track_path:
+        audio_segments.append(ffmpeg.input(narrator_content_track_path))
+
+    narration = _normalised_narration(ffmpeg.concat(*audio_segments, v=0, a=1).node[0], voice, narrator_title_track_path, narrator_content_track_path)
+
+    if not (resource_music_link and os.path.exists(resource_music_link)):
+        print("No music link provided or file does not exist. Skipping music processing.")
+        return narration.filter('afade', type='out', start_time=max(0, soundduration-VIDEO_FADE_OUT), duration=VIDEO_FADE_OUT)
+
+    # The cached bed is already looped to cover the narration and at the track volume, so all
+    # that's left per render is cutting it to the narration length and fading it out.
+    bed_path = music_bed(resource_music_link, soundduration, resource_music_volume)
+    if not bed_path:
+        return narration.filter('afade', type='out', start_time=max(0, soundduration-VIDEO_FADE_OUT), duration=VIDEO_FADE_OUT)
+    background_music = (
+        ffmpeg
+        .input(bed_path)
+        .filter('atrim', start=0, end=soundduration)
+        .filter('afade', t='out', st=max(0, soundduration-MUSIC_FADE_OUT), d=MUSIC_FADE_OUT)
+    )
+    mixed = ffmpeg.filter([narration, background_music], 'amix', inputs=2, duration='first', dropout_transition=str(soundduration))
+    return mixed
+
+
+def _render_single_pass(plan: dict, profile: RenderProfile, subtitles_path: str | None, short_file_path: str,
+                        whisper_model: str | None = None, subtitle_source: str = subtitle_timing, reuse_subtitles: bool = False,
+                        title_card=None) -> bool:
+    """Renders the short with one ffmpeg invocation and no intermediate audio files.
+    `plan` holds the inputs (narration tracks and chunks, footage, music, title image); the footage start is recorded in it.
+    title_card (a TitleCard) is overlaid instead of the plan's submission_image_path when given."""
+    narrator_title_track_path = plan['video_tts_path']
+    narrator_content_track_path = plan['content_tts_path']
+    title_tts_duration = get_audio_duration(narrator_title_track_path) if narrator_title_track_path else 0.0
+    content_tts_duration = get_audio_duration(narrator_content_track_path) if narrator_content_track_path else 0.0
+    soundduration = title_tts_duration + content_tts_duration
+    if narrator_title_track_path and narrator_content_track_path:
+        soundduration += SPACE_BETWEEN_TTS
+    if soundduration == 0.0:
+        print("Error: Narration tracks have zero duration. Cannot proceed.")
+        return False
+
+    if subtitles_path and reuse_subtitles and _has_subtitles(subtitles_path):
+        print(f"Reusing subtitles from the draft render: {subtitles_path}")
+    elif subtitles_path and not (subtitle_source == "script" and _script_timed_subtitles(
+            plan['video_tts_chunks'], plan['content_tts_chunks'], title_tts_duration, content_tts_duration, subtitles_path)):
+        try:
+            narration_audio = _load_narration_audio(narrator_title_track_path, narrator_content_track_path)
+        except Exception as e:
+            print(f"Error decoding narration for transcription: {e}. Subtitles might be missing.")
+            narration_audio = None
+        if narration_audio is not None:
+            boundaries = chunk_boundaries(plan['video_tts_chunks'], plan['content_tts_chunks'], SPACE_BETWEEN_TTS,
+                                          title_tts_duration, content_tts_duration)
+            _transcribe_to_subtitles(narration_audio, subtitles_path, whisper_model, boundaries)
+
+    audio_stream = _build_single_pass_audio(narrator_title_track_path, narrator_content_track_path, plan['music_path'], plan['music_volume'], soundduration,
+                                            plan.get('voice'))
+
+    resource_video_clipped, plan['video_start'] = _clip_background_video(plan['background_video'], soundduration, profile, plan.get('video_start'))
+    if resource_video_clipped is None:
+        return False
+    main_stream, card_bytes = _compose_video_stream(resource_video_clipped, soundduration, title_card or plan['submission_image_path'],
+                                                    title_tts_duration, subtitles_path, profile)
+
+    print(f"Rendering short in a single ffmpeg pass ({profile.name} profile)...")
+    return _encode(main_stream, audio_stream, short_file_path, profile, card_bytes)
+
+
 def create_short_video(**kwargs) -> str | None:
+    # A render plan saved by a kept draft replaces the story inputs, so a promote renders exactly the same short
+    render_plan = kwargs.get('render_plan')
+    if render_plan:
+        kwargs = {**kwargs, **render_plan}
     story_id = kwargs.get('id')
     story_title = kwargs.get('title') # Expecting title from submission_data
     # submission_text = kwargs.get('selftext') # Now passed as narrator_content_track audio
     subreddit_music_type = kwargs.get('music_type', 'general') # Default to general
-    
+
     # TTS tracks for title and content - provided by a preceding step (e.g. modified make_tts.py)
     narrator_title_track_path = kwargs.get('video_tts_path') # Path to title TTS audio file
     narrator_content_track_path = kwargs.get('content_tts_path') # Path to content (selftext) TTS audio file
@@ -54,6 +446,20 @@ def create_short_video(**kwargs) -> str | None:
     # commentor_track_path = kwargs.get('commentor_track')
     # platform_tts_track_path = kwargs.get('platform_track')
 
+    # Compile everything into one ffmpeg invocation unless the caller asks for the step-by-step renderer
+    single_pass = kwargs.get('single_pass', single_pass_render)
+    whisper_model = kwargs.get('whisper_model') # None uses the configured default size
+    subtitle_source = kwargs.get('subtitle_timing', subtitle_timing) # "script" or "whisper"
+    # Text and measured duration of each TTS chunk, from make_tts.generate_tiktok_tts_for_story
+    title_chunks = kwargs.get('video_tts_chunks')
+    content_chunks = kwargs.get('content_tts_chunks')
+    # Output size, frame rate and encoder settings; the filter graph is the same for every profile
+    render_profile = get_render_profile(kwargs.get('render_profile'))
+    burn_subtitles = kwargs.get('subtitles')
+    if burn_subtitles is None:
+        burn_subtitles = render_profile.subtitles
+    keep_artifacts = kwargs.get('keep_artifacts', False) # Keep TTS tracks and subtitles so the render can be promoted
+
     output_dir = kwargs.get('output_dir', global_output_video_path) # Get from kwargs or global config
     os.makedirs(output_dir, exist_ok=True)
 
@@ -62,79 +468,105 @@ def create_short_video(**kwargs) -> str | None:
     # Use default_project_path (imported from config) for the root of temp, or make it relative to output_dir
     temp_processing_dir = os.path.join(default_project_path, "temp", story_id if story_id else "temp_video")
     os.makedirs(temp_processing_dir, exist_ok=True)
-    
-    # submission_image path needs to use story_id (or title if id is not reliable yet from image gen)
-    # Assuming make_submission_image.py saves based on ID now.
-    submission_image_filename = f"{story_id}.png" if story_id else "story_image.png"
-    submission_image_path = os.path.join(default_project_path, "temp", "images", submission_image_filename)
-    
-    short_file_path = os.path.join(output_dir, f"{story_id if story_id else 'short'}.mp4")
+
+    # The title card rendered by the pipeline's image stage (make_submission_image.TitleCard). A promote
+    # uses the card file its render plan points at; a direct call renders the card here.
+    title_card = kwargs.get('title_card')
+    if title_card is None and not render_plan:
+        title_card = generate_reddit_story_image(title=story_title or 'Untitled Story', subreddit=subreddit_music_type)
+
+    short_file_name = story_id if story_id else 'short'
+    if render_profile.name != DEFAULT_RENDER_PROFILE:
+        short_file_name = f"{short_file_name}_{render_profile.name}"
+    short_file_path = os.path.join(output_dir, f"{short_file_name}.mp4")
     tts_combined_path = os.path.join(temp_processing_dir, "combined.mp3")
-    music_looped_path = os.path.join(temp_processing_dir, "music_looped.mp3")
     processed_music_path = os.path.join(temp_processing_dir, "music_processed.mp3")
     mixed_audio_file_path = os.path.join(temp_processing_dir, 'mixed_audio.mp3')
-    # srt_filename = f"{story_id if story_id else 'combined'}.srt"
-    # tts_combined_srt_path = os.path.join(temp_processing_dir, srt_filename)
-    # Using a fixed name for SRT within its temp dir for Whisper, will be specific to this run.
-    tts_combined_srt_path = os.path.join(temp_processing_dir, "subtitles.srt") 
+    # Styled ASS subtitles, written by the script timer or from the Whisper transcript; specific to this run.
+    subtitles_path = os.path.join(temp_processing_dir, "subtitles.ass") if burn_subtitles else None
 
     # --- Background Video Selection ---
-    selected_video_path_from_kwargs = kwargs.get('background_video') # Get the path from UI
-    video_to_use = None
-
-    if selected_video_path_from_kwargs and os.path.exists(selected_video_path_from_kwargs):
-        video_to_use = selected_video_path_from_kwargs
-        print(f"Using selected background video: {video_to_use}")
-    elif footage: # Fallback to random if selection is invalid or not provided
-        print(f"Warning: Selected background video '{selected_video_path_from_kwargs}' not found, not provided, or invalid. Using a random video from config.")
-        video_to_use = random.choice(footage)
-        print(f"Randomly selected background video: {video_to_use}")
-    else:
-        print("Error: No background footage available (neither selected nor in config). Please check config and resources directory.")
+    video_to_use = choose_footage(kwargs.get('background_video')) # Path from the UI, or picked by the pipeline's footage stage
+    if not video_to_use:
         shutil.rmtree(temp_processing_dir, ignore_errors=True)
         return None
     # --- End Background Video Selection ---
 
-    if not music:
-        print("Warning: No music available. Video will be created without music.")
-        resource_music_link = None
-        resource_music_volume = 0.0
+    if render_plan:
+        resource_music_link, resource_music_volume = render_plan.get('music_path'), render_plan.get('music_volume', 0.0)
+    elif kwargs.get('music_path'):
+        # Already picked (and probed) by the pipeline's music stage
+        resource_music_link, resource_music_volume = kwargs['music_path'], kwargs.get('music_volume', 0.0)
     else:
-        resource_music_link, resource_music_volume = random_choice_music(music, subreddit_music_type)
+        resource_music_link, resource_music_volume = choose_music(subreddit_music_type)
 
-    # --- Start Audio Processing ---
-    audio_segments = []
-    space_between_tts = 0.5  # seconds
-    current_total_duration = 0.0
-
-    if narrator_title_track_path and os.path.exists(narrator_title_track_path):
-        audio_segments.append(ffmpeg.input(narrator_title_track_path))
-        current_total_duration += get_audio_duration(narrator_title_track_path)
-        # Add silence after title if content follows
-        if narrator_content_track_path and os.path.exists(narrator_content_track_path):
-            audio_segments.append(ffmpeg.input(f'aevalsrc=0:d={space_between_tts}', f='lavfi'))
-            current_total_duration += space_between_tts
-    else:
+    if not (narrator_title_track_path and os.path.exists(narrator_title_track_path)):
         print("Warning: Narrator title track not found or not provided.")
-
-    if narrator_content_track_path and os.path.exists(narrator_content_track_path):
-        audio_segments.append(ffmpeg.input(narrator_content_track_path))
-        current_total_duration += get_audio_duration(narrator_content_track_path)
-    else:
+        narrator_title_track_path = None
+    if not (narrator_content_track_path and os.path.exists(narrator_content_track_path)):
         print("Warning: Narrator content track not found or not provided.")
+        narrator_content_track_path = None
 
-    if not audio_segments:
+    if not narrator_title_track_path and not narrator_content_track_path:
         print("Error: No valid TTS audio tracks provided for title or content. Cannot create video.")
         shutil.rmtree(temp_processing_dir, ignore_errors=True) # Clean up temp dir
         return None
 
+    if not os.path.exists(video_to_use): # Check video_to_use instead of random_video_path
+        print(f"Error: Selected background video {video_to_use} not found.")
+        shutil.rmtree(temp_processing_dir, ignore_errors=True)
+        return None
+
+    # Everything needed to render this short again, e.g. to promote a draft to the standard profile
+    plan = {
+        'id': story_id,
+        'title': story_title,
+        'video_tts_path': narrator_title_track_path,
+        'content_tts_path': narrator_content_track_path,
+        'video_tts_chunks': title_chunks,
+        'content_tts_chunks': content_chunks,
+        'background_video': video_to_use,
+        'video_start': kwargs.get('video_start'),
+        'music_path': resource_music_link,
+        'music_volume': resource_music_volume,
+        # The voice make_tts narrated with: the default voice when none (or an unknown code) was requested
+        'voice': kwargs.get('tts_voice') or kwargs.get('voice'),
+        # Written to the title card cache only when the plan is kept, so a promote can find the card
+        'submission_image_path': kwargs.get('submission_image_path') if render_plan else (title_card.png_path() if title_card and keep_artifacts else None),
+    }
+
+    if single_pass:
+        rendered = False
+        try:
+            rendered = _render_single_pass(
+                plan,
+                render_profile,
+                subtitles_path,
+                short_file_path,
+                whisper_model,
+                subtitle_source,
+                reuse_subtitles=bool(render_plan),
+                title_card=title_card
+            )
+        finally:
+            _finish_render(temp_processing_dir, plan, rendered, keep_artifacts)
+        return short_file_path if rendered else None
+
+    # --- Start Audio Processing ---
+    audio_segments = []
+    if narrator_title_track_path:
+        audio_segments.append(ffmpeg.input(narrator_title_track_path))
+        # Add silence after title if content follows
+        if narrator_content_track_path:
+            audio_segments.append(ffmpeg.input(f'aevalsrc=0:d={SPACE_BETWEEN_TTS}', f='lavfi'))
+    if narrator_content_track_path:
+        audio_segments.append(ffmpeg.input(narrator_content_track_path))
+
     # Concatenate available TTS audio segments
     try:
         concat_filter = ffmpeg.concat(*audio_segments, v=0, a=1).node
-        (ffmpeg
-            .output(concat_filter[0], tts_combined_path)
-            .run(overwrite_output=True, quiet=True)
-        )
+        narration = _normalised_narration(concat_filter[0], plan['voice'], narrator_title_track_path, narrator_content_track_path)
+        traced_ffmpeg_run(ffmpeg.output(narration, tts_combined_path), "ffmpeg.concat_narration", overwrite_output=True, quiet=True)
     except Exception as e:
         print(f"Error concatenating TTS audio: {e}")
         shutil.rmtree(temp_processing_dir, ignore_errors=True)
@@ -147,201 +579,58 @@ def create_short_video(**kwargs) -> str | None:
         shutil.rmtree(temp_processing_dir, ignore_errors=True)
         return None
 
-    # Whisper transcription for subtitles
-    try:
-        print("Starting Whisper transcription for subtitles...")
-        writer_options = {"max_line_count": 1, "max_words_per_line": 1}
-        whisper_model = whisper.load_model("tiny.en", device="cpu") # Consider base or small for better accuracy if tiny is too basic
-        tts_combined_transcribed = whisper_model.transcribe(tts_combined_path, language="en", fp16=False, word_timestamps=True, task="transcribe")
-        srt_writer = get_writer("srt", os.path.dirname(tts_combined_srt_path)) # Pass directory to writer
-        srt_writer(tts_combined_transcribed, os.path.basename(tts_combined_srt_path), writer_options)
-        print(f"Subtitles generated: {tts_combined_srt_path}")
-        if not os.path.exists(tts_combined_srt_path):
-            print("Warning: SRT file was not created by Whisper.")
-            # Fallback: create an empty SRT file to prevent ffmpeg error if subtitles are mandatory in filter graph
-            with open(tts_combined_srt_path, 'w') as f:
-                f.write("") 
-    except Exception as e:
-        print(f"Error during Whisper transcription: {e}. Subtitles might be missing.")
-        # Fallback: create an empty SRT file
-        with open(tts_combined_srt_path, 'w') as f:
-            f.write("") 
+    # Subtitles: timed from the script when chunk durations are known, otherwise Whisper transcription
+    title_tts_duration = get_audio_duration(narrator_title_track_path) if narrator_title_track_path else 0
+    content_tts_duration = get_audio_duration(narrator_content_track_path) if narrator_content_track_path else 0
+    if subtitles_path is None or (render_plan and _has_subtitles(subtitles_path)):
+        pass # Subtitles are disabled, or reused from the draft render
+    elif not (subtitle_source == "script" and _script_timed_subtitles(title_chunks, content_chunks, title_tts_duration, content_tts_duration, subtitles_path)):
+        boundaries = chunk_boundaries(title_chunks, content_chunks, SPACE_BETWEEN_TTS, title_tts_duration, content_tts_duration)
+        _transcribe_to_subtitles(tts_combined_path, subtitles_path, whisper_model, boundaries)
 
     # Background Music Processing
     if resource_music_link and os.path.exists(resource_music_link):
-        music_track_input = ffmpeg.input(resource_music_link)
-        music_duration = get_audio_duration(resource_music_link)
-
-        if music_duration > 0 and soundduration > 0:
-            if music_duration < soundduration:
-                loops = int(soundduration / music_duration) + 1
-                # crossfade_duration = min(10, music_duration / 2) # Ensure crossfade is not too long for short music
-                crossfade_duration = 5 
-
-                looped_inputs = [ffmpeg.input(resource_music_link) for _ in range(loops)]
-                try:
-                    (ffmpeg
-                        .filter(looped_inputs, 'acrossfade', d=str(crossfade_duration), c1='tri', c2='tri')
-                        .output(music_looped_path)
-                        .run(overwrite_output=True, quiet=True)
-                    )
-                    music_source_for_processing = music_looped_path
-                except Exception as e:
-                    print(f"Error looping music with acrossfade: {e}. Using original music track.")
-                    music_source_for_processing = resource_music_link # Fallback to original if looping fails
-            else:
-                music_source_for_processing = resource_music_link
-            
-            try:
-                (ffmpeg
-                    .input(music_source_for_processing)
-                    .filter('atrim', start=0, end=soundduration)
-                    .filter('volume', resource_music_volume)
-                    .filter('afade', t='out', st=max(0, soundduration-5), d=5)
-                    .output(processed_music_path)
-                    .run(overwrite_output=True, quiet=True)
-                )
-            except Exception as e:
-                print(f"Error processing music: {e}. Continuing without music.")
-                processed_music_path = None # No music if processing fails
-        else:
-            print("Music duration or sound duration is zero. Skipping music processing.")
-            processed_music_path = None
+        bed_path = music_bed(resource_music_link, soundduration, resource_music_volume)
+        processed_music_path = _process_music(bed_path, soundduration, processed_music_path) if bed_path else None
     else:
         print("No music link provided or file does not exist. Skipping music processing.")
         processed_music_path = None
 
     # Mixing TTS with Background Music (if music exists)
-    narration_audio_stream = ffmpeg.input(tts_combined_path)
     if processed_music_path and os.path.exists(processed_music_path):
-        background_music_stream = ffmpeg.input(processed_music_path)
-        try:
-            (ffmpeg
-                .filter([narration_audio_stream, background_music_stream], 'amix', inputs=2, duration='first', dropout_transition=str(soundduration))
-                .output(mixed_audio_file_path)
-                .run(overwrite_output=True, quiet=True)
-            )
-            final_audio_stream_for_video = ffmpeg.input(mixed_audio_file_path)
-        except Exception as e:
-            print(f"Error mixing narration and music: {e}. Using narration only.")
-            final_audio_stream_for_video = narration_audio_stream # Fallback to narration only
+        final_audio_stream_for_video = _mix_audio(tts_combined_path, processed_music_path, soundduration, mixed_audio_file_path)
     else:
         print("Processed music path not available. Using narration audio only for video.")
         # shutil.copy(tts_combined_path, mixed_audio_file_path) # If mixed_audio_file_path is expected later
-        final_audio_stream_for_video = narration_audio_stream
+        final_audio_stream_for_video = ffmpeg.input(tts_combined_path)
 
     # Video Processing
-    if not os.path.exists(video_to_use): # Check video_to_use instead of random_video_path
-        print(f"Error: Selected background video {video_to_use} not found.")
+    resource_video_clipped, plan['video_start'] = _clip_background_video(video_to_use, soundduration, render_profile, plan['video_start'])
+    if resource_video_clipped is None:
         shutil.rmtree(temp_processing_dir, ignore_errors=True)
         return None
-        
-    video_duration = get_video_duration(video_to_use) # Use video_to_use
-    video_input_options = {}
 
-    if video_duration == 0.0:
-        print(f"Error: Background video {video_to_use} has zero duration. Cannot use this video.") # Use video_to_use
-        shutil.rmtree(temp_processing_dir, ignore_errors=True)
-        return None
-
-    if soundduration > video_duration:
-        print(f"Narration duration ({soundduration:.2f}s) is longer than background video ({video_duration:.2f}s). Looping video.")
-        # Pick a random start point within the original video's duration for the first segment
-        start_ss = random.uniform(0, video_duration) if video_duration > 0 else 0
-        video_input_options['ss'] = f"{start_ss:.4f}" # Format to string with precision
-        video_input_options['stream_loop'] = -1  # Loop indefinitely
-        video_input_options['t'] = f"{soundduration:.4f}" # Trim the looped stream to soundduration
-    else:
-        # Narration is shorter or equal to video duration, pick a random segment
-        max_start_point = video_duration - soundduration
-        start_ss = random.uniform(0, max_start_point) if max_start_point > 0 else 0
-        video_input_options['ss'] = f"{start_ss:.4f}"
-        video_input_options['t'] = f"{soundduration:.4f}"
-
-    resource_video_clipped = (
-        ffmpeg
-        .input(video_to_use, **video_input_options) # Use video_to_use
-        .crop(x='(iw-ow)/2', y='(ih-oh)/2', width='ih*9/16', height='ih')
-        .filter('scale', width=1080, height=1920)
-        .filter('setpts', 'PTS-STARTPTS') # Reset timestamps after trimming/looping
-        )
-
-    # Image Overlay
-    # Determine title display duration - should be duration of title TTS if available
-    title_tts_duration = get_audio_duration(narrator_title_track_path) if narrator_title_track_path else 0
-    # If no title TTS, maybe show for a fixed short duration, or not at all.
-    # For now, if title_tts_duration is 0, overlay won't show based on 'between(t,0,{title_tts_duration})'
-    # which is fine. Or set a minimum (e.g. 2-3s) if title_track_path is None but image exists.
-    if not os.path.exists(submission_image_path):
-        print(f"Warning: Submission image {submission_image_path} not found. Video will not have image overlay.")
-        overlay_stream = None
-    else:
-        overlay_stream = (
-            ffmpeg
-            .input(submission_image_path)
-            .filter('scale', w='min(1000,iw)', h='-1') # Scale image, limit width to 1000px
-        )
-
-    # Main video and audio assembly
-    output_options = {
-        'c:v': 'libx264',
-        'preset': 'medium', # Slower for better compression/quality, or 'fast'/'ultrafast' for speed
-        'crf': '23', # Constant Rate Factor (18-28 is typical, lower is better quality)
-        'c:a': 'aac',
-        'b:a': '192k',
-        'movflags': '+faststart' # Good for web video
-    }
-    
     # Filter graph construction
     video_with_audio = ffmpeg.concat(resource_video_clipped, final_audio_stream_for_video, v=1, a=1).node
     main_stream = video_with_audio[0]
     audio_stream_node = video_with_audio[1]
 
-    # Apply fade out to video and audio if possible
-    main_stream = ffmpeg.filter(main_stream, 'fade', type='out', start_time=max(0, soundduration-3), duration=3)
-    # audio_stream_node = ffmpeg.filter(audio_stream_node, 'afade', type='out', start_time=max(0, soundduration-3), duration=3)
     # Note: Fading audio here might be redundant if already faded in music processing and narration ends cleanly.
     # If final_audio_stream_for_video is directly from narration_audio_stream (no music), an afade here would be good.
     if not (processed_music_path and os.path.exists(processed_music_path)):
-         audio_stream_node = ffmpeg.filter(audio_stream_node, 'afade', type='out', start_time=max(0, soundduration-3), duration=3)
-
-    if overlay_stream and title_tts_duration > 0:
-        main_stream = ffmpeg.overlay(main_stream, overlay_stream, x='(W-w)/2', y='(H-h)/3', enable=f'between(t,0,{title_tts_duration})')
-    elif overlay_stream: # If title TTS is 0 but image exists, maybe show for a fixed short time? For now, it won't show.
-        print("Title TTS duration is 0 or title track not found, image overlay based on title duration might not show.")
-        # Example: Show for first 3 seconds if no title TTS: enable='between(t,0,3)'
-        # main_stream = ffmpeg.overlay(main_stream, overlay_stream, x='(W-w)/2', y='(H-h)/3', enable='between(t,0,3)')
+        audio_stream_node = ffmpeg.filter(audio_stream_node, 'afade', type='out', start_time=max(0, soundduration-VIDEO_FADE_OUT), duration=VIDEO_FADE_OUT)
 
-    if os.path.exists(tts_combined_srt_path) and os.path.getsize(tts_combined_srt_path) > 0:
-        main_stream = ffmpeg.filter(
-            main_stream,
-            'subtitles',
-            filename=tts_combined_srt_path,
-            force_style=f'''MarginV=60,Bold=-1,Fontname=Montserrat ExtraBold,Fontsize=36,OutlineColour=&HFF000000,BorderStyle=1,Outline=2,Shadow=2,ShadowColour=&HAA000000'''
-        )
-    else:
-        print("SRT file is missing or empty. Skipping subtitles filter.")
+    main_stream, card_bytes = _compose_video_stream(main_stream, soundduration, title_card or plan['submission_image_path'],
+                                                    title_tts_duration, subtitles_path, render_profile)
 
+    rendered = False
     try:
-        (ffmpeg
-            .output(main_stream, audio_stream_node, short_file_path, **output_options)
-            .run(overwrite_output=True, quiet=False) # Set quiet=False for more ffmpeg output if debugging
-        )
-        print(f"Video processing complete. Output: {short_file_path}")
-    except ffmpeg.Error as e:
-        print(f"FFmpeg Error during final video assembly: {e.stderr.decode('utf8') if e.stderr else 'Unknown FFmpeg error'}")
-        shutil.rmtree(temp_processing_dir, ignore_errors=True) # Clean up
-        return None
-    except Exception as e:
-        print(f"Generic error during final video assembly: {e}")
-        shutil.rmtree(temp_processing_dir, ignore_errors=True) # Clean up
-        return None
+        rendered = _encode(main_stream, audio_stream_node, short_file_path, render_profile, card_bytes)
     finally:
-        # Clean up temporary processing directory
-        shutil.rmtree(temp_processing_dir, ignore_errors=True)
-        print(f"Temporary processing directory {temp_processing_dir} cleaned up.")
+        # Clean up temporary processing directory (or keep it for a later promote)
+        _finish_render(temp_processing_dir, plan, rendered, keep_artifacts)
 
-    return short_file_path
+    return short_file_path if rendered else None
 
 
 # Example of how it might be called if you had TTS paths:
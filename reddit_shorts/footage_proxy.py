@@ -0,0 +1,106 @@
+import argparse
+import hashlib
+import os
+
+import ffmpeg
+
+from reddit_shorts.config import footage, footage_proxy_path, footage_proxy_fps, footage_proxy_gop
+from reddit_shorts.tracing import traced_ffmpeg_run
+
+# Pre-normalized footage proxies. Background footage is usually 1080p or 4K landscape gameplay,
+# and every render used to decode it at full resolution, crop it to 9:16 and scale it to 1080x1920.
+# A proxy is that crop+scale done once, at the render frame rate, with a short fixed GOP so the
+# random `ss` seek each render does only has to decode a handful of frames.
+
+PROXY_WIDTH = 1080
+PROXY_HEIGHT = 1920
+
+
+def proxy_path_for(source_path: str) -> str:
+    """Where the proxy for source_path lives. The name encodes the proxy settings, so changing them invalidates old proxies,
+    and a hash of the absolute source path, so sources sharing a stem (a/clip.mp4, b/clip.mp4, clip.mov) get their own proxy."""
+    stem = os.path.splitext(os.path.basename(source_path))[0]
+    source_hash = hashlib.sha256(os.path.abspath(source_path).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(footage_proxy_path, f"{stem}_{source_hash}_{PROXY_WIDTH}x{PROXY_HEIGHT}_{footage_proxy_fps}fps_g{footage_proxy_gop}.mp4")
+
+
+def fresh_proxy_for(source_path: str) -> str | None:
+    """The proxy for source_path if one exists and is newer than the source, otherwise None."""
+    proxy_path = proxy_path_for(source_path)
+    try:
+        if os.path.getmtime(proxy_path) >= os.path.getmtime(source_path) and os.path.getsize(proxy_path) > 0:
+            return proxy_path
+    except OSError:
+        pass
+    return None
+
+
+def prepare_footage_proxy(source_path: str, force: bool = False) -> str | None:
+    """Transcodes source_path into a vertical 1080x1920 proxy. Returns the proxy path, or None on failure."""
+    if not force:
+        existing = fresh_proxy_for(source_path)
+        if existing:
+            print(f"Proxy for {os.path.basename(source_path)} is up to date: {existing}")
+            return existing
+
+    os.makedirs(footage_proxy_path, exist_ok=True)
+    proxy_path = proxy_path_for(source_path)
+    partial_path = f"{proxy_path}.partial.mp4"
+    print(f"Preparing footage proxy for {source_path}...")
+    try:
+        proxy_stream = (
+            ffmpeg
+            .input(source_path)
+            .crop(x='(iw-ow)/2', y='(ih-oh)/2', width='ih*9/16', height='ih')
+            .filter('scale', width=PROXY_WIDTH, height=PROXY_HEIGHT)
+            .filter('fps', fps=footage_proxy_fps)
+            .output(
+                partial_path,
+                an=None,  # Renders never use the footage's own audio
+                **{
+                    'c:v': 'libx264',
+                    'preset': 'slow',
+                    'crf': '17',  # Near-transparent: the proxy is re-encoded again by every render
+                    'pix_fmt': 'yuv420p',
+                    'g': footage_proxy_gop,
+                    'keyint_min': footage_proxy_gop,
+                    'sc_threshold': 0,  # Fixed GOP: no extra scene-cut keyframes, no longer gaps
+                    'movflags': '+faststart'
+                }
+            )
+        )
+        traced_ffmpeg_run(proxy_stream, "ffmpeg.footage_proxy", overwrite_output=True, quiet=True)
+        os.replace(partial_path, proxy_path)
+        print(f"Footage proxy written: {proxy_path}")
+        return proxy_path
+    except ffmpeg.Error as e:
+        print(f"FFmpeg Error preparing proxy for {source_path}: {e.stderr.decode('utf8') if e.stderr else 'Unknown FFmpeg error'}")
+    except Exception as e:
+        print(f"Error preparing proxy for {source_path}: {e}")
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    return None
+
+
+def prepare_all_footage(paths: list[str] | None = None, force: bool = False) -> list[str]:
+    """Prepares proxies for every footage file (default: everything in resources/footage). Returns the proxy paths."""
+    proxies = []
+    for source_path in paths if paths is not None else footage:
+        proxy_path = prepare_footage_proxy(source_path, force=force)
+        if proxy_path:
+            proxies.append(proxy_path)
+    return proxies
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description="Transcode background footage into vertical 1080x1920 proxies for fast rendering.")
+    parser.add_argument("paths", nargs="*", help="Footage files to prepare (default: everything in resources/footage).")
+    parser.add_argument("-f", "--force", action="store_true", default=False, help="Rebuild proxies even if they are up to date.")
+    args = parser.parse_args()
+
+    proxies = prepare_all_footage(args.paths or None, force=args.force)
+    print(f"{len(proxies)} footage proxies ready in {footage_proxy_path}")
+
+
+if __name__ == '__main__':
+    run()
@@ -1,11 +1,12 @@
 import os
-import random
 import uuid # For generating unique IDs for stories
 
 # Removed praw, dotenv, and time imports as they are no longer needed for local file processing.
 # from dotenv import load_dotenv
 # from reddit_shorts.class_submission import Submission # We will create a simpler structure for now
-from reddit_shorts.config import stories_file_path, bad_words_list # music list might be used for type later
+from reddit_shorts.config import stories_file_path, bad_words_list, story_selection_order # music list might be used for type later
+from reddit_shorts.story_queue import get_story_queue
+from reddit_shorts.story_store import get_story_store, make_story
 
 # load_dotenv() # Not needed
 # reddit_client_id = os.environ['REDDIT_CLIENT_ID'] # Not needed
@@ -18,56 +19,17 @@ from reddit_shorts.config import stories_file_path, bad_words_list # music list
 # which we might need to replicate or simplify.
 
 def parse_stories_from_file(file_path: str) -> list[dict]:
-    """Parses stories from the local text file."""
-    stories = []
+    """Parses every story from the local text file. Story IDs are derived from the story content, so they are stable across calls."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            current_story = {}
-            lines = f.readlines()
-            idx = 0
-            while idx < len(lines):
-                line = lines[idx].strip()
-                if line.startswith("Title:"):
-                    if current_story: # Save previous story before starting a new one
-                        # Basic validation: ensure story has title and body
-                        if current_story.get("title") and current_story.get("selftext"):
-                            stories.append(current_story)
-                        current_story = {} # Reset for next story
-                    current_story["title"] = line.replace("Title:", "", 1).strip()
-                    current_story["id"] = str(uuid.uuid4()) # Generate a unique ID
-                    current_story["subreddit"] = "local_story" # Placeholder
-                    current_story["url"] = f"local_story_url_{current_story['id']}" # Placeholder
-                    current_story["music_type"] = "general" # Default, can be refined
-                    # Try to infer music_type from title or story content if desired
-                    # For example:
-                    if "creepy" in current_story["title"].lower() or \
-                       (current_story.get("selftext") and "creepy" in current_story.get("selftext", "").lower()):
-                        current_story["music_type"] = "creepy"
-                    elif "story" in current_story["title"].lower() or \
-                         (current_story.get("selftext") and "story" in current_story.get("selftext", "").lower()):
-                        current_story["music_type"] = "storytime"
-
-                elif line == "Story:" and "title" in current_story:
-                    idx += 1
-                    story_body_lines = []
-                    while idx < len(lines) and not lines[idx].strip().startswith("Title:"):
-                        story_body_lines.append(lines[idx].strip())
-                        idx += 1
-                    current_story["selftext"] = "\n".join(story_body_lines).strip()
-                    continue # Already incremented idx in the inner loop
-
-                idx += 1
-            
-            if current_story and current_story.get("title") and current_story.get("selftext"): # Add the last story
-                stories.append(current_story)
-
-    except FileNotFoundError:
-        print(f"Error: Stories file not found at {file_path}")
-        return []
+        return get_story_store(file_path).all()
     except Exception as e:
         print(f"Error reading or parsing stories file: {e}")
         return []
-    return stories
+
+def build_story(title: str, selftext: str) -> dict:
+    """Builds a story dict in the same shape parse_stories_from_file produces, for stories that don't come from the file.
+    These get a random ID rather than a content hash, so two requests with the same script never share temp files."""
+    return make_story(title.strip(), selftext.strip(), str(uuid.uuid4()))
 
 def check_bad_words(text: str) -> bool:
     """Checks if the text contains any bad words from the configured list."""
@@ -75,54 +37,100 @@ def check_bad_words(text: str) -> bool:
         return False
     return any(bad_word in text.lower() for bad_word in bad_words_list)
 
-# Keep track of stories that have been processed in this session to avoid immediate reuse.
-# For persistent tracking, a database or file would be needed.
-_processed_story_ids_session = set()
+def _claim_clean_story(store, queue, order: str) -> dict | None:
+    """Claims pending stories until one passes the bad word check. Iterative, so any number of rejected stories is fine."""
+    while True:
+        story_id = queue.claim(order=order)
+        if story_id is None:
+            return None
+        story = store.get(story_id)
+        if story is None:
+            # The stories file may have changed between indexing and reading: rescan it and read again
+            store.refresh(force=True)
+            story = store.get(story_id)
+        if story is None:
+            if story_id in store:
+                # Still in the file but unreadable while it's being rewritten: leave it for a later claim
+                print(f"Story {story_id} could not be read while stories.txt was changing. Returning it to the queue.")
+                queue.release(story_id)
+                return None
+            queue.reject(story_id, "missing from the stories file")
+            continue
+        # Perform bad word check (simplified from original Submission class)
+        if check_bad_words(story.get("title", "")) or check_bad_words(story.get("selftext", "")):
+            print(f"Story with title '{story.get('title', '')}' contains bad words. Skipping.")
+            queue.reject(story_id, "bad words")
+            continue
+        return story
 
 def get_story_from_file(**kwargs) -> dict | None:
-    """Gets a single, unprocessed story from the local file."""
+    """Claims a single pending story from the local file's selection queue.
+    The queue is persistent: the story stays claimed until main marks it done or failed."""
     # print("Getting a story from local file...") # Optional: for debugging
-    
-    all_stories = parse_stories_from_file(stories_file_path)
-    if not all_stories:
+    store = get_story_store(stories_file_path)
+    if not len(store):
         print("No stories found in the file or an error occurred.")
         return None
+    queue = get_story_queue()
+    queue.sync(store)
 
-    available_stories = [s for s in all_stories if s["id"] not in _processed_story_ids_session]
-
-    if not available_stories:
-        print("All stories from the file have been processed in this session.")
-        # Optionally, reset if all are processed and we want to loop:
-        # _processed_story_ids_session.clear()
-        # available_stories = all_stories
-        # if not available_stories: return None
-        return None # Or handle re-processing if desired
-
-    selected_story = random.choice(available_stories)
-
-    # Perform bad word check (simplified from original Submission class)
-    if check_bad_words(selected_story.get("title", "")) or \
-       check_bad_words(selected_story.get("selftext", "")):
-        print(f"Story with title '{selected_story.get('title', '')}' contains bad words. Skipping.")
-        _processed_story_ids_session.add(selected_story["id"]) # Mark as processed to avoid re-checking immediately
-        return get_story_from_file(**kwargs) # Try to get another story
-
-    _processed_story_ids_session.add(selected_story["id"])
-    
-    # The original Submission class had more processing, e.g. character limits,
-    # database interaction. We are simplifying this for now.
-    # The dictionary returned should be compatible with what create_short.py expects.
-    # Essential fields based on original Submission.as_dict() and create_short.py:
-    # - title (str)
-    # - selftext (str)
-    # - id (str)
-    # - subreddit (str) -> we use "music_type" derived from story, or a placeholder
-    # - url (str) - placeholder
-    # - music_type (str) - derived or default "general"
-    
+    selected_story = _claim_clean_story(store, queue, kwargs.get('order') or story_selection_order)
+    if selected_story is None:
+        print(f"No pending stories left in the queue ({queue.counts()}).")
+        return None
+
+    # The dictionary returned should be compatible with what create_short.py expects:
+    # title, selftext, id, subreddit (placeholder), url (placeholder), music_type
     print(f"Selected story: '{selected_story.get('title', 'Untitled')}'")
     return selected_story
 
+def get_stories_for_batch(story_ids: list[str] | None = None, count: int | None = None, **kwargs) -> list[dict]:
+    """Claims several stories from the local file's selection queue for a batch render.
+
+    story_ids picks specific stories, each given as a story ID or its 1-based position in the file,
+    whatever their queue state. Otherwise count claims that many pending stories, and with neither
+    every pending story is claimed."""
+    store = get_story_store(stories_file_path)
+    total = len(store)
+    if not total:
+        print("No stories found in the file or an error occurred.")
+        return []
+    queue = get_story_queue()
+    queue.sync(store)
+
+    selected_stories = []
+    if story_ids:
+        requested = []
+        for story_id in story_ids:
+            if story_id.isdigit() and 1 <= int(story_id) <= total:
+                story = store.get_at(int(story_id) - 1)
+            else:
+                story = store.get(story_id)
+            if story is None:
+                print(f"Warning: No story with ID or position '{story_id}' in {stories_file_path}. Skipping.")
+                continue
+            requested.append(story)
+        claimed = set(queue.claim_ids([story["id"] for story in requested]))
+        for story in requested:
+            if story["id"] not in claimed:
+                continue
+            # Same bad word check as get_story_from_file
+            if check_bad_words(story.get("title", "")) or check_bad_words(story.get("selftext", "")):
+                print(f"Story with title '{story.get('title', '')}' contains bad words. Skipping.")
+                queue.reject(story["id"], "bad words")
+                continue
+            selected_stories.append(story)
+    else:
+        order = kwargs.get('order') or story_selection_order
+        while count is None or len(selected_stories) < count:
+            story = _claim_clean_story(store, queue, order)
+            if story is None:
+                break
+            selected_stories.append(story)
+
+    print(f"Selected {len(selected_stories)} stories for batch rendering.")
+    return selected_stories
+
 # Removed connect_to_reddit and get_story_from_reddit functions.
 # The main script will now call get_story_from_file.
 
@@ -135,6 +143,7 @@ if __name__ == '__main__':
         print(f"  Title: {story.get('title')}")
         print(f"  Music Type: {story.get('music_type')}")
         print(f"  Story: {story.get('selftext')[:100]}...") # Print first 100 chars of story
+        get_story_queue().release(story['id']) # Only a test: leave it pending for a real render
     else:
         print("No story selected for testing.")
 
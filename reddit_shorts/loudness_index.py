@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import ffmpeg
+
+from reddit_shorts.config import loudness_index_path, loudness_true_peak, loudness_range
+from reddit_shorts.tracing import span
+
+# Persistent index of loudness measurements (integrated loudness, loudness range, true peak and
+# gating threshold, as reported by ffmpeg's loudnorm analysis). A music file is measured once per
+# content hash and a TTS voice once per voice code, from the first narration rendered with it.
+# Renders then normalise in a single linear loudnorm pass fed with the stored measurement, instead
+# of running the analysis pass of a two-pass loudnorm on every video.
+
+_local = threading.local()
+_hashes = {}  # (path, size, mtime_ns) -> sha256 of the file, so a file is hashed once per process
+_hashes_lock = threading.Lock()
+_measure_locks = {}
+_measure_locks_lock = threading.Lock()
+
+NORMALISED_SAMPLE_RATE = 48000  # loudnorm always outputs 192 kHz; resampled back to this
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread; SQLite connections can't be shared across threads."""
+    db = getattr(_local, 'db', None)
+    if db is not None:
+        return db
+
+    os.makedirs(os.path.dirname(loudness_index_path), exist_ok=True)
+    db = sqlite3.connect(loudness_index_path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS loudness (
+            key TEXT PRIMARY KEY,
+            integrated REAL NOT NULL,
+            lra REAL NOT NULL,
+            true_peak REAL NOT NULL,
+            threshold REAL NOT NULL,
+            source TEXT,
+            measured_at REAL NOT NULL
+        );
+        """)
+    db.commit()
+    _local.db = db
+    return db
+
+
+def file_hash(path: str) -> str:
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hashes_lock:
+        digest = _hashes.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with _hashes_lock:
+            _hashes[memo_key] = digest
+    return digest
+
+
+def parse_loudnorm_output(stderr: str) -> dict:
+    """The measurement from the JSON block loudnorm prints (print_format=json) at the end of ffmpeg's stderr."""
+    start = stderr.rindex('{')
+    report = json.loads(stderr[start:stderr.index('}', start) + 1])
+    return {
+        'integrated': float(report['input_i']),
+        'lra': float(report['input_lra']),
+        'true_peak': float(report['input_tp']),
+        'threshold': float(report['input_thresh']),
+    }
+
+
+def measure_loudness(path: str) -> dict:
+    """Runs loudnorm's analysis over the audio in path (one full decode)."""
+    with span("loudness.measure", file=os.path.basename(path)) as measure_span:
+        measure_span.bytes_in = os.path.getsize(path)
+        _, stderr = (
+            ffmpeg
+            .input(path)
+            .audio
+            .filter('loudnorm', print_format='json')
+            .output('-', format='null')
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return parse_loudnorm_output(stderr.decode('utf-8', errors='replace'))
+
+
+def get_measurement(key: str) -> dict | None:
+    row = _connect().execute("SELECT integrated, lra, true_peak, threshold FROM loudness WHERE key = ?", (key,)).fetchone()
+    return dict(zip(('integrated', 'lra', 'true_peak', 'threshold'), row)) if row else None
+
+
+def store_measurement(key: str, measurement: dict, source: str | None = None) -> None:
+    db = _connect()
+    db.execute(
+        "INSERT OR REPLACE INTO loudness (key, integrated, lra, true_peak, threshold, source, measured_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, measurement['integrated'], measurement['lra'], measurement['true_peak'], measurement['threshold'], source, time.time())
+    )
+    db.commit()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _measure_locks_lock:
+        lock = _measure_locks.get(key)
+        if lock is None:
+            lock = _measure_locks[key] = threading.Lock()
+        return lock
+
+
+def _cached_or_measured(key: str, path: str | None) -> dict | None:
+    measurement = get_measurement(key)
+    if measurement is not None or not path:
+        return measurement
+    # One measurement per key even when several renders ask for it at once
+    with _lock_for(key):
+        measurement = get_measurement(key)
+        if measurement is None:
+            try:
+                measurement = measure_loudness(path)
+            except Exception as e:
+                print(f"Error measuring loudness of {path}: {e}")
+                return None
+            # Digital silence measures as -70 LUFS or below; nothing to normalise
+            if measurement['integrated'] <= -70:
+                return None
+            store_measurement(key, measurement, source=os.path.basename(path))
+    return measurement
+
+
+def file_loudness(path: str) -> dict | None:
+    """Loudness of an audio file, measured the first time its content is seen. None if it can't be measured."""
+    try:
+        key = f"file:{file_hash(path)}"
+    except OSError as e:
+        print(f"Error reading {path} for loudness analysis: {e}")
+        return None
+    return _cached_or_measured(key, path)
+
+
+def voice_loudness(voice: str, sample_path: str | None = None) -> dict | None:
+    """Loudness of a TTS voice. Measured from sample_path (a narration in that voice) if the voice has no measurement yet."""
+    return _cached_or_measured(f"voice:{voice}", sample_path)
+
+
+def loudnorm_options(measurement: dict, target: float) -> dict:
+    """loudnorm options for a single linear-mode pass to `target` LUFS using a stored measurement. The
+    range target is at least the measured range, which linear mode needs; a pass that would push the
+    true peak past loudness_true_peak still falls back to loudnorm's dynamic mode."""
+    return {
+        'I': target,
+        'TP': loudness_true_peak,
+        'LRA': min(50.0, max(loudness_range, round(measurement['lra'] + 0.1, 1))),
+        'measured_I': measurement['integrated'],
+        'measured_LRA': measurement['lra'],
+        'measured_TP': measurement['true_peak'],
+        'measured_thresh': measurement['threshold'],
+        'linear': 'true',
+    }
+
+
+def normalise(stream, measurement: dict, target: float):
+    """Applies single-pass linear loudnorm to an ffmpeg-python audio stream."""
+    return stream.filter('loudnorm', **loudnorm_options(measurement, target)).filter('aresample', NORMALISED_SAMPLE_RATE)
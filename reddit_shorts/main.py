@@ -1,29 +1,66 @@
 import argparse
+import functools
 import os
 import ssl
+from concurrent.futures import ThreadPoolExecutor
 
 from reddit_shorts.config import (
     project_path,
     stories_file_path, 
     output_video_path,
+    whisper_model_sizes,
+    story_selection_order,
+    batch_tts_concurrency,
+    batch_whisper_concurrency,
+    batch_encode_concurrency,
+    encode_throughput,
+    story_stage_workers,
+    process_stages,
     # TIKTOK_SESSION_ID_TTS # No longer needed by the new library
 )
-from reddit_shorts.get_reddit_stories import get_story_from_file
+from reddit_shorts.get_reddit_stories import get_story_from_file, get_stories_for_batch
 from reddit_shorts.make_submission_image import generate_reddit_story_image
-from reddit_shorts.make_tts import generate_tiktok_tts_for_story # Uses the new library
-from reddit_shorts.create_short import create_short_video
+from reddit_shorts.make_tts import generate_tiktok_tts_for_story, tts_cache # Uses the new library
+from reddit_shorts.create_short import create_short_video, load_render_plan, choose_footage, choose_music, get_audio_duration, get_video_duration
+from reddit_shorts.footage_proxy import fresh_proxy_for
+from reddit_shorts.pipeline_dag import Stage, StageGraph
+from reddit_shorts.loudness_index import file_loudness
+from reddit_shorts.render_profiles import RENDER_PROFILES, encoder_threads, get_render_profile, set_encode_budget
+from reddit_shorts.stage_limits import configure_stage_limits
+from reddit_shorts.story_queue import get_story_queue, ORDERS
+from reddit_shorts.tracing import span
 
 ssl._create_default_https_context = ssl._create_unverified_context
 
+# CLI options that only steer batch selection and scheduling; they aren't passed down to the render stages
+BATCH_OPTIONS = ('all', 'count', 'story_ids', 'order', 'workers', 'tts_concurrency', 'whisper_concurrency', 'encode_concurrency', 'throughput')
+
 def run_local_video_generation(**kwargs) -> str | None:
-    """Generates a video locally from a story file."""
+    """Generates a video locally from a story file, or from the story dict passed as `story`."""
     print("Starting local video generation process...")
-    submission_data = get_story_from_file(**kwargs)
+    submission_data = kwargs.pop('story', None) or get_story_from_file(**kwargs)
 
     if not submission_data:
         print("No story data received. Aborting video generation.")
         return None
 
+    story_id = submission_data.get('id', "default_story_id")
+    short_file_path = None
+    try:
+        # Root span of the render; every stage and ffmpeg/Whisper/HTTP call below is recorded under its trace id
+        with span("render", story_id=story_id) as render_span:
+            short_file_path = _render_story(submission_data, **kwargs)
+            if not short_file_path:
+                render_span.fail("Video generation failed")
+    finally:
+        # Record the outcome in the story queue (a no-op for stories that didn't come from stories.txt)
+        if short_file_path:
+            get_story_queue().complete(story_id, short_file_path)
+        else:
+            get_story_queue().fail(story_id, "Video generation failed")
+    return short_file_path
+
+def _render_story(submission_data: dict, **kwargs) -> str | None:
     story_id = submission_data.get('id', "default_story_id")
     story_title = submission_data.get('title', "")
     story_selftext = submission_data.get('selftext', "")
@@ -32,34 +69,80 @@ def run_local_video_generation(**kwargs) -> str | None:
     current_story_temp_dir = os.path.join(project_path, "temp", story_id)
     os.makedirs(current_story_temp_dir, exist_ok=True)
 
-    print("Generating TTS audio for story...")
-    tts_paths = generate_tiktok_tts_for_story(
-        title=story_title,
-        text_content=story_selftext,
-        story_id=story_id,
-        temp_dir=current_story_temp_dir,
-        **kwargs # Pass through kwargs which should include the 'voice' parameter
-    )
-
-    video_tts_path = tts_paths.get('video_tts_path')
+    def tts_stage(track):
+        return functools.partial(
+            generate_tiktok_tts_for_story,
+            title=story_title,
+            text_content=story_selftext,
+            story_id=story_id,
+            temp_dir=current_story_temp_dir,
+            tracks=(track,),
+            **kwargs # Pass through kwargs which should include the 'voice' parameter
+        )
 
-    if not video_tts_path:
-        print("TTS generation failed for video. Video might lack narration.")
+    # Everything but the video stage is independent, so the TTS tracks, the title card and the
+    # footage and music picks overlap; the video stage starts once they have all finished
+    graph = StageGraph([
+        Stage("tts_title", tts_stage("title")),
+        Stage("tts_content", tts_stage("content")),
+        Stage("image", functools.partial(_image_stage, submission_data, kwargs), executor="process" if "image" in process_stages else "thread"),
+        Stage("footage", functools.partial(_footage_stage, kwargs.get('background_video'))),
+        Stage("music", functools.partial(_music_stage, submission_data.get('music_type', 'general'))),
+        Stage("video", functools.partial(_video_stage, submission_data, kwargs), after=("tts_title", "tts_content", "image", "footage", "music")),
+    ])
+    print("Generating TTS audio, story image and picking footage and music...")
+    try:
+        return graph.run(max_workers=story_stage_workers)['video']
+    except Exception as e:
+        print(f"Error during video generation: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
 
+def _image_stage(submission_data: dict, kwargs: dict):
+    """Renders the title card and returns it (a TitleCard, or None). Module-level so it can run in a worker process (SHORTS_PROCESS_STAGES=image)."""
     try:
         print("Generating story image...")
         image_generation_data = {**submission_data, 'subreddit': submission_data.get('music_type', 'local_story')}
-        generate_reddit_story_image(**{**image_generation_data, **kwargs})
+        card = generate_reddit_story_image(**{**image_generation_data, **kwargs})
         print("Story image generated.")
+        return card
     except Exception as e:
         print(f"Error generating story image: {e}. Continuing without image specific to story text, or this step might need review.")
+        return None
+
+def _footage_stage(background_video: str | None) -> str | None:
+    """Picks the background footage and probes it, so the video stage finds its duration in the probe index."""
+    video_to_use = choose_footage(background_video)
+    if video_to_use:
+        get_video_duration(fresh_proxy_for(video_to_use) or video_to_use)
+    return video_to_use
+
+def _music_stage(music_type: str) -> tuple[str | None, float]:
+    """Picks the music track, and probes it and measures its loudness (once per file) ahead of the video stage."""
+    music_path, music_volume = choose_music(music_type)
+    if music_path:
+        get_audio_duration(music_path)
+        file_loudness(music_path)
+    return music_path, music_volume
+
+def _video_stage(submission_data: dict, kwargs: dict, tts_title: dict, tts_content: dict, image, footage: str | None, music: tuple) -> str | None:
+    # Each TTS stage fills in its own track; the other's keys come back as None
+    tts_paths = {key: tts_title.get(key) or tts_content.get(key) for key in tts_title}
+    if not tts_paths.get('video_tts_path'):
+        print("TTS generation failed for video. Video might lack narration.")
+
+    # A missing footage pick leaves the selection (and its error message) to create_short_video
+    render_kwargs = {**kwargs, 'background_video': footage or kwargs.get('background_video')}
+    render_kwargs['music_path'], render_kwargs['music_volume'] = music
+    render_kwargs['title_card'] = image
 
     print("Creating short video...")
     try:
         short_file_path = create_short_video(
             **tts_paths, 
             **submission_data, 
-            **kwargs, 
+            **render_kwargs, 
             output_dir=output_video_path
         )
         if short_file_path and os.path.exists(short_file_path):
@@ -74,6 +157,70 @@ def run_local_video_generation(**kwargs) -> str | None:
         traceback.print_exc()
         return None
 
+def run_promote_render(story_id: str, **kwargs) -> str | None:
+    """Re-renders a kept draft at full quality from its render plan.
+    The TTS tracks, subtitles, footage segment and music are reused, so nothing but the final encode runs again."""
+    render_plan = load_render_plan(story_id)
+    if not render_plan:
+        return None
+    print(f"Promoting story {story_id} to the standard profile...")
+    kwargs.setdefault('render_profile', 'standard')
+    kwargs.setdefault('output_dir', output_video_path)
+    try:
+        with span("render.promote", story_id=story_id) as promote_span:
+            short_file_path = create_short_video(render_plan=render_plan, **kwargs)
+            if not short_file_path:
+                promote_span.fail("Promote render failed")
+        return short_file_path
+    except Exception as e:
+        print(f"Error during promote render: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+def run_batch_video_generation(**kwargs) -> list[str]:
+    """Renders many stories from the story file in one process.
+
+    Stories run on a pool of `workers` threads, while the TTS, Whisper and encode stages each
+    have their own concurrency cap so the machine is saturated without being oversubscribed.
+    The interpreter, imports and Whisper model are paid for once for the whole batch."""
+    stories = get_stories_for_batch(
+        story_ids=kwargs.get('story_ids'),
+        count=None if kwargs.get('all') else kwargs.get('count'),
+        order=kwargs.get('order')
+    )
+    if not stories:
+        print("No stories selected for batch rendering.")
+        return []
+
+    tts_concurrency = kwargs.get('tts_concurrency') or batch_tts_concurrency
+    whisper_concurrency = kwargs.get('whisper_concurrency') or batch_whisper_concurrency
+    encode_concurrency = kwargs.get('encode_concurrency') or batch_encode_concurrency
+    configure_stage_limits(tts=tts_concurrency, whisper=whisper_concurrency, encode=encode_concurrency)
+    if kwargs.get('throughput') or encode_throughput:
+        set_encode_budget(encode_concurrency)
+        print(f"Throughput mode: {encoder_threads(get_render_profile(kwargs.get('render_profile')))} x264 threads per encode.")
+
+    # Enough stories in flight to keep every stage busy: while some encode, others fetch TTS
+    workers = kwargs.get('workers') or (tts_concurrency + encode_concurrency)
+    workers = min(workers, len(stories))
+    print(f"Rendering {len(stories)} stories with {workers} workers "
+          f"(TTS {tts_concurrency}, Whisper {whisper_concurrency}, encode {encode_concurrency} at a time)...")
+
+    render_kwargs = {key: value for key, value in kwargs.items() if key not in BATCH_OPTIONS}
+    # The stories are all claimed up front but most wait for a worker, so their claims are kept
+    # alive until they finish; otherwise another process would requeue and render them too
+    with get_story_queue().keep_alive([story["id"] for story in stories]):
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render") as pool:
+            results = list(pool.map(lambda story: run_local_video_generation(story=story, **render_kwargs), stories))
+
+    video_files = [video_file for video_file in results if video_file]
+    print(f"Batch complete: {len(video_files)} of {len(stories)} videos rendered.")
+    if tts_cache is not None:
+        print(f"TTS cache: {tts_cache.stats()}")
+    print(f"Story queue: {get_story_queue().counts()}")
+    return video_files
+
 def main(**kwargs) -> None:
     # Simplified main function to only generate video locally
     print(f"Received arguments for main: {kwargs}")
@@ -82,6 +229,18 @@ def main(**kwargs) -> None:
     # if not os.path.isfile(db_path):
     #     create_tables()
 
+    promote_id = kwargs.pop('promote', None)
+    if promote_id:
+        video_file = run_promote_render(promote_id, **{key: value for key, value in kwargs.items() if key not in BATCH_OPTIONS and key != 'filter'})
+        print(f"Promoted video saved at: {video_file}" if video_file else "Promote failed.")
+        return
+
+    if kwargs.get('all') or kwargs.get('count') or kwargs.get('story_ids'):
+        video_files = run_batch_video_generation(**kwargs)
+        for video_file in video_files:
+            print(f"Video saved at: {video_file}")
+        return
+
     # No platform switching, just run the local generation
     video_file = run_local_video_generation(**kwargs)
 
@@ -101,6 +260,30 @@ def parse_my_args() -> dict:
     # parser.add_argument("-v", "--video", type=str.lower, action='store', default=False, help="Input your own video path")
     # parser.add_argument("-m", "--music", type=str.lower, action='store', default=False, help="Input your own music") 
     parser.add_argument("-pf", "--filter", action="store_true", default=False, help="Enable profanity filter for stories.")
+    parser.add_argument("-wm", "--whisper-model", choices=whisper_model_sizes, default=None,
+                        help="Whisper model used for subtitles (defaults to SHORTS_WHISPER_MODEL or tiny.en).")
+    parser.add_argument("-rp", "--render-profile", choices=list(RENDER_PROFILES), default=None,
+                        help="Output quality: 'draft' for a fast low-res preview, 'standard' for publishing (default), "
+                             "'archive' for a high-quality master, 'capped' for publishing with the bitrate capped.")
+    parser.add_argument("--keep-artifacts", action="store_true", default=False,
+                        help="Keep the TTS tracks and subtitles in temp/<story_id> so the render can be promoted later.")
+    parser.add_argument("--promote", metavar="STORY_ID", default=None, help="Re-render a kept draft at the standard profile from its cached artifacts.")
+
+    batch = parser.add_argument_group("batch rendering", "Render several stories from stories.txt in one process.")
+    selection = batch.add_mutually_exclusive_group()
+    selection.add_argument("--all", action="store_true", default=False, help="Render every story in stories.txt.")
+    selection.add_argument("--count", type=int, default=None, help="Render N randomly chosen stories.")
+    selection.add_argument("--story-id", dest="story_ids", action="append", default=None,
+                           help="Render the story with this ID or 1-based position in stories.txt. Can be repeated.")
+    parser.add_argument("--order", choices=ORDERS, default=None,
+                        help=f"Order stories are picked from the queue (default: SHORTS_STORY_ORDER or {story_selection_order}).")
+    batch.add_argument("--workers", type=int, default=None, help="Stories rendered concurrently (default: TTS + encode concurrency).")
+    batch.add_argument("--tts-concurrency", type=int, default=None, help=f"Max TTS tracks synthesized at once (default: {batch_tts_concurrency}).")
+    batch.add_argument("--whisper-concurrency", type=int, default=None, help=f"Max concurrent Whisper transcriptions (default: {batch_whisper_concurrency}).")
+    batch.add_argument("--encode-concurrency", type=int, default=None, help=f"Max concurrent x264 encodes (default: {batch_encode_concurrency}).")
+    batch.add_argument("--throughput", action="store_true", default=False,
+                       help="Split the CPU cores evenly between concurrent encodes instead of using the render profile's thread count "
+                            "(default: SHORTS_ENCODE_THROUGHPUT).")
 
     args = parser.parse_args()
 
@@ -110,6 +293,19 @@ def parse_my_args() -> dict:
     return {
         # 'platform': platform, # No longer used
         'filter': profanity_filter,
+        'whisper_model': args.whisper_model,
+        'render_profile': args.render_profile,
+        'keep_artifacts': args.keep_artifacts,
+        'promote': args.promote,
+        'all': args.all,
+        'count': args.count,
+        'story_ids': args.story_ids,
+        'order': args.order,
+        'workers': args.workers,
+        'tts_concurrency': args.tts_concurrency,
+        'whisper_concurrency': args.whisper_concurrency,
+        'encode_concurrency': args.encode_concurrency,
+        'throughput': args.throughput,
         # Add other relevant args if create_short_video or other functions need them explicitly
     }
 
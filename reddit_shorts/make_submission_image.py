@@ -1,228 +1,309 @@
-import datetime
+import hashlib
+import io
 import os
-import random # For placeholder data
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 
 from PIL import Image, ImageFont, ImageDraw, ImageOps # ImageOps for potential padding
 
-from reddit_shorts.config import project_path # This should be default_project_path now or ensure it resolves correctly
+from reddit_shorts.config import project_path, title_card_cache_dir, fonts_dir # This should be default_project_path now or ensure it resolves correctly
 # Removed unused utils: split_string_at_space, abbreviate_number, format_relative_time
 # as we will simplify the image to mostly title, or use the template's existing elements.
 
-# Helper function for text wrapping (can be improved)
-def wrap_text(text, font, max_width):
+WORD_WIDTH_CACHE_SIZE = 4096  # measured words kept per font size
+
+
+class WordWidths:
+    """Advance widths of words in one font. Each distinct word is measured once; the cache is
+    cleared when it reaches WORD_WIDTH_CACHE_SIZE words."""
+
+    def __init__(self, font, max_words: int = WORD_WIDTH_CACHE_SIZE):
+        self.font = font
+        self.max_words = max_words
+        self.space = font.getlength(" ")
+        self._widths = {}
+
+    def __call__(self, word: str) -> float:
+        width = self._widths.get(word)
+        if width is None:
+            if len(self._widths) >= self.max_words:
+                self._widths.clear()
+            width = self._widths[word] = self.font.getlength(word)
+        return width
+
+
+def wrap_text(text, font, max_width, widths: WordWidths | None = None) -> list[str]:
+    """Greedy word wrap to max_width pixels. Line widths are summed from per-word advance widths as words
+    are added, so wrapping is linear in the title length; pass `widths` to reuse measurements across calls.
+    A word wider than max_width gets a line of its own (and overflows it)."""
+    widths = widths or WordWidths(font)
     lines = []
-    if not text:
-        return lines
-    
-    words = text.split()
-    current_line = ''
-    for word in words:
-        # Test if adding word exceeds max_width
-        # For multiline_textbbox, we'd need a draw object, but font.getlength is for single line
-        # A simple approximation: test bbox of current_line + word
-        # More accurately, build line by line and measure with draw.multiline_textbbox
-        if current_line: # if line is not empty
-            test_line = f'{current_line} {word}'
+    current_words = []
+    current_width = 0.0
+    for word in (text or '').split():
+        word_width = widths(word)
+        if current_words and current_width + widths.space + word_width > max_width:
+            lines.append(' '.join(current_words))
+            current_words = [word]
+            current_width = word_width
         else:
-            test_line = word
-        
-        # Use textbbox for more accurate width, considering font specifics
-        # Requires a ImageDraw object, so we pass it or create a dummy one if needed for helper
-        # For simplicity here, let's assume a draw object would be available or use getlength as an approximation
-        # Note: getlength is for single line. For multiline, textbbox is better.
-        # Pillow versions differ: older getsize, newer getlength, textbbox, multiline_textbbox
-        try:
-            # Try to get width using textlength if available (newer Pillow)
-            line_width = font.getlength(test_line)
-        except AttributeError:
-            # Fallback for older Pillow or if no draw object for textbbox
-            # This is a rough estimate based on average char width, not ideal.
-            # A better fallback for older Pillow is draw.textsize(test_line, font=font)[0]
-            # but this helper doesn't have `draw` yet.
-            # For a robust solution, this helper would need `draw` or be part of a class.
-            # For now, we keep it simple and expect it might need refinement.
-            # A very basic character count based splitting if font metrics fail badly:
-            # if len(test_line) * (font.size * 0.6) > max_width: # Rough estimate
-            # For now, let's stick to what original code implies (word splitting by count)
-            # The original code had `characters_to_linebreak` which is what we are trying to replace
-            # with a width-based approach.
-            pass # Placeholder for more robust width check if font.getlength fails
-
-        if font.getlength(test_line) <= max_width:
-            current_line = test_line
-        else:
-            if current_line: # Avoid adding empty lines if a single word is too long
-                lines.append(current_line)
-            current_line = word
-            # Handle case where a single word is longer than max_width (optional: break word)
-            if font.getlength(current_line) > max_width:
-                # For now, just add it if it's the only word, it will overflow.
-                # Proper handling would be char-level splitting.
-                lines.append(current_line)
-                current_line = '' # Reset if word itself was added
-    
-    if current_line: # Add the last line
-        lines.append(current_line)
+            current_width += (widths.space if current_words else 0) + word_width
+            current_words.append(word)
+    if current_words:
+        lines.append(' '.join(current_words))
     return lines
 
-def generate_reddit_story_image(**kwargs) -> None:
-    story_id = str(kwargs.get('id', 'unknown_story')) # Use ID for filename, provide fallback
-    # subreddit will be music_type or 'local_story' passed from main.py
-    subreddit = str(kwargs.get('subreddit', 'local_story')) 
-    submission_title = str(kwargs.get('title', 'Untitled Story'))
 
-    # Provide placeholders for Reddit-specific data not available from local files
-    submission_author = str(kwargs.get('author', story_id[:20])) # Use truncated story_id or a generic name
-    submission_timestamp = kwargs.get('timestamp', datetime.datetime.now().timestamp())
-    submission_score = int(kwargs.get('score', random.randint(20, 300)))
-    submission_comments_int = int(kwargs.get('num_comments', random.randint(5, 50)))
-
-    subreddit_lowercase = subreddit.lower()
-
-    # Ensure temp/images directory exists
-    temp_images_dir = os.path.join(project_path, "temp", "images")
-    os.makedirs(temp_images_dir, exist_ok=True)
-
-    story_template_path = os.path.join(project_path, "resources", "images", "reddit_submission_template.png")
-    if not os.path.exists(story_template_path):
-        print(f"Error: Story template not found at {story_template_path}")
-        return
-    story_template = Image.open(story_template_path).convert("RGBA") # Ensure RGBA for transparency handling
-    template_width, template_height = story_template.size
-
-    # Define offsets for the title box based on user specification
-    offset_left = 148
-    offset_top = 198
-    offset_right = 148
-    offset_bottom = 134
-
-    # Calculate title box coordinates
-    title_box_left = offset_left
-    title_box_top = offset_top
-    title_box_right = template_width - offset_right
-    title_box_bottom = template_height - offset_bottom
-    title_box_width = title_box_right - title_box_left
-    title_box_height = title_box_bottom - title_box_top # Calculated for completeness
-
-    if title_box_width <= 0 or title_box_height <= 0:
-        print(f"Error: Calculated title box dimensions are invalid (width: {title_box_width}, height: {title_box_height}). Check template size and offsets.")
-        return
-    
-    # Output filename uses story_id
-    submission_image_path = os.path.join(temp_images_dir, f"{story_id}.png")
-    
-    community_logo_path = os.path.join(project_path, "resources", "images", "subreddits", f"{subreddit_lowercase}.png")
-    default_community_logo_path = os.path.join(project_path, "resources", "images", "subreddits", "default.png")
-
-    if len(submission_author) > 22:
-        submission_author_formatted = submission_author[:22]
-        # return submission_author_formatted # This was an early return, should not be here
-    else:
-        submission_author_formatted = submission_author
-
-    font_name = "Montserrat-ExtraBold" # Changed from LiberationSans-Bold
-    # Start with a reasonable font size; this might need to be dynamic later.
-    # For dynamic font sizing, you would loop, check fit, and adjust size.
-    title_font_size = 60 
+# Title cards are drawn by one resident renderer per process. The template is decoded, fonts are
+# loaded per size and community logos are resized once, then reused for every card. Finished cards
+# are kept in memory by a hash of their inputs and handed to ffmpeg as raw RGBA over a pipe, so a
+# render writes no image file; a PNG is only written (once per distinct card, under
+# temp/cache/title_cards) when a path is needed, e.g. for a render plan kept for a promote.
+
+CARD_LAYOUT_VERSION = 2  # bump when the layout below changes, so cached cards are redrawn
+CARDS_IN_MEMORY = 32
+TEMPLATE_PATH = os.path.join(project_path, "resources", "images", "reddit_submission_template.png")
+LOGO_DIR = os.path.join(project_path, "resources", "images", "subreddits")
+FONT_NAME = "Montserrat-ExtraBold" # Changed from LiberationSans-Bold
+TITLE_FONT_SIZE = 60  # largest size; longer titles are set smaller so they fit the title box
+MIN_TITLE_FONT_SIZE = 28  # titles that don't fit even at this size overflow the bottom of the box
+TITLE_LINE_SPACING = 10 # Adjust as needed for the chosen font size
+TITLE_COLOR = (35, 31, 32, 255) # Black, fully opaque
+LOGO_SIZE = (244, 244)
+LOGO_POSITION = (222, 368)
+# Offsets of the title box from the template edges (left, top, right, bottom)
+TITLE_BOX_OFFSETS = (148, 198, 148, 134)
+
+
+@dataclass
+class TitleCard:
+    key: str
+    width: int
+    height: int
+    rgba: bytes
+
+    def image(self) -> Image.Image:
+        return Image.frombytes("RGBA", (self.width, self.height), self.rgba)
+
+    def png(self) -> bytes:
+        """The card as an in-memory PNG."""
+        buffer = io.BytesIO()
+        self.image().save(buffer, format="PNG", compress_level=1)
+        return buffer.getvalue()
+
+    def png_path(self) -> str:
+        """Path of the card's PNG in the card cache, written the first time it's asked for."""
+        path = os.path.join(title_card_cache_dir, f"{self.key}.png")
+        if not os.path.exists(path):
+            os.makedirs(title_card_cache_dir, exist_ok=True)
+            # Write to a temp file and rename so a concurrent reader never sees a partial PNG
+            fd, temp_path = tempfile.mkstemp(dir=title_card_cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.png())
+            os.replace(temp_path, path)
+        return path
+
+
+def _file_signature(path: str | None) -> str:
     try:
-        title_font = ImageFont.truetype(font_name, title_font_size)
-    except IOError:
-        print(f"Error: Font '{font_name}' at size {title_font_size} not found. Please ensure Montserrat ExtraBold is installed and accessible.")
-        # Attempt a very basic fallback if the specified font isn't found
+        stat = os.stat(path)
+        return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except (OSError, TypeError):
+        return "none"
+
+
+class TitleCardRenderer:
+    def __init__(self, template_path: str = TEMPLATE_PATH, logo_dir: str = LOGO_DIR, font_name: str = FONT_NAME):
+        self.template_path = template_path
+        self.logo_dir = logo_dir
+        self.font_name = font_name
+        self._lock = threading.Lock()
+        self._template = None
+        self._fonts = {}  # size -> font
+        self._word_widths = {}  # size -> WordWidths
+        self._font_missing = False
+        self._logos = {}  # logo path -> image resized to LOGO_SIZE, or None
+        self._cards = OrderedDict()  # input hash -> TitleCard, least recently used first
+
+    def _load_template(self) -> Image.Image | None:
+        if self._template is None:
+            if not os.path.exists(self.template_path):
+                print(f"Error: Story template not found at {self.template_path}")
+                return None
+            with Image.open(self.template_path) as template:
+                self._template = template.convert("RGBA") # Ensure RGBA for transparency handling
+        return self._template
+
+    def _font(self, size: int):
+        font = self._fonts.get(size)
+        if font is None:
+            # The copy bundled in resources/fonts first, so cards look the same on every machine
+            bundled_font = os.path.join(fonts_dir, f"{self.font_name}.ttf")
+            try:
+                font = ImageFont.truetype(bundled_font if os.path.exists(bundled_font) else self.font_name, size)
+            except IOError:
+                if not self._font_missing:
+                    print(f"Error: Font '{self.font_name}' not found. Please ensure Montserrat ExtraBold is installed and accessible.")
+                    print(f"Warning: Using default Pillow font due to error with {self.font_name}.")
+                    self._font_missing = True
+                # Attempt a very basic fallback if the specified font isn't found
+                try:
+                    font = ImageFont.load_default(size) # Scalable on Pillow 10.1+ with FreeType
+                except TypeError:
+                    font = ImageFont.load_default() # Very basic, might not look good
+            self._fonts[size] = font
+            self._word_widths[size] = WordWidths(font)
+        return font
+
+    def _block_height(self, font, line_count: int) -> int:
+        """Height of `line_count` lines drawn with multiline_text: Pillow advances each line by the
+        height of "A" plus the spacing, and the last line takes the font's full ascent and descent."""
+        ascent, descent = font.getmetrics()
+        line_advance = font.getbbox("A")[3] + TITLE_LINE_SPACING
+        return (line_count - 1) * line_advance + ascent + descent
+
+    def fit_title(self, title: str, box_width: int, box_height: int) -> tuple:
+        """Binary-searches the largest font size from MIN_TITLE_FONT_SIZE to TITLE_FONT_SIZE whose wrapped
+        title fits the box. Returns (font, lines, block height); the smallest size if nothing fits."""
+        words = title.split()
+        low, high = MIN_TITLE_FONT_SIZE, TITLE_FONT_SIZE
+        best = None
+        while low <= high:
+            size = (low + high) // 2
+            font = self._font(size)
+            widths = self._word_widths[size]
+            lines = wrap_text(title, font, box_width, widths)
+            block_height = self._block_height(font, max(1, len(lines)))
+            if block_height <= box_height and all(widths(word) <= box_width for word in words):
+                best = (font, lines, block_height)
+                low = size + 1
+            else:
+                high = size - 1
+        if best is None:
+            font = self._font(MIN_TITLE_FONT_SIZE)
+            lines = wrap_text(title, font, box_width, self._word_widths[MIN_TITLE_FONT_SIZE])
+            print(f"Warning: Title doesn't fit the title box even at font size {MIN_TITLE_FONT_SIZE}; it will overflow.")
+            best = (font, lines, self._block_height(font, max(1, len(lines))))
+        return best
+
+    def _logo_path(self, subreddit: str) -> str | None:
+        community_logo_path = os.path.join(self.logo_dir, f"{subreddit.lower()}.png")
+        if os.path.exists(community_logo_path):
+            return community_logo_path
+        default_community_logo_path = os.path.join(self.logo_dir, "default.png")
+        if os.path.exists(default_community_logo_path):
+            return default_community_logo_path
+        return None
+
+    def _logo(self, logo_path: str | None) -> Image.Image | None:
+        if logo_path is None:
+            return None
+        if logo_path not in self._logos:
+            with Image.open(logo_path) as logo:
+                self._logos[logo_path] = logo.convert("RGBA").resize(LOGO_SIZE)
+        return self._logos[logo_path]
+
+    def card_key(self, title: str, subreddit: str) -> str:
+        """Hash of everything that affects the card's pixels."""
+        digest = hashlib.sha256()
+        for part in (str(CARD_LAYOUT_VERSION), title, self.font_name, str(TITLE_FONT_SIZE), str(MIN_TITLE_FONT_SIZE),
+                     _file_signature(self.template_path), _file_signature(self._logo_path(subreddit))):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:24]
+
+    def render(self, title: str, subreddit: str = "local_story") -> TitleCard | None:
+        """The title card for a story, from memory, the card cache or freshly drawn."""
+        key = self.card_key(title, subreddit)
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+                return card
+            card = self._load_cached(key) or self._draw(key, title, subreddit)
+            if card is not None:
+                self._cards[key] = card
+                while len(self._cards) > CARDS_IN_MEMORY:
+                    self._cards.popitem(last=False)
+            return card
+
+    def _load_cached(self, key: str) -> TitleCard | None:
+        path = os.path.join(title_card_cache_dir, f"{key}.png")
         try:
-            title_font = ImageFont.load_default() # Very basic, might not look good
-            print("Warning: Using default Pillow font due to error with Montserrat-ExtraBold.")
-        except Exception as e_font_fallback:
-            print(f"Error loading default font: {e_font_fallback}. Cannot draw title.")
-            return
-
-    draw = ImageDraw.Draw(story_template)
-
-    if os.path.exists(community_logo_path):
-        community_logo_img = Image.open(community_logo_path)
-    elif os.path.exists(default_community_logo_path):
-        community_logo_img = Image.open(default_community_logo_path)
-    else:
-        print(f"Warning: Default community logo not found at {default_community_logo_path}. Skipping logo.")
-        community_logo_img = None
-
-    if community_logo_img:
-        community_logo_img = community_logo_img.resize((244, 244))
-        story_template.paste(community_logo_img, (222, 368), mask=community_logo_img if community_logo_img.mode == 'RGBA' else None)
-
-    # --- Text Wrapping and Drawing for Title ---
-    # Using a simpler wrap_text logic for now. Pillow's TextWrapper is not in older versions.
-    # For complex cases, a more sophisticated text engine or manual line breaking based on draw.textbbox is better.
-    
-    # Simple line wrapper (based on character count per line, then join - from original code)
-    # This is less accurate than width-based wrapping. We'll try to improve.
-    # characters_to_linebreak = int(title_box_width / (title_font_size * 0.45)) # Rough estimate of chars per line
-    # if characters_to_linebreak == 0: characters_to_linebreak = 10 # Avoid zero div / too small
-    # chunks = []
-    # current_line_start = 0
-    # while current_line_start < len(submission_title):
-    #     line_end = current_line_start + characters_to_linebreak
-    #     if line_end < len(submission_title):
-    #         # Try to break at a space
-    #         actual_line_end = submission_title.rfind(' ', current_line_start, line_end + 1)
-    #         if actual_line_end == -1 or actual_line_end < current_line_start: # No space found, or space is before start
-    #             actual_line_end = line_end # Break mid-word if no space
-    #     else:
-    #         actual_line_end = len(submission_title)
-    #     chunks.append(submission_title[current_line_start:actual_line_end].strip())
-    #     current_line_start = actual_line_end + 1 # Skip the space if broken at space
-    # wrapped_title_text = '\n'.join(chunks)
-
-    # Improved wrapping using the helper (still basic, assumes `font.getlength` works)
-    wrapped_lines = wrap_text(submission_title, title_font, title_box_width)
-    wrapped_title_text = '\n'.join(wrapped_lines)
-
-    # If you have Pillow 9.2.0+ you can use multiline_textbbox for better vertical centering and fit checking.
-    # For now, we draw at top of box and rely on fixed line spacing.
-    # Anchor 'lt' means top-left for the text block.
-    # To center within the box, more calculations are needed (get text block height, then offset top).
-    
-    # Get the bounding box of the wrapped text to help with centering (optional, but good for alignment)
-    try:
-        # text_bbox for Pillow 9.2.0+
-        # For older versions, this specific call might not exist or behave differently.
-        # draw.multiline_textbbox((0,0), wrapped_title_text, font=title_font, spacing=4) # spacing is line spacing
-        # If using an older Pillow, one might have to render to a dummy image to get size or sum line heights.
-        # For now, let's use a default spacing and align top-left in the box.
-        text_x = title_box_left
-        text_y = title_box_top
-        line_spacing = 10 # Adjust as needed for the chosen font size
-
-        # Vertical centering: (needs text block height)
-        #_, _, _, text_block_bottom = draw.multiline_textbbox((text_x, text_y), wrapped_title_text, font=title_font, spacing=line_spacing)
-        #text_block_height = text_block_bottom - text_y # This is not quite right, text_y is not 0 for bbox calc relative to (0,0)
-        # A better way: sum heights or use bbox with (0,0) as origin
-        # For simplicity, let's just draw from the top of the box for now and adjust line spacing.
-        # True vertical centering within the box title_box_height would involve:
-        # 1. Get total height of wrapped_title_text with chosen font and spacing.
-        # 2. text_y = title_box_top + (title_box_height - total_text_height) / 2
-
-        draw.multiline_text(
-            (text_x, text_y),
-            wrapped_title_text,
-            fill=(35, 31, 32, 255), # Black, fully opaque
-            font=title_font,
-            spacing=line_spacing, # Line spacing
-            align='left' # 'left', 'center', or 'right' (horizontal alignment of lines)
-        )
-        print(f"Title drawn in box ({title_box_left},{title_box_top})-({title_box_right},{title_box_bottom}) with font size {title_font_size}.")
-
-    except Exception as e_draw:
-        print(f"Error drawing multiline text for title: {e_draw}")
-
-    # Since the template now provides all other UI elements (r/AITA, scores, etc.),
-    # we remove the script's logic for drawing those.
-    # The original code for drawing author, timestamp, scores, community logo is now removed.
+            with Image.open(path) as cached:
+                image = cached.convert("RGBA")
+        except (OSError, ValueError):
+            return None
+        return TitleCard(key, image.width, image.height, image.tobytes())
+
+    def _draw(self, key: str, title: str, subreddit: str) -> TitleCard | None:
+        template = self._load_template()
+        if template is None:
+            return None
+        template_width, template_height = template.size
+
+        # Calculate title box coordinates
+        offset_left, offset_top, offset_right, offset_bottom = TITLE_BOX_OFFSETS
+        title_box_left = offset_left
+        title_box_top = offset_top
+        title_box_width = template_width - offset_right - title_box_left
+        title_box_height = template_height - offset_bottom - title_box_top # Calculated for completeness
+        if title_box_width <= 0 or title_box_height <= 0:
+            print(f"Error: Calculated title box dimensions are invalid (width: {title_box_width}, height: {title_box_height}). "
+                  "Check template size and offsets.")
+            return None
+
+        card = template.copy()
+        logo = self._logo(self._logo_path(subreddit))
+        if logo is not None:
+            card.paste(logo, LOGO_POSITION, mask=logo)
+        else:
+            print(f"Warning: Default community logo not found in {self.logo_dir}. Skipping logo.")
 
+        # Largest font size whose wrapped title fits the box, with the block centred vertically in it
+        title_font, title_lines, block_height = self.fit_title(title, title_box_width, title_box_height)
+        wrapped_title_text = '\n'.join(title_lines)
+        text_y = title_box_top + max(0, (title_box_height - block_height) // 2)
+        try:
+            ImageDraw.Draw(card).multiline_text(
+                (title_box_left, text_y),
+                wrapped_title_text,
+                fill=TITLE_COLOR,
+                font=title_font,
+                spacing=TITLE_LINE_SPACING, # Line spacing
+                align='left' # 'left', 'center', or 'right' (horizontal alignment of lines)
+            )
+        except Exception as e_draw:
+            print(f"Error drawing multiline text for title: {e_draw}")
+
+        return TitleCard(key, card.width, card.height, card.tobytes())
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_title_card_renderer() -> TitleCardRenderer:
+    """The process-wide renderer, so the template, fonts and logos are loaded once."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = TitleCardRenderer()
+        return _renderer
+
+
+def generate_reddit_story_image(**kwargs) -> TitleCard | None:
+    """Renders the title card for a story; pass the result to create_short_video as `title_card`."""
+    # subreddit will be music_type or 'local_story' passed from main.py
+    subreddit = str(kwargs.get('subreddit', 'local_story'))
+    submission_title = str(kwargs.get('title', 'Untitled Story'))
     try:
-        story_template.save(submission_image_path)
-        print(f"Submission image saved to: {submission_image_path}")
+        card = get_title_card_renderer().render(submission_title, subreddit)
     except Exception as e:
-        print(f"Error saving submission image: {e}")
-
-    # story_template.show() # Keep commented out unless debugging
+        print(f"Error rendering title card: {e}")
+        return None
+    if card is not None:
+        print(f"Title card ready ({card.width}x{card.height}, key {card.key}).")
+    return card
@@ -21,11 +21,23 @@ import shutil # For ensuring temp directories exist
 # The actual tts function and Voice enum are in tiktok_voice.src
 from reddit_shorts.tiktok_voice.src.text_to_speech import tts as tiktok_library_tts
 from reddit_shorts.tiktok_voice.src.voice import Voice
+from reddit_shorts.stage_limits import stage_slot
+from reddit_shorts.config import tts_cache_path, tts_cache_max_bytes
+from reddit_shorts.tts_cache import TTSCache
+from reddit_shorts.tracing import span, file_size
 
 # Default voice mapping to the new library's enum
 # Voice.US_FEMALE_2 maps to 'en_us_002'
 DEFAULT_TIKTOK_VOICE_ENUM = Voice.US_FEMALE_2
 
+# Shared by every render in the process; re-renders of a story cost no TTS requests
+tts_cache = TTSCache(tts_cache_path, tts_cache_max_bytes) if tts_cache_max_bytes > 0 else None
+
+
+def _measure_chunks(chunk_durations: list) -> list[dict]:
+    """Turns the (text, duration) pairs returned by the TTS library into [{'text', 'duration'}] for subtitle timing."""
+    return [{'text': text_chunk, 'duration': duration} for text_chunk, duration in chunk_durations]
+
 def generate_gtts_for_story(title: str, text_content: str, story_id: str, temp_dir: str) -> dict:
     """
     Generates TTS audio for title and content using gTTS and saves them to the specified temp_dir.
@@ -86,14 +98,17 @@ def generate_gtts_for_story(title: str, text_content: str, story_id: str, temp_d
         'content_tts_path': content_tts_path # Matching key expected by create_short_video (originally narrator_content_track)
     }
 
-def generate_tiktok_tts_for_story(title: str, text_content: str, story_id: str, temp_dir: str, **kwargs) -> dict:
+def generate_tiktok_tts_for_story(title: str, text_content: str, story_id: str, temp_dir: str, tracks: tuple = ("title", "content"), **kwargs) -> dict:
     """
     Generates TTS audio for title and content using the mark-rez/TikTok-Voice-TTS library
     and saves them to the specified temp_dir.
     Accepts an optional 'voice' kwarg for the voice code (e.g., 'en_us_002').
-    Returns a dictionary with paths to the generated TTS files.
+    `tracks` limits generation to the title or content track, so the two can run as separate pipeline stages.
+    Returns a dictionary with paths to the generated TTS files, plus the text and measured
+    duration of every chunk each file was assembled from (used for script-timed subtitles)
+    and the code of the voice that actually spoke ('tts_voice', for loudness normalisation).
     """
-    generated_paths = {'video_tts_path': None, 'content_tts_path': None}
+    generated_paths = {'video_tts_path': None, 'content_tts_path': None, 'video_tts_chunks': None, 'content_tts_chunks': None}
     selected_voice_code = kwargs.get('voice', None)
     
     active_voice_enum = DEFAULT_TIKTOK_VOICE_ENUM
@@ -105,6 +120,7 @@ def generate_tiktok_tts_for_story(title: str, text_content: str, story_id: str,
         except ValueError:
             print(f"Warning: Invalid voice code '{selected_voice_code}' provided. Falling back to default voice {DEFAULT_TIKTOK_VOICE_ENUM.value}.")
             # active_voice_enum remains DEFAULT_TIKTOK_VOICE_ENUM
+    generated_paths['tts_voice'] = active_voice_enum.value
 
     if not title and not text_content:
         print("Error: Both title and text content are empty. Cannot generate TTS.")
@@ -114,19 +130,26 @@ def generate_tiktok_tts_for_story(title: str, text_content: str, story_id: str,
     os.makedirs(temp_dir, exist_ok=True)
     
     # --- Generate TTS for Title ---
-    if title:
+    if "title" not in tracks:
+        pass
+    elif title:
         title_tts_filename = f"title_{story_id}.mp3"
         title_tts_path = os.path.join(temp_dir, title_tts_filename)
         print(f"Generating TikTok TTS for title using new library: {title[:50]}...")
         try:
-            tiktok_library_tts(
-                text=title,
-                voice=active_voice_enum,
-                output_file_path=title_tts_path,
-                play_sound=False
-            )
+            with span("tts.track", track="title", voice=active_voice_enum.value) as track_span, stage_slot("tts"):
+                track_span.bytes_in = len(title.encode("utf-8"))
+                title_chunk_durations = tiktok_library_tts(
+                    text=title,
+                    voice=active_voice_enum,
+                    output_file_path=title_tts_path,
+                    play_sound=False,
+                    cache=tts_cache
+                )
+                track_span.bytes_out = file_size(title_tts_path)
             if os.path.exists(title_tts_path) and os.path.getsize(title_tts_path) > 0:
                 generated_paths['video_tts_path'] = title_tts_path
+                generated_paths['video_tts_chunks'] = _measure_chunks(title_chunk_durations)
                 print(f"Title TTS successfully generated: {title_tts_path}")
             else:
                 print(f"Error: Title TTS file not generated or empty by new library. Path: {title_tts_path}")
@@ -138,20 +161,27 @@ def generate_tiktok_tts_for_story(title: str, text_content: str, story_id: str,
         print("Title is empty, skipping title TTS generation.")
 
     # --- Generate TTS for Content ---
-    if text_content:
+    if "content" not in tracks:
+        pass
+    elif text_content:
         content_tts_filename = f"content_{story_id}.mp3"
         content_tts_path = os.path.join(temp_dir, content_tts_filename)
         print(f"Generating TikTok TTS for content using new library (first 50 chars): {text_content[:50]}...")
         try:
             # For content, the library handles splitting long text internally
-            tiktok_library_tts(
-                text=text_content,
-                voice=active_voice_enum,
-                output_file_path=content_tts_path,
-                play_sound=False
-            )
+            with span("tts.track", track="content", voice=active_voice_enum.value) as track_span, stage_slot("tts"):
+                track_span.bytes_in = len(text_content.encode("utf-8"))
+                content_chunk_durations = tiktok_library_tts(
+                    text=text_content,
+                    voice=active_voice_enum,
+                    output_file_path=content_tts_path,
+                    play_sound=False,
+                    cache=tts_cache
+                )
+                track_span.bytes_out = file_size(content_tts_path)
             if os.path.exists(content_tts_path) and os.path.getsize(content_tts_path) > 0:
                 generated_paths['content_tts_path'] = content_tts_path
+                generated_paths['content_tts_chunks'] = _measure_chunks(content_chunk_durations)
                 print(f"Content TTS successfully generated: {content_tts_path}")
             else:
                 print(f"Error: Content TTS file not generated or empty by new library. Path: {content_tts_path}")
@@ -0,0 +1,111 @@
+from typing import Iterator
+
+# Minimal MPEG audio frame parser. The TikTok endpoints return plain MPEG-1/2 Layer III
+# streams, so frame headers are enough to measure durations without spawning ffprobe.
+
+_BITRATES_KBPS = {
+    # (mpeg1, layer3) and (mpeg2/2.5, layer3)
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+
+def _id3v2_size(data: bytes, pos: int = 0) -> int:
+    """Length of an ID3v2 tag starting at pos, or 0 if there isn't one."""
+    if data[pos:pos + 3] != b'ID3' or len(data) < pos + 10:
+        return 0
+    size = 0
+    for byte in data[pos + 6:pos + 10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[pos + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _parse_header(data: bytes, pos: int) -> tuple[int, int, int] | None:
+    """Returns (frame_length, samples, sample_rate) for a Layer III frame header at pos."""
+    if pos + 4 > len(data):
+        return None
+    b1, b2 = data[pos + 1], data[pos + 2]
+    if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # reserved values, free-format or not Layer III
+
+    mpeg1 = version == 3
+    bitrate = _BITRATES_KBPS[mpeg1][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples = 1152 if mpeg1 else 576
+    frame_length = (samples // 8) * bitrate // sample_rate + padding
+    if frame_length < 4:
+        return None
+    return frame_length, samples, sample_rate
+
+
+def _is_info_frame(data: bytes, pos: int) -> bool:
+    """True for the Xing/Info/VBRI header frame encoders put first; it carries no audio."""
+    mpeg1 = (data[pos + 1] >> 3) & 0x03 == 3
+    mono = (data[pos + 3] >> 6) & 0x03 == 3
+    side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing_offset = pos + 4 + side_info
+    return data[xing_offset:xing_offset + 4] in (b'Xing', b'Info') or data[pos + 36:pos + 40] == b'VBRI'
+
+
+def iter_frames(data: bytes) -> Iterator[tuple[int, int, int, int]]:
+    """Yields (offset, frame_length, samples, sample_rate) for every audio frame in data."""
+    pos = _id3v2_size(data)
+    first = True
+    while pos < len(data):
+        header = _parse_header(data, pos)
+        if header is None:
+            # Resynchronise on the next frame sync word (skips junk and trailing ID3v1/APE tags)
+            next_sync = data.find(b'\xff', pos + 1)
+            if next_sync == -1:
+                return
+            pos = next_sync
+            continue
+
+        frame_length, samples, sample_rate = header
+        if pos + frame_length > len(data):
+            return  # truncated final frame
+        if not (first and _is_info_frame(data, pos)):
+            yield pos, frame_length, samples, sample_rate
+        first = False
+        pos += frame_length
+
+
+def mp3_duration(data: bytes) -> float:
+    """Duration in seconds of an MP3 byte string, computed from its frame headers."""
+    return sum(samples / sample_rate for _, _, samples, sample_rate in iter_frames(data))
+
+
+def audio_frames(data: bytes) -> tuple[bytes, float]:
+    """The audio frames of an MP3 byte string without its ID3 tags or Xing/Info header, and their duration.
+    Streams stripped this way can be appended to each other and still play (and probe) as one MP3.
+    Data with no recognisable frames is returned unchanged, with a duration of 0."""
+    runs = []  # contiguous (start, end) spans of frames; usually one per chunk
+    duration = 0.0
+    for offset, frame_length, samples, sample_rate in iter_frames(data):
+        if runs and runs[-1][1] == offset:
+            runs[-1][1] = offset + frame_length
+        else:
+            runs.append([offset, offset + frame_length])
+        duration += samples / sample_rate
+    if not runs:
+        return data, 0.0
+    if len(runs) == 1 and runs[0] == [0, len(data)]:
+        return data, duration
+    view = memoryview(data)
+    return b"".join(view[start:end] for start, end in runs), duration
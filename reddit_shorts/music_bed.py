@@ -0,0 +1,107 @@
+import hashlib
+import math
+import os
+import threading
+
+import ffmpeg
+
+from reddit_shorts.config import music_bed_cache_dir, music_bed_bucket, music_loudness_target
+from reddit_shorts.loudness_index import file_loudness, normalise
+from reddit_shorts.probe_index import stream_info
+from reddit_shorts.tracing import span, traced_ffmpeg_run
+
+# Ready-to-mix music beds. A bed is a music track looped with crossfades to cover a duration bucket
+# (a multiple of music_bed_bucket seconds), stored as FLAC under temp/cache/music_beds. It is brought
+# to music_loudness_target with one linear loudnorm pass from the track's stored loudness (see
+# loudness_index.py), or set to the track's configured volume if the track can't be measured.
+# The track is decoded once per bed: asplit copies the decoded audio to every loop instead of
+# opening the file once per loop. A render only trims a bed to its narration length and fades it
+# out, and every story whose narration falls in the same bucket reuses the bed.
+
+BED_VERSION = 2  # bump when the bed recipe below changes, so stale beds aren't reused
+BED_CROSSFADE = 5.0  # seconds of crossfade between loops
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+
+def bed_length(duration: float, bucket: float = music_bed_bucket) -> float:
+    """Length of the bed that covers `duration` seconds: the next whole bucket."""
+    return max(1, math.ceil(duration / bucket)) * bucket
+
+
+def _bed_key(music_path: str, length: float, level: str) -> str:
+    stat = os.stat(music_path)
+    digest = hashlib.sha256()
+    for part in (BED_VERSION, os.path.abspath(music_path), stat.st_size, stat.st_mtime_ns, f"{length:.3f}", level):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _build_locks_lock:
+        lock = _build_locks.get(key)
+        if lock is None:
+            lock = _build_locks[key] = threading.Lock()
+        return lock
+
+
+def _build_bed(music_path: str, track_duration: float, length: float, volume: float, loudness: dict | None, bed_path: str) -> None:
+    crossfade = min(BED_CROSSFADE, track_duration / 4)
+    # Each loop after the first adds the track length minus the crossfade
+    loops = 1 if track_duration >= length else math.ceil((length - track_duration) / (track_duration - crossfade)) + 1
+
+    track = ffmpeg.input(music_path)
+    if loops == 1:
+        bed = track.audio
+    else:
+        copies = track.audio.filter_multi_output('asplit', loops)
+        bed = copies[0]
+        for i in range(1, loops):
+            # acrossfade joins two streams, so the loops are chained pairwise
+            bed = ffmpeg.filter([bed, copies[i]], 'acrossfade', d=crossfade, c1='tri', c2='tri')
+    bed = bed.filter('atrim', start=0, end=length).filter('asetpts', 'PTS-STARTPTS')
+    # Looping doesn't change a track's integrated loudness, so the track's measurement holds for the bed
+    bed = normalise(bed, loudness, music_loudness_target) if loudness else bed.filter('volume', volume)
+
+    # Written next to the final name and renamed, so another process never mixes a half-written bed
+    temp_path = f"{bed_path[:-len('.flac')]}.{os.getpid()}.{threading.get_ident()}.tmp.flac"
+    try:
+        traced_ffmpeg_run(bed.output(temp_path, acodec='flac'), "ffmpeg.music_bed", overwrite_output=True, quiet=True)
+        os.replace(temp_path, bed_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def music_bed(music_path: str, duration: float, volume: float) -> str | None:
+    """Path of a bed of `music_path` that lasts at least `duration` seconds, built on first use. The bed is
+    loudness-normalised when the track can be measured, otherwise set to `volume`. None if the track can't
+    be read or the bed can't be built (the caller renders without music)."""
+    try:
+        track_duration = float(stream_info(music_path, 'audio')['duration'])
+        length = bed_length(duration)
+        loudness = file_loudness(music_path)
+        level = f"lufs:{music_loudness_target}" if loudness else f"volume:{volume:.4f}"
+        key = _bed_key(music_path, length, level)
+    except Exception as e:
+        print(f"Error reading music track {music_path}: {e}. Continuing without music.")
+        return None
+    if track_duration <= 0:
+        print(f"Music track {music_path} has no duration. Continuing without music.")
+        return None
+
+    bed_path = os.path.join(music_bed_cache_dir, f"{key}.flac")
+    with _lock_for(key):
+        if os.path.exists(bed_path):
+            return bed_path
+        try:
+            os.makedirs(music_bed_cache_dir, exist_ok=True)
+            with span("music_bed.build", track=os.path.basename(music_path), length=length):
+                _build_bed(music_path, track_duration, length, volume, loudness, bed_path)
+            print(f"Music bed built ({length:.0f}s of {os.path.basename(music_path)}): {bed_path}")
+            return bed_path
+        except Exception as e:
+            print(f"Error building music bed for {music_path}: {e}. Continuing without music.")
+            return None
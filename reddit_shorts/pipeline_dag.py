@@ -0,0 +1,115 @@
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import get_context
+from typing import Any, Callable
+
+from reddit_shorts.tracing import span
+
+# A story's render as a small graph of stages. A stage starts as soon as the stages it depends on
+# have finished, so independent work (the title and content TTS, the title card, picking and
+# probing footage and music) overlaps, and a render takes about as long as its critical path
+# (TTS -> subtitles -> encode) rather than the sum of its stages. Every stage runs in a thread
+# under its own stage.<name> span; a stage marked executor="process" is handed from that thread
+# to a shared process pool, for CPU-bound Python work that would otherwise hold the GIL.
+
+EXECUTORS = ("thread", "process")
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+@dataclass
+class Stage:
+    name: str
+    # Called with the results of the stages in `after` as keyword arguments, keyed by stage name.
+    # Process stages must be picklable: a module-level function or a functools.partial of one.
+    run: Callable[..., Any]
+    after: tuple[str, ...] = ()
+    executor: str = "thread"
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Shared by every graph in the process, so worker start-up (and their imports) are paid once."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn rather than fork: forking a process that runs render threads can copy held locks
+            _process_pool = ProcessPoolExecutor(mp_context=get_context("spawn"))
+        return _process_pool
+
+
+class StageGraph:
+    def __init__(self, stages: list[Stage]):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage '{stage.name}'")
+            if stage.executor not in EXECUTORS:
+                raise ValueError(f"Unknown executor '{stage.executor}' for stage '{stage.name}'. Choose one of: {', '.join(EXECUTORS)}")
+            self.stages[stage.name] = stage
+        for stage in stages:
+            missing = [name for name in stage.after if name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {', '.join(missing)}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> list[str]:
+        """Stage names with every stage after its dependencies, in declaration order where there's a choice."""
+        order = []
+        done = set()
+        remaining = list(self.stages)
+        while remaining:
+            ready = [name for name in remaining if all(dep in done for dep in self.stages[name].after)]
+            if not ready:
+                raise ValueError(f"Stage graph has a cycle between: {', '.join(remaining)}")
+            for name in ready:
+                order.append(name)
+                done.add(name)
+                remaining.remove(name)
+        return order
+
+    def _run_stage(self, stage: Stage, inputs: dict) -> Any:
+        with span(f"stage.{stage.name}", executor=stage.executor):
+            if stage.executor == "process":
+                return _get_process_pool().submit(stage.run, **inputs).result()
+            return stage.run(**inputs)
+
+    def run(self, max_workers: int | None = None) -> dict:
+        """Runs every stage, each once its dependencies are done, at most `max_workers` at a time
+        (1 runs them one after another). Returns {stage name: result}. If a stage raises, no further
+        stages are started, the running ones are waited for, and the first error is re-raised."""
+        max_workers = max(1, max_workers or len(self.stages))
+        results = {}
+        running = {}  # future -> stage name
+        error = None
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+            pending = list(self.order)
+            while pending or running:
+                if error is None:
+                    ready = [name for name in pending if all(dep in results for dep in self.stages[name].after)]
+                    # Top up to max_workers so queued stages don't hide behind the pool's own queue
+                    for name in ready[:max_workers - len(running)]:
+                        pending.remove(name)
+                        stage = self.stages[name]
+                        inputs = {dep: results[dep] for dep in stage.after}
+                        # Each stage runs in a copy of the caller's context, so its span nests under the caller's
+                        future = pool.submit(contextvars.copy_context().run, self._run_stage, stage, inputs)
+                        running[future] = name
+                elif not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        if error is None:
+                            error = e
+
+        if error is not None:
+            raise error
+        return results
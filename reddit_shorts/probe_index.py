@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import ffmpeg
+
+from reddit_shorts.config import probe_index_path
+from reddit_shorts.tracing import span
+
+# Persistent index of ffprobe results. Background footage and music never change between renders,
+# yet every render used to probe them again, and each ffprobe spawn costs 50-200 ms. Entries are
+# keyed by path, size and mtime, so an edited or replaced file is simply probed again.
+
+_local = threading.local()
+_memory = {}  # (path, size, mtime_ns) -> summary; spares the SQLite lookup for repeat probes in one process
+_memory_lock = threading.Lock()
+_pruned = False
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread; SQLite connections can't be shared across threads."""
+    global _pruned
+    db = getattr(_local, 'db', None)
+    if db is not None:
+        return db
+
+    os.makedirs(os.path.dirname(probe_index_path), exist_ok=True)
+    db = sqlite3.connect(probe_index_path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS media_probes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            probe TEXT NOT NULL,
+            probed_at REAL NOT NULL
+        );
+        """)
+    if not _pruned:
+        # Drop entries for files that are gone (e.g. per-render TTS tracks in temp/)
+        _pruned = True
+        stale = [(path,) for (path,) in db.execute("SELECT path FROM media_probes") if not os.path.exists(path)]
+        if stale:
+            db.executemany("DELETE FROM media_probes WHERE path = ?", stale)
+    db.commit()
+    _local.db = db
+    return db
+
+
+def _frame_rate(rate: str | None) -> float | None:
+    if not rate or rate == "0/0":
+        return None
+    try:
+        numerator, _, denominator = rate.partition("/")
+        return round(float(numerator) / float(denominator or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _float_or_none(value) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _summarize(probe: dict) -> dict:
+    """Keeps the parts of an ffprobe result the pipeline uses: durations, codecs, resolution, fps and stream layout."""
+    format_info = probe.get('format', {})
+    streams = []
+    for stream in probe.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'codec_type': stream.get('codec_type'),
+            'codec_name': stream.get('codec_name'),
+            'duration': _float_or_none(stream.get('duration')),
+            'width': stream.get('width'),
+            'height': stream.get('height'),
+            'fps': _frame_rate(stream.get('avg_frame_rate') or stream.get('r_frame_rate')),
+            'pix_fmt': stream.get('pix_fmt'),
+            'sample_rate': int(stream['sample_rate']) if stream.get('sample_rate') else None,
+            'channels': stream.get('channels'),
+            'channel_layout': stream.get('channel_layout'),
+        })
+    return {
+        'duration': _float_or_none(format_info.get('duration')),
+        'format_name': format_info.get('format_name'),
+        'bit_rate': int(format_info['bit_rate']) if format_info.get('bit_rate') else None,
+        'streams': streams,
+    }
+
+
+def probe_media(path: str) -> dict | None:
+    """Returns the probe summary for path, from the index when the file is unchanged, otherwise from ffprobe."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with _memory_lock:
+        summary = _memory.get(key)
+    if summary is not None:
+        return summary
+
+    db = _connect()
+    row = db.execute("SELECT size, mtime_ns, probe FROM media_probes WHERE path = ?", (key[0],)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        summary = json.loads(row[2])
+    else:
+        with span("ffprobe") as probe_span:
+            probe_span.bytes_in = stat.st_size
+            summary = _summarize(ffmpeg.probe(path))
+        db.execute(
+            "INSERT OR REPLACE INTO media_probes (path, size, mtime_ns, probe, probed_at) VALUES (?, ?, ?, ?, ?)",
+            (key[0], stat.st_size, stat.st_mtime_ns, json.dumps(summary), time.time())
+        )
+        db.commit()
+
+    with _memory_lock:
+        _memory[key] = summary
+    return summary
+
+
+def stream_info(path: str, codec_type: str) -> dict | None:
+    """The first stream of codec_type ('audio' or 'video') in path, with its duration falling back to the container's."""
+    summary = probe_media(path)
+    if not summary:
+        return None
+    stream = next((s for s in summary['streams'] if s['codec_type'] == codec_type), None)
+    if stream is None:
+        return None
+    if stream.get('duration') is None:
+        stream = {**stream, 'duration': summary.get('duration')}
+    return stream
@@ -1,102 +1,149 @@
+import os
 import sqlite3
+import threading
 
+from reddit_shorts.config import shorts_db_path
 
-def create_tables():
-    db = sqlite3.connect("shorts.db")
-    cursor = db.cursor()
+# Ledger of uploaded videos and admin posts. Each thread keeps one long-lived WAL connection instead
+# of connecting per query. The unique indexes double as covering indexes: an existence check reads
+# only the index b-tree, so it stays O(log n) however many uploads are recorded. The bulk functions
+# answer many checks in one query.
+
+BULK_CHUNK = 400  # pairs per query; keeps bound parameters well under SQLite's limit
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread and database path; SQLite connections can't be shared across threads."""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    db = connections.get(shorts_db_path)
+    if db is not None:
+        return db
 
-    create_uploads_table = """
+    db_dir = os.path.dirname(shorts_db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    db = sqlite3.connect(shorts_db_path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    _create_schema(db)
+    connections[shorts_db_path] = db
+    return db
+
+
+def _has_index(db: sqlite3.Connection, name: str) -> bool:
+    return db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is not None
+
+
+def _create_schema(db: sqlite3.Connection) -> None:
+    db.execute("""
     CREATE TABLE IF NOT EXISTS uploads (
-        id INT AUTO_INCREMENT PRIMARY KEY,
+        id INTEGER PRIMARY KEY,
         submission_id VARCHAR(30),
         top_comment_id VARCHAR(30)
     );
-    """
-
-    create_admin_table = """
+    """)
+    db.execute("""
     CREATE TABLE IF NOT EXISTS admin (
-        id INT AUTO_INCREMENT PRIMARY KEY,
+        id INTEGER PRIMARY KEY,
         submission_id VARCHAR(30)
     );
-    """
-
-    cursor.execute(create_uploads_table)
-    cursor.execute(create_admin_table)
-
+    """)
+
+    # Ledgers written before the unique indexes existed may hold duplicate rows; keep the first of each
+    if not _has_index(db, "uploads_pair"):
+        db.execute("""
+        DELETE FROM uploads WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM uploads GROUP BY submission_id, top_comment_id
+        );
+        """)
+        db.execute("CREATE UNIQUE INDEX uploads_pair ON uploads (submission_id, top_comment_id)")
+    if not _has_index(db, "admin_submission"):
+        db.execute("DELETE FROM admin WHERE rowid NOT IN (SELECT MIN(rowid) FROM admin GROUP BY submission_id)")
+        db.execute("CREATE UNIQUE INDEX admin_submission ON admin (submission_id)")
     db.commit()
 
-    cursor.close()
-    db.close()
 
+def create_tables():
+    _connect()
 
-def check_if_video_exists(submission_id: str, top_comment_id: str) -> bool:
-    db = sqlite3.connect("shorts.db")
-    cursor = db.cursor()
 
+def check_if_video_exists(submission_id: str, top_comment_id: str) -> bool:
     videos_query = """
-        SELECT * FROM uploads
+        SELECT 1 FROM uploads
         WHERE submission_id = ?
         AND top_comment_id = ?;
         """
 
-    cursor.execute(videos_query, (submission_id, top_comment_id))
-    rows = cursor.fetchall()
+    video_exists = _connect().execute(videos_query, (submission_id, top_comment_id)).fetchone() is not None
 
-    if len(rows) > 0:
-        video_exists = True
+    if video_exists:
         print("Video found in DB!")
 
     else:
-        video_exists = False
         print("Video not in DB!")
 
-    db.commit()
-    cursor.close()
-    db.close()
-
     return video_exists
 
 
-def write_to_db(submission_id: str, top_comment_id: str) -> None:
-    db = sqlite3.connect("shorts.db")
-    cursor = db.cursor()
+def existing_videos(pairs: list[tuple[str, str]]) -> set[tuple[str, str]]:
+    """The (submission_id, top_comment_id) pairs in `pairs` that already have a video, in one query per chunk."""
+    db = _connect()
+    pairs = list(dict.fromkeys(pairs))
+    found = set()
+    for start in range(0, len(pairs), BULK_CHUNK):
+        chunk = pairs[start:start + BULK_CHUNK]
+        values = ", ".join("(?, ?)" for _ in chunk)
+        params = [value for pair in chunk for value in pair]
+        # Each candidate pair is one probe of the uploads_pair index
+        rows = db.execute(f"""
+            WITH candidates (submission_id, top_comment_id) AS (VALUES {values})
+            SELECT uploads.submission_id, uploads.top_comment_id FROM candidates
+            JOIN uploads ON uploads.submission_id = candidates.submission_id
+            AND uploads.top_comment_id = candidates.top_comment_id;
+            """, params)
+        found.update(rows)
+    return found
 
-    write_to_videos = """
-    INSERT INTO uploads (submission_id, top_comment_id)
-    VALUES (?, ?);
-    """
 
-    cursor.execute(write_to_videos, (submission_id, top_comment_id))
-    db.commit()
+def write_to_db(submission_id: str, top_comment_id: str) -> None:
+    write_many_to_db([(submission_id, top_comment_id)])
 
     print("Updated DB")
 
-    cursor.close()
-    db.close()
 
+def write_many_to_db(pairs: list[tuple[str, str]]) -> None:
+    """Records uploads for many (submission_id, top_comment_id) pairs in one transaction; pairs already recorded are ignored."""
+    db = _connect()
 
-def check_for_admin_posts(submission_id: str) -> bool:
-    db = sqlite3.connect("shorts.db")
-    cursor = db.cursor()
+    write_to_videos = """
+    INSERT OR IGNORE INTO uploads (submission_id, top_comment_id)
+    VALUES (?, ?);
+    """
 
-    videos_query = """
-        SELECT * FROM admin
-        WHERE submission_id = ?;
-        """
+    with db:
+        db.executemany(write_to_videos, pairs)
 
-    cursor.execute(videos_query, (submission_id,))
-    rows = cursor.fetchall()
 
-    if len(rows) > 0:
-        admin_post = True
+def check_for_admin_posts(submission_id: str) -> bool:
+    admin_post = submission_id in admin_posts([submission_id])
+
+    if admin_post:
         print("This Submission was written by an Admin")
 
-    else:
-        admin_post = False
-        # print("Video not in DB!")
+    return admin_post
 
-    db.commit()
-    cursor.close()
-    db.close()
 
-    return admin_post
+def admin_posts(submission_ids: list[str]) -> set[str]:
+    """The IDs in `submission_ids` that are admin posts."""
+    db = _connect()
+    submission_ids = list(dict.fromkeys(submission_ids))
+    found = set()
+    for start in range(0, len(submission_ids), BULK_CHUNK):
+        chunk = submission_ids[start:start + BULK_CHUNK]
+        placeholders = ", ".join("?" for _ in chunk)
+        found.update(row[0] for row in db.execute(f"SELECT submission_id FROM admin WHERE submission_id IN ({placeholders})", chunk))
+    return found
@@ -0,0 +1,75 @@
+import threading
+from dataclasses import dataclass
+
+from reddit_shorts.config import cpu_count
+
+# Named render profiles. Every profile drives the same filter graph in create_short.py; they only
+# change the output size, frame rate, encoder settings and whether subtitles are burned in.
+#
+# x264 starts a thread per core by default, so several renders encoding at once on one machine
+# each spawn a full set and fight over the cores. Every encode therefore gets an explicit thread
+# count: the profile's own, or, in throughput mode (see set_encode_budget), an equal share of the
+# cores among the encodes allowed to run at once.
+
+
+@dataclass(frozen=True)
+class RenderProfile:
+    name: str
+    width: int
+    height: int
+    fps: int | None  # None keeps the footage frame rate
+    preset: str
+    crf: int
+    audio_bitrate: str
+    subtitles: bool = True
+    tune: str | None = None
+    keyint: int | None = None  # max frames between keyframes; None leaves x264's default
+    # VBV: caps the bitrate of a CRF encode (e.g. for upload size limits). Both or neither.
+    maxrate: str | None = None
+    bufsize: str | None = None
+    threads: int | None = None  # x264 threads for a lone encode; None uses every core
+
+
+RENDER_PROFILES = {
+    # Fast preview for iterating on a script in the web UI
+    'draft': RenderProfile('draft', width=540, height=960, fps=24, preset='ultrafast', crf=30, audio_bitrate='96k', subtitles=True,
+                           tune='fastdecode', keyint=48, threads=4),
+    # Publishing quality
+    'standard': RenderProfile('standard', width=1080, height=1920, fps=None, preset='medium', crf=23, audio_bitrate='192k', keyint=60),
+    # Master copy to re-edit or re-upload from later: slower preset, higher quality, bigger files
+    'archive': RenderProfile('archive', width=1080, height=1920, fps=None, preset='slow', crf=18, audio_bitrate='256k', tune='film', keyint=60),
+    # Publishing quality with the bitrate capped, for platforms with upload size limits (about 30 MB a minute)
+    'capped': RenderProfile('capped', width=1080, height=1920, fps=30, preset='medium', crf=23, audio_bitrate='128k', keyint=60,
+                            maxrate='4M', bufsize='8M'),
+}
+
+DEFAULT_RENDER_PROFILE = 'standard'
+
+_concurrent_encodes = None
+_budget_lock = threading.Lock()
+
+
+def get_render_profile(name: str | None = None) -> RenderProfile:
+    """Looks up a profile by name (default: standard)."""
+    name = name or DEFAULT_RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{name}'. Choose one of: {', '.join(RENDER_PROFILES)}")
+    return RENDER_PROFILES[name]
+
+
+def set_encode_budget(concurrent_encodes: int | None) -> None:
+    """Throughput mode: splits the machine's cores evenly between `concurrent_encodes` encodes running at
+    once (match the encode stage cap). None returns to each profile's own thread count."""
+    global _concurrent_encodes
+    with _budget_lock:
+        _concurrent_encodes = max(1, concurrent_encodes) if concurrent_encodes else None
+
+
+def encoder_threads(profile: RenderProfile) -> int:
+    """x264 threads for one encode with this profile under the current budget."""
+    with _budget_lock:
+        concurrent_encodes = _concurrent_encodes
+    own_threads = profile.threads or cpu_count
+    if concurrent_encodes is None:
+        return own_threads
+    return max(1, min(own_threads, cpu_count // concurrent_encodes))
@@ -0,0 +1,64 @@
+import threading
+from contextlib import contextmanager
+
+from reddit_shorts.tracing import span
+
+# Per-stage concurrency caps for renders running side by side in one process. A TTS slot covers a
+# whole track (its chunk requests are capped separately by the TTS client), and network-bound
+# tracks can run many at once, while Whisper and x264 already use every core they're given,
+# so running more of them at once than the caps allow only causes thrashing. A stage without a
+# cap (the default, e.g. for a single render) runs unrestricted.
+STAGES = ("tts", "whisper", "encode")
+
+_stage_semaphores = {}
+_stage_limits = {}
+_stage_in_use = {}
+_in_use_lock = threading.Lock()
+
+
+def configure_stage_limits(**limits: int | None) -> None:
+    """Sets the maximum number of concurrent calls per stage, e.g. configure_stage_limits(tts=8, whisper=1, encode=2).
+    A limit of None or 0 removes the cap for that stage."""
+    for stage, limit in limits.items():
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage '{stage}'. Choose one of: {', '.join(STAGES)}")
+        if limit:
+            _stage_semaphores[stage] = threading.BoundedSemaphore(limit)
+            _stage_limits[stage] = limit
+        else:
+            _stage_semaphores.pop(stage, None)
+            _stage_limits.pop(stage, None)
+
+
+def stage_limits() -> dict:
+    """The currently configured caps, keyed by stage."""
+    return dict(_stage_limits)
+
+
+def stage_slots_in_use() -> dict:
+    """Slots currently held per capped stage; a stage at its limit is the one saturating the pipeline."""
+    with _in_use_lock:
+        return {stage: _stage_in_use.get(stage, 0) for stage in _stage_limits}
+
+
+def _adjust_in_use(stage: str, delta: int) -> None:
+    with _in_use_lock:
+        _stage_in_use[stage] = _stage_in_use.get(stage, 0) + delta
+
+
+@contextmanager
+def stage_slot(stage: str):
+    """Holds one of the stage's slots for the duration of the block, waiting for a free one if the stage is capped."""
+    semaphore = _stage_semaphores.get(stage)
+    if semaphore is None:
+        yield
+        return
+    # The wait shows up as a slot_wait.<stage> span, so queueing for a saturated stage is visible in traces
+    with span(f"slot_wait.{stage}"):
+        semaphore.acquire()
+    _adjust_in_use(stage, 1)
+    try:
+        yield
+    finally:
+        _adjust_in_use(stage, -1)
+        semaphore.release()
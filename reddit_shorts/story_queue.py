@@ -0,0 +1,290 @@
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from reddit_shorts.config import story_queue_path, story_claim_timeout, story_max_attempts
+
+# Persistent selection queue for the stories in stories.txt. Every story has a state:
+#   pending -> rendering (claimed by a worker) -> done
+#                                             -> pending again after a failed render, rejected after story_max_attempts
+#   pending -> rejected (bad words, or gone from the file)
+# State lives in SQLite, so it survives restarts, and a claim is a single write transaction, so
+# several worker processes can pull from the same queue without rendering a story twice.
+# Claims older than story_claim_timeout (a worker that died mid-render) go back to pending, so a
+# process holding claims for a while (a batch that claims its stories up front) keeps them alive
+# with keep_alive, which refreshes claimed_at from a background thread.
+#
+# Random and weighted order don't sort the pending stories on every claim. Each story gets a
+# random key (and a weighted key) whenever it becomes pending, persisted and indexed with its
+# state, so a claim is one index lookup: the pending story with the lowest random key, or the
+# highest weighted key. The keys are drawn independently per story, so taking them in key order
+# is a uniformly random (or weighted random) order without replacement.
+
+STATES = ("pending", "rendering", "done", "rejected")
+ORDERS = ("fifo", "random", "weighted")
+
+# Weighted order samples without replacement (Efraimidis-Spirakis): the highest random()**(1/w) wins.
+# A story's effective weight halves with every failed attempt, so flaky stories drift to the back.
+_ORDER_SQL = {
+    "fifo": "position, added_at",
+    "random": "random_key",
+    "weighted": "weighted_key DESC",
+}
+
+# Fresh keys for a story going (back) to pending, as SQL assignments
+_REDRAW_KEYS = "random_key = draw_random_key(), weighted_key = draw_weighted_key(weight / (1 + attempts))"
+
+
+def _weighted_key(weight: float | None) -> float:
+    if not weight or weight <= 0:
+        return 0.0
+    return random.random() ** (1.0 / weight)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class StoryQueue:
+    def __init__(self, db_path: str, claim_timeout: float = story_claim_timeout, max_attempts: int = story_max_attempts):
+        self.db_path = db_path
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, in autocommit mode so claims can take the write lock up front with BEGIN IMMEDIATE."""
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            return db
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.create_function("draw_random_key", 0, random.random)
+        db.create_function("draw_weighted_key", 1, _weighted_key)
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS story_queue (
+                story_id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                weight REAL NOT NULL DEFAULT 1.0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                claimed_by TEXT,
+                claimed_at REAL,
+                reason TEXT,
+                video_path TEXT,
+                added_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                random_key REAL,
+                weighted_key REAL
+            );
+            """)
+        columns = {row[1] for row in db.execute("PRAGMA table_info(story_queue)")}
+        if "random_key" not in columns:
+            # Queues created before the order keys existed: add them, and key every story once
+            db.execute("ALTER TABLE story_queue ADD COLUMN random_key REAL")
+            db.execute("ALTER TABLE story_queue ADD COLUMN weighted_key REAL")
+            db.execute(f"UPDATE story_queue SET {_REDRAW_KEYS}")
+        db.execute("CREATE INDEX IF NOT EXISTS story_queue_state ON story_queue (state, position)")
+        db.execute("CREATE INDEX IF NOT EXISTS story_queue_random ON story_queue (state, random_key)")
+        db.execute("CREATE INDEX IF NOT EXISTS story_queue_weighted ON story_queue (state, weighted_key)")
+        db.execute("CREATE TABLE IF NOT EXISTS story_queue_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._local.db = db
+        return db
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        return self._connect().execute(sql, params).rowcount
+
+    def sync(self, store) -> int:
+        """Adds new stories from a StoryStore as pending and drops pending stories that left the file.
+        Only does work when the stories file changed since the last sync. Returns the number of stories added."""
+        db = self._connect()
+        signature = json.dumps(store.signature())
+        row = db.execute("SELECT value FROM story_queue_meta WHERE key = 'synced_signature'").fetchone()
+        if row and row[0] == signature:
+            return 0
+
+        story_ids = store.ids()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            known = db.execute("SELECT COUNT(*) FROM story_queue").fetchone()[0]
+            db.executemany(
+                "INSERT INTO story_queue (story_id, position, added_at, updated_at, random_key, weighted_key) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(story_id) DO UPDATE SET position = excluded.position",
+                ((story_id, position, now, now, random.random(), _weighted_key(1.0)) for position, story_id in enumerate(story_ids))
+            )
+            current = set(story_ids)
+            gone = [(story_id,) for (story_id,) in db.execute("SELECT story_id FROM story_queue WHERE state = 'pending'") if story_id not in current]
+            db.executemany("DELETE FROM story_queue WHERE story_id = ?", gone)
+            added = db.execute("SELECT COUNT(*) FROM story_queue").fetchone()[0] - known + len(gone)
+            db.execute("INSERT OR REPLACE INTO story_queue_meta (key, value) VALUES ('synced_signature', ?)", (signature,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        if added:
+            print(f"Story queue: {added} new stories pending.")
+        return added
+
+    def requeue_stale(self) -> int:
+        """Returns claims older than the claim timeout to pending (their worker is assumed dead)."""
+        requeued = self._write(
+            f"UPDATE story_queue SET state = 'pending', claimed_by = NULL, claimed_at = NULL, updated_at = ?, {_REDRAW_KEYS} "
+            "WHERE state = 'rendering' AND claimed_at < ?",
+            (time.time(), time.time() - self.claim_timeout)
+        )
+        if requeued:
+            print(f"Story queue: {requeued} stale claims returned to pending.")
+        return requeued
+
+    def claim(self, worker: str | None = None, order: str = "random") -> str | None:
+        """Atomically moves the next pending story (by `order`) to rendering and returns its ID, or None if none are pending."""
+        if order not in ORDERS:
+            raise ValueError(f"Unknown story order '{order}'. Choose one of: {', '.join(ORDERS)}")
+        self.requeue_stale()
+        db = self._connect()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the database write lock before the SELECT, so no other process
+        # can pick the same row between choosing it and marking it claimed
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(f"SELECT story_id FROM story_queue WHERE state = 'pending' ORDER BY {_ORDER_SQL[order]} LIMIT 1").fetchone()
+            if row:
+                db.execute(
+                    "UPDATE story_queue SET state = 'rendering', claimed_by = ?, claimed_at = ?, updated_at = ? WHERE story_id = ?",
+                    (worker or default_worker_id(), now, now, row[0])
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def claim_ids(self, story_ids: list[str], worker: str | None = None) -> list[str]:
+        """Claims specific stories whatever their state (an explicit re-render), except ones another worker is rendering."""
+        self.requeue_stale()
+        db = self._connect()
+        now = time.time()
+        claimed = []
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for story_id in story_ids:
+                row = db.execute("SELECT state FROM story_queue WHERE story_id = ?", (story_id,)).fetchone()
+                if row and row[0] == 'rendering':
+                    print(f"Story {story_id} is already being rendered by another worker. Skipping.")
+                    continue
+                if row:
+                    db.execute(
+                        "UPDATE story_queue SET state = 'rendering', claimed_by = ?, claimed_at = ?, updated_at = ? WHERE story_id = ?",
+                        (worker or default_worker_id(), now, now, story_id)
+                    )
+                    claimed.append(story_id)
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def touch(self, story_ids: list[str], worker: str | None = None) -> int:
+        """Refreshes the claim time of stories `worker` is still rendering, so requeue_stale leaves them alone."""
+        now = time.time()
+        worker = worker or default_worker_id()
+        return self._connect().executemany(
+            "UPDATE story_queue SET claimed_at = ?, updated_at = ? WHERE story_id = ? AND state = 'rendering' AND claimed_by = ?",
+            ((now, now, story_id, worker) for story_id in story_ids)
+        ).rowcount
+
+    @contextmanager
+    def keep_alive(self, story_ids: list[str], worker: str | None = None, interval: float | None = None):
+        """Touches the claims on story_ids every `interval` seconds (default: a quarter of the claim timeout) until the block exits.
+        Stories that finish in the meantime are no longer rendering, so they drop out on their own."""
+        worker = worker or default_worker_id()
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(interval or self.claim_timeout / 4):
+                try:
+                    self.touch(story_ids, worker)
+                except sqlite3.Error as e:
+                    print(f"Story queue: could not refresh claims: {e}")
+
+        self.touch(story_ids, worker)
+        thread = threading.Thread(target=heartbeat, name="story-claims", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, story_id: str, video_path: str | None = None) -> None:
+        self._write(
+            "UPDATE story_queue SET state = 'done', video_path = ?, reason = NULL, claimed_by = NULL, updated_at = ? WHERE story_id = ?",
+            (video_path, time.time(), story_id)
+        )
+
+    def fail(self, story_id: str, reason: str | None = None) -> None:
+        """Records a failed render: back to pending for another attempt, or rejected once max_attempts is reached."""
+        # Assignments in an UPDATE all see the old row, so the weighted key is drawn for the new attempt count here
+        self._write(
+            "UPDATE story_queue SET attempts = attempts + 1, reason = ?, claimed_by = NULL, claimed_at = NULL, updated_at = ?, "
+            "random_key = draw_random_key(), weighted_key = draw_weighted_key(weight / (2 + attempts)), "
+            "state = CASE WHEN attempts + 1 >= ? THEN 'rejected' ELSE 'pending' END WHERE story_id = ?",
+            (reason, time.time(), self.max_attempts, story_id)
+        )
+
+    def reject(self, story_id: str, reason: str) -> None:
+        self._write(
+            "UPDATE story_queue SET state = 'rejected', reason = ?, claimed_by = NULL, updated_at = ? WHERE story_id = ?",
+            (reason, time.time(), story_id)
+        )
+
+    def release(self, story_id: str) -> None:
+        """Returns a claimed story to pending without counting an attempt."""
+        self._write(
+            f"UPDATE story_queue SET state = 'pending', claimed_by = NULL, claimed_at = NULL, updated_at = ?, {_REDRAW_KEYS} "
+            "WHERE story_id = ? AND state = 'rendering'",
+            (time.time(), story_id)
+        )
+
+    def set_weight(self, story_id: str, weight: float) -> None:
+        """Relative chance of the story being picked next in weighted order (default 1.0)."""
+        self._write(
+            "UPDATE story_queue SET weight = ?, weighted_key = draw_weighted_key(? / (1 + attempts)), updated_at = ? WHERE story_id = ?",
+            (weight, weight, time.time(), story_id)
+        )
+
+    def state(self, story_id: str) -> dict | None:
+        row = self._connect().execute(
+            "SELECT state, attempts, claimed_by, reason, video_path FROM story_queue WHERE story_id = ?", (story_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(zip(('state', 'attempts', 'claimed_by', 'reason', 'video_path'), row))
+
+    def counts(self) -> dict:
+        counts = {state: 0 for state in STATES}
+        for state, count in self._connect().execute("SELECT state, COUNT(*) FROM story_queue GROUP BY state"):
+            counts[state] = count
+        return counts
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_story_queue(db_path: str | None = None) -> StoryQueue:
+    """The process-wide queue backed by db_path (default: story_queue_path from config)."""
+    db_path = db_path or story_queue_path
+    with _queues_lock:
+        queue = _queues.get(db_path)
+        if queue is None:
+            queue = _queues[db_path] = StoryQueue(db_path)
+        return queue
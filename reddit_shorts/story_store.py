@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from reddit_shorts.config import story_index_dir
+
+# Indexed access to stories.txt. The file is scanned once into a byte-offset index of story
+# records, persisted next to the other caches, and only scanned again when its size or mtime
+# changes; when the file only grew (stories appended), just the tail is scanned. Story IDs are
+# derived from the story's content, so the same story keeps its ID, temp paths and output file
+# name across calls and processes. Picking a story reads only that record from the file.
+
+INDEX_VERSION = 1
+TAIL_CHECK_BYTES = 4096  # bytes before the last record, compared to tell an append from an edit
+
+
+def story_id_for(title: str, selftext: str) -> str:
+    """Stable ID of a story: a hash of its title and body."""
+    digest = hashlib.sha256()
+    digest.update(title.strip().encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(selftext.strip().encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def infer_music_type(title: str) -> str:
+    """Music type from the title alone, as the original stories.txt parser did (it ran before the body was read)."""
+    title = title.lower()
+    if "creepy" in title:
+        return "creepy"
+    if "story" in title:
+        return "storytime"
+    return "general"
+
+
+def make_story(title: str, selftext: str, story_id: str) -> dict:
+    """A story dict in the shape the rest of the pipeline expects."""
+    return {
+        "title": title,
+        "selftext": selftext,
+        "id": story_id,
+        "subreddit": "local_story",  # Placeholder
+        "url": f"local_story_url_{story_id}",  # Placeholder
+        "music_type": infer_music_type(title),
+    }
+
+
+def parse_record(raw: bytes) -> tuple[str, str] | None:
+    """(title, selftext) of one record ("Title: ..." up to the next title line), or None if it has no title or body."""
+    title = None
+    body_lines = None
+    for line in raw.decode("utf-8", errors="replace").splitlines():
+        line = line.strip()
+        if body_lines is not None:
+            body_lines.append(line)
+        elif line.startswith("Title:") and title is None:
+            title = line.replace("Title:", "", 1).strip()
+        elif line == "Story:" and title is not None:
+            body_lines = []
+    if not title or body_lines is None:
+        return None
+    selftext = "\n".join(body_lines).strip()
+    return (title, selftext) if selftext else None
+
+
+def _scan(f, start: int) -> list[list]:
+    """Indexes the records from byte offset `start` (the start of a record, or 0) to the end of the file."""
+    entries = []
+    f.seek(start)
+    record_start = None
+    record_lines = []
+    offset = start
+
+    def flush(end):
+        if record_start is None:
+            return
+        parsed = parse_record(b"".join(record_lines))
+        if parsed:
+            entries.append([record_start, end - record_start, story_id_for(*parsed)])
+
+    for line in f:
+        if line.lstrip().startswith(b"Title:"):
+            flush(offset)
+            record_start = offset
+            record_lines = []
+        if record_start is not None:
+            record_lines.append(line)
+        offset += len(line)
+    flush(offset)
+    return entries
+
+
+class StoryStore:
+    def __init__(self, file_path: str, index_path: str | None = None):
+        self.file_path = file_path
+        path_hash = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:12]
+        self.index_path = index_path or os.path.join(story_index_dir, f"stories_{path_hash}.json")
+        self._lock = threading.Lock()
+        self._index = None  # {'size', 'mtime_ns', 'tail_check', 'entries': [[offset, length, id], ...]}
+        self._positions = {}  # story id -> position in entries
+
+    def _tail_check(self, f, entries: list) -> str | None:
+        if not entries:
+            return None
+        end = entries[-1][0]
+        f.seek(max(0, end - TAIL_CHECK_BYTES))
+        return hashlib.sha256(f.read(min(end, TAIL_CHECK_BYTES))).hexdigest()
+
+    def _load_saved_index(self) -> dict | None:
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            return index if index.get("version") == INDEX_VERSION else None
+        except (OSError, ValueError):
+            return None
+
+    def _save_index(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path), suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._index, f)
+            os.replace(temp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: Could not save story index {self.index_path}: {e}")
+
+    def refresh(self, force: bool = False) -> None:
+        """Brings the index up to date with the stories file, scanning as little of it as possible.
+        force rescans the whole file, for when a read shows the index is stale even though the size and mtime match."""
+        with self._lock:
+            try:
+                stat = os.stat(self.file_path)
+            except FileNotFoundError:
+                self._index, self._positions = None, {}
+                return
+
+            index = None if force else self._index or self._load_saved_index()
+            if index and index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns:
+                if index is not self._index:
+                    self._set_index(index)
+                return
+
+            with open(self.file_path, "rb") as f:
+                entries = index["entries"] if index else []
+                if index and entries and stat.st_size > index["size"] and self._tail_check(f, entries) == index["tail_check"]:
+                    # Stories were appended: rescan from the last known record, which may itself have grown
+                    print(f"Stories file grew; indexing new stories from byte {entries[-1][0]}...")
+                    entries = entries[:-1] + _scan(f, entries[-1][0])
+                else:
+                    print(f"Indexing stories in {self.file_path}...")
+                    entries = _scan(f, 0)
+                tail_check = self._tail_check(f, entries)
+
+            self._set_index({
+                "version": INDEX_VERSION,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "tail_check": tail_check,
+                "entries": entries,
+            })
+            self._save_index()
+
+    def _set_index(self, index: dict) -> None:
+        self._index = index
+        self._positions = {}
+        for position, (_, _, story_id) in enumerate(index["entries"]):
+            self._positions.setdefault(story_id, position)  # Duplicate stories resolve to the first copy
+
+    def signature(self) -> list | None:
+        """Size and mtime of the indexed file, for callers that mirror the index (e.g. the story queue)."""
+        self.refresh()
+        return [self._index["size"], self._index["mtime_ns"]] if self._index else None
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self._index["entries"]) if self._index else 0
+
+    def __contains__(self, story_id: str) -> bool:
+        self.refresh()
+        return story_id in self._positions
+
+    def ids(self) -> list[str]:
+        self.refresh()
+        return [story_id for _, _, story_id in self._index["entries"]] if self._index else []
+
+    def _read(self, entry: list) -> dict | None:
+        offset, length, story_id = entry
+        with open(self.file_path, "rb") as f:
+            f.seek(offset)
+            parsed = parse_record(f.read(length))
+        if not parsed or story_id_for(*parsed) != story_id:
+            return None  # The file changed under us; refresh(force=True) reindexes it
+        return make_story(parsed[0], parsed[1], story_id)
+
+    def get(self, story_id: str) -> dict | None:
+        self.refresh()
+        position = self._positions.get(story_id)
+        return self._read(self._index["entries"][position]) if position is not None else None
+
+    def get_at(self, position: int) -> dict | None:
+        """The story at 0-based `position` in the file."""
+        self.refresh()
+        if not self._index or not 0 <= position < len(self._index["entries"]):
+            return None
+        return self._read(self._index["entries"][position])
+
+    def all(self) -> list[dict]:
+        self.refresh()
+        if not self._index:
+            return []
+        stories = [self._read(entry) for entry in self._index["entries"]]
+        return [story for story in stories if story]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_story_store(file_path: str) -> StoryStore:
+    """The process-wide store for file_path, so its index is loaded once."""
+    with _stores_lock:
+        store = _stores.get(file_path)
+        if store is None:
+            store = _stores[file_path] = StoryStore(file_path)
+        return store
@@ -0,0 +1,185 @@
+import re
+
+# Subtitle timing derived from the narration script itself. The TTS client splits the text into
+# chunks and each chunk becomes its own audio segment, so with the measured duration of every
+# chunk the words only have to be distributed inside a few seconds of audio. No ASR is involved,
+# and the words on screen are exactly the words that were supplied.
+
+SUBTITLE_WEIGHTINGS = ("proportional", "syllable")
+
+# Extra weight given to trailing punctuation, standing in for the pause the voice takes there
+_PAUSE_WEIGHTS = {',': 0.5, ';': 0.75, ':': 0.75, '-': 0.5, '.': 1.25, '!': 1.25, '?': 1.25}
+
+# Longest text a merged subtitle event may show; the style doesn't wrap, so it has to fit one line
+MERGED_EVENT_MAX_CHARS = 16
+
+_VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+_LETTERS = re.compile(r'[^a-z]')
+
+
+def count_syllables(word: str) -> int:
+    """Rough English syllable count: vowel groups, minus a silent trailing 'e'. Never less than 1."""
+    letters = _LETTERS.sub('', word.lower())
+    if not letters:
+        # Numbers and symbols are read out too; weigh them by length
+        return max(1, len(word.strip()) // 2)
+    syllables = len(_VOWEL_GROUPS.findall(letters))
+    if letters.endswith('e') and not letters.endswith(('le', 'ee')) and syllables > 1:
+        syllables -= 1
+    return max(1, syllables)
+
+
+def _word_weight(word: str, weighting: str) -> float:
+    if weighting == "syllable":
+        return float(count_syllables(word))
+    return float(max(1, len(re.sub(r'\W', '', word))))
+
+
+def time_words(chunks: list[dict], offset: float = 0.0, weighting: str = "syllable") -> list[tuple[float, float, str]]:
+    """Distributes each chunk's measured duration over its words.
+
+    chunks is a list of {'text': str, 'duration': float} in narration order. Returns
+    (start, end, word) tuples in seconds, starting at offset."""
+    if weighting not in SUBTITLE_WEIGHTINGS:
+        raise ValueError(f"Unknown subtitle weighting '{weighting}'. Choose one of: {', '.join(SUBTITLE_WEIGHTINGS)}")
+
+    timed_words = []
+    chunk_start = offset
+    for chunk in chunks:
+        duration = max(0.0, float(chunk.get('duration', 0.0)))
+        words = chunk.get('text', '').split()
+        if not words or duration == 0.0:
+            chunk_start += duration
+            continue
+
+        spoken = [_word_weight(word, weighting) for word in words]
+        pauses = [_PAUSE_WEIGHTS.get(word[-1], 0.0) for word in words]
+        seconds_per_weight = duration / (sum(spoken) + sum(pauses))
+
+        cursor = chunk_start
+        for word, spoken_weight, pause_weight in zip(words, spoken, pauses):
+            end = cursor + spoken_weight * seconds_per_weight
+            timed_words.append((cursor, end, word))
+            cursor = end + pause_weight * seconds_per_weight
+        chunk_start += duration
+    return timed_words
+
+
+def _scale_chunks(chunks: list[dict], track_duration: float | None) -> list[dict]:
+    """Stretches chunk durations so they add up to the decoded track length, absorbing encoder padding."""
+    measured = sum(chunk.get('duration', 0.0) for chunk in chunks)
+    if not track_duration or measured <= 0:
+        return chunks
+    factor = track_duration / measured
+    return [{**chunk, 'duration': chunk.get('duration', 0.0) * factor} for chunk in chunks]
+
+
+def build_word_timings(title_chunks: list[dict] | None, content_chunks: list[dict] | None, gap: float,
+                       weighting: str = "syllable", title_duration: float | None = None,
+                       content_duration: float | None = None) -> list[tuple[float, float, str]]:
+    """Word timings for the title narration, the silence gap and the content narration, as rendered."""
+    title_chunks = _scale_chunks(title_chunks or [], title_duration)
+    content_chunks = _scale_chunks(content_chunks or [], content_duration)
+
+    timed_words = time_words(title_chunks, 0.0, weighting)
+    content_offset = 0.0
+    if title_chunks:
+        content_offset = sum(chunk['duration'] for chunk in title_chunks)
+        if content_chunks:
+            content_offset += gap
+    timed_words.extend(time_words(content_chunks, content_offset, weighting))
+    return timed_words
+
+
+def chunk_boundaries(title_chunks: list[dict] | None, content_chunks: list[dict] | None, gap: float,
+                     title_duration: float | None = None, content_duration: float | None = None) -> list[float]:
+    """Seconds into the rendered narration where one TTS chunk ends and the next begins, plus the middle of
+    the silence between the title and the content. Natural places to cut the narration for transcription."""
+    title_chunks = _scale_chunks(title_chunks or [], title_duration)
+    content_chunks = _scale_chunks(content_chunks or [], content_duration)
+    title_length = title_duration if title_duration is not None else sum(chunk.get('duration', 0.0) for chunk in title_chunks)
+
+    boundaries = []
+    cursor = 0.0
+    for chunk in title_chunks[:-1]:
+        cursor += chunk.get('duration', 0.0)
+        boundaries.append(cursor)
+    if title_length and (content_chunks or content_duration):
+        boundaries.append(title_length + gap / 2)
+        cursor = title_length + gap
+    else:
+        cursor = 0.0
+    for chunk in content_chunks[:-1]:
+        cursor += chunk.get('duration', 0.0)
+        boundaries.append(cursor)
+    return boundaries
+
+
+def merge_short_words(timed_words: list[tuple[float, float, str]], min_duration: float,
+                      max_chars: int = MERGED_EVENT_MAX_CHARS) -> list[tuple[float, float, str]]:
+    """Merges words shown for less than min_duration seconds with the word that follows them, so
+    runs of short words ("I", "a", "to") become one event instead of flickering past. A word is only
+    merged when it follows straight on (no pause of min_duration or more) and the text stays within max_chars."""
+    merged = []
+    for start, end, word in timed_words:
+        if merged:
+            previous_start, previous_end, previous_text = merged[-1]
+            if (previous_end - previous_start < min_duration and start - previous_end < min_duration
+                    and len(previous_text) + 1 + len(word) <= max_chars):
+                merged[-1] = (previous_start, end, f"{previous_text} {word}")
+                continue
+        merged.append((start, end, word))
+    return merged
+
+
+def _srt_timestamp(seconds: float) -> str:
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def _ass_timestamp(seconds: float) -> str:
+    centiseconds = int(round(seconds * 100))
+    hours, centiseconds = divmod(centiseconds, 360_000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def write_srt(timed_words: list[tuple[float, float, str]], srt_path: str) -> None:
+    """Writes one word per SRT cue, the same layout Whisper's writer produces with max_words_per_line=1."""
+    with open(srt_path, 'w', encoding='utf-8') as f:
+        for index, (start, end, word) in enumerate(timed_words, start=1):
+            f.write(f"{index}\n{_srt_timestamp(start)} --> {_srt_timestamp(end)}\n{word}\n\n")
+
+
+def write_ass(timed_words: list[tuple[float, float, str]], ass_path: str, font_name: str = "Montserrat ExtraBold",
+              font_size: int = 36, margin_v: int = 60, play_res: tuple[int, int] = (384, 288)) -> None:
+    """Writes one ASS dialogue event per timed word (or merged words), with the style the render burns in.
+    The default PlayRes is libass's own default, so font size and margin mean what they did in SRT force_style."""
+    play_res_x, play_res_y = play_res
+    header = (
+        "[Script Info]\n"
+        "ScriptType: v4.00+\n"
+        f"PlayResX: {play_res_x}\n"
+        f"PlayResY: {play_res_y}\n"
+        "WrapStyle: 2\n"
+        "ScaledBorderAndShadow: yes\n"
+        "\n"
+        "[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, "
+        "ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+        f"Style: Default,{font_name},{font_size},&H00FFFFFF,&H000000FF,&HFF000000,&HAA000000,-1,0,0,0,"
+        f"100,100,0,0,1,2,2,2,10,10,{margin_v},1\n"
+        "\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+    with open(ass_path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        for start, end, word in timed_words:
+            # libass has no escape for override braces or backslashes, so swap them for lookalikes
+            text = word.replace('\\', '/').replace('{', '(').replace('}', ')')
+            f.write(f"Dialogue: 0,{_ass_timestamp(start)},{_ass_timestamp(end)},Default,,0,0,0,,{text}\n")
@@ -1,99 +1,395 @@
 # Python standard modules
 import os
-import requests
+import asyncio
+import atexit
 import base64
+import json
+import random
 import re
+import contextvars
+import queue
+import threading
+import time
 from json import load
-from threading import Thread
-from typing import Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
 # Downloaded modules
+import aiohttp
 from playsound import playsound
 
 # Local files
 from .voice import Voice
+from reddit_shorts.mp3_frames import audio_frames
+from reddit_shorts.tracing import span
+
+# Cache entries are keyed by backend rather than endpoint URL: every endpoint in
+# data/config.json proxies the same TikTok voices, so their audio is interchangeable.
+CACHE_BACKEND = "tiktok"
+
+# Chunk requests from every tts() call in the process share one asyncio loop and one aiohttp
+# connection pool, so connections (and TLS sessions) are reused and a batch of stories multiplexes
+# its chunks over at most TIKTOK_TTS_CONCURRENCY requests in flight. Failed requests (connection
+# errors, timeouts, 429 and 5xx) are retried TIKTOK_TTS_RETRIES times with jittered exponential backoff.
+TTS_CONCURRENCY = int(os.environ.get("TIKTOK_TTS_CONCURRENCY", "8"))
+TTS_TIMEOUT = float(os.environ.get("TIKTOK_TTS_TIMEOUT", "30"))  # seconds per request
+TTS_RETRIES = int(os.environ.get("TIKTOK_TTS_RETRIES", "2"))
+TTS_BACKOFF = 0.5  # seconds before the first retry; doubles with every further attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Endpoints are tried in order of a rolling score (latency EWMA, inflated by the recent error rate)
+# kept across calls. A chunk whose request has been out (holding a connection slot) for longer than TIKTOK_TTS_HEDGE_FACTOR times its
+# endpoint's typical latency gets a second, hedged request to the next endpoint; whichever answers
+# first wins. 0 turns hedging off.
+TTS_HEDGE_FACTOR = float(os.environ.get("TIKTOK_TTS_HEDGE_FACTOR", "3"))
+TTS_HEDGE_MIN_DELAY = 1.0  # seconds; never hedge sooner than this
+TTS_HEDGE_INITIAL_DELAY = 5.0  # seconds; hedge delay for an endpoint with no latency history yet
+STATS_ALPHA = 0.2  # weight of the newest sample in the rolling averages
 
 def tts(
     text: str,
     voice: Voice,
-    output_file_path: str = "output.mp3",
-    play_sound: bool = False
-):
-    """Main function to convert text to speech and save to a file."""
+    output_file_path: Union[str, BinaryIO] = "output.mp3",
+    play_sound: bool = False,
+    cache: Optional[Any] = None
+) -> List[Tuple[str, float]]:
+    """Main function to convert text to speech and save to a file.
+
+    Chunks are decoded as they arrive and appended to the output in order, so the start of the
+    audio is readable before the last chunk is back. `output_file_path` may also be a writable
+    binary file object, e.g. the stdin of a process consuming the narration from a pipe.
+    `cache` is an optional chunk cache with get(text, voice_code, backend) and
+    put(text, voice_code, backend, audio); only chunks it misses are requested.
+    Returns the (text chunk, duration in seconds) pairs the file was assembled from, in order."""
     
     # Validate input arguments
     _validate_args(text, voice)
 
-    # Load endpoint data from the endpoints.json file
-    endpoint_data: List[Dict[str, str]] = _load_endpoints()
-    success: bool = False    
-
-    # Iterate over endpoints to find a working one
-    for endpoint in endpoint_data:
-        # Generate audio bytes from the current endpoint
-        audio_bytes: bytes = _fetch_audio_bytes(endpoint, text, voice)
-        
-        if audio_bytes:
-            # Save the generated audio to a file
-            _save_audio_file(output_file_path, audio_bytes)
-        
-            # Optionally play the audio file
-            if play_sound:
-                playsound(output_file_path)
-            
-            success = True
-            # Stop after processing a valid endpoint
-            break
-
-    if not success:
-        raise Exception("failed to generate audio")
-
-def _save_audio_file(output_file_path: str, audio_bytes: bytes):
-    """Write the audio bytes to a file."""
-    if os.path.exists(output_file_path):
-        os.remove(output_file_path)
-        
-    with open(output_file_path, "wb") as file:
-        file.write(audio_bytes)
-
-def _fetch_audio_bytes(
-    endpoint: Dict[str, str],
-    text: str,
-    voice: Voice
-) -> Optional[bytes]:
-    """Fetch audio data from an endpoint and decode it."""
-    
-    # Initialize variables for endpoint validity and audio data
     text_chunks: List[str] = _split_text(text)
-    audio_chunks: List[str] = ["" for _ in range(len(text_chunks))]
+    owns_file = isinstance(output_file_path, str)
+    output = open(output_file_path, "wb") if owns_file else output_file_path
+    writer = _OrderedMP3Writer(output, len(text_chunks))
+    try:
+        missing: List[int] = []
+        for i, chunk in enumerate(text_chunks):
+            audio = cache.get(chunk, voice.value, CACHE_BACKEND) if cache is not None else None
+            if audio is None:
+                missing.append(i)
+            else:
+                writer.add(i, audio)
+
+        if missing:
+            # Load endpoint data from the endpoints.json file
+            endpoint_data: List[Dict[str, str]] = _load_endpoints()
+
+            with span("tts.fetch", chunks=len(missing), cached_chunks=len(text_chunks) - len(missing)) as fetch_span:
+                failed = False
+                # Each chunk fails over to the next-ranked endpoint on its own, so one bad chunk
+                # doesn't send the whole text to another endpoint
+                for position, audio, failovers in _stream_audio_chunks(endpoint_data, [text_chunks[i] for i in missing], voice):
+                    # Falling back to another endpoint counts as a retry
+                    fetch_span.retries += failovers
+                    if audio is None:
+                        failed = True
+                        continue
+                    i = missing[position]
+                    fetch_span.bytes_out += len(audio)
+                    # Cache what succeeded even if another chunk failed, so a second attempt only requests the rest
+                    if cache is not None:
+                        cache.put(text_chunks[i], voice.value, CACHE_BACKEND, audio)
+                    writer.add(i, audio)
+
+                if failed:
+                    raise Exception("failed to generate audio")
+    except BaseException:
+        if owns_file:
+            output.close()
+            # Don't leave a truncated track behind for the next stage to pick up
+            os.remove(output_file_path)
+        raise
+    if owns_file:
+        output.close()
 
-    # Function to generate audio for each text chunk
-    def generate_audio_chunk(index: int, text_chunk: str):
+    # Optionally play the audio file
+    if play_sound and owns_file:
+        playsound(output_file_path)
+
+    return list(zip(text_chunks, writer.durations))
+
+class _OrderedMP3Writer:
+    """Appends decoded chunks to the output in text order as they arrive. Only the MPEG audio frames
+    are written, so each chunk's ID3 tags and Xing/Info header don't end up inside the stream.
+    A chunk that arrives before an earlier one waits in memory until that one has been written."""
+
+    def __init__(self, output: BinaryIO, count: int):
+        self.output = output
+        self.durations: List[Optional[float]] = [None] * count
+        self._waiting: Dict[int, bytes] = {}
+        self._next = 0
+
+    def add(self, index: int, audio: bytes) -> None:
+        self._waiting[index] = audio
+        while self._next in self._waiting:
+            frames, duration = audio_frames(self._waiting.pop(self._next))
+            self.output.write(frames)
+            self.durations[self._next] = duration
+            self._next += 1
+        # Make what's written visible to a reader of the file or pipe straight away
+        self.output.flush()
+
+class AsyncTTSClient:
+    """Runs chunk requests on a background asyncio loop shared by every calling thread."""
+
+    def __init__(self, concurrency: int = TTS_CONCURRENCY, timeout: float = TTS_TIMEOUT, retries: int = TTS_RETRIES, backoff: float = TTS_BACKOFF):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._stats: Dict[str, Dict[str, float]] = {}  # endpoint url -> {'latency', 'errors', 'requests'}
+        self._stats_lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="tts-client", daemon=True).start()
+            return self._loop
+
+    def stream(self, endpoints: List[Dict[str, str]], text_chunks: List[str], voice: Voice) -> Iterator[Tuple[int, Optional[bytes], int]]:
+        """Blocking generator: fetches every chunk concurrently, each failing over across the ranked endpoints on
+        its own, and yields (chunk index, decoded audio or None if no endpoint produced it, failovers) as each arrives."""
+        loop = self._ensure_loop()
+        arrivals: "queue.Queue" = queue.Queue()
+        # Run in a copy of the caller's context, so request spans are recorded as children of its span
+        context = contextvars.copy_context()
+        coro = self._stream_all(endpoints, text_chunks, voice, arrivals)
+        future = asyncio.run_coroutine_threadsafe(self._in_context(context, coro), loop)
+        finished = False
         try:
-            response = requests.post(endpoint["url"], json={"text": text_chunk, "voice": voice.value})
-            response.raise_for_status()
-            audio_chunks[index] = response.json()[endpoint["response"]]
-        except (requests.RequestException, KeyError):
-            return
+            while True:
+                arrival = arrivals.get()
+                if arrival is None:
+                    finished = True
+                    break
+                yield arrival
+        finally:
+            # The caller stopped early (an error, or the generator was closed): stop requesting its remaining chunks
+            if not finished:
+                future.cancel()
+        future.result()  # Re-raises anything unexpected from the loop
+
+    def fetch(self, endpoints: List[Dict[str, str]], text_chunks: List[str], voice: Voice) -> Tuple[List[Optional[bytes]], int]:
+        """Blocking: all chunks at once, in order (None where every endpoint failed), and the number of failovers."""
+        audio_chunks: List[Optional[bytes]] = [None] * len(text_chunks)
+        total_failovers = 0
+        for index, audio, failovers in self.stream(endpoints, text_chunks, voice):
+            audio_chunks[index] = audio
+            total_failovers += failovers
+        return audio_chunks, total_failovers
 
-    # Start threads for generating audio for each chunk
-    threads = [Thread(target=generate_audio_chunk, args=(i, chunk)) for i, chunk in enumerate(text_chunks)]
-    for thread in threads:
-        thread.start()
+    async def _in_context(self, context: contextvars.Context, coro):
+        return await context.run(asyncio.ensure_future, coro)
 
-    for thread in threads:
-        thread.join()
+    def _record(self, url: str, latency: Optional[float]) -> None:
+        """Folds one request into the endpoint's rolling stats; latency None records a failure."""
+        with self._stats_lock:
+            stats = self._stats.get(url)
+            if stats is None:
+                stats = self._stats[url] = {'latency': latency or 0.0, 'errors': 0.0 if latency is not None else 1.0, 'requests': 0}
+            else:
+                if latency is not None:
+                    stats['latency'] += STATS_ALPHA * (latency - stats['latency'])
+                stats['errors'] += STATS_ALPHA * ((0.0 if latency is not None else 1.0) - stats['errors'])
+            stats['requests'] += 1
 
-    if any(not chunk for chunk in audio_chunks):
+    def rank(self, endpoints: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Endpoints best first. Ones with no history go first so they get measured; ties keep config order."""
+        with self._stats_lock:
+            def score(endpoint):
+                stats = self._stats.get(endpoint["url"])
+                if stats is None:
+                    return 0.0
+                # A failed request costs at least a timeout's worth of waiting, so errors weigh heavily
+                return stats['latency'] * (1 - stats['errors']) + self.timeout * stats['errors']
+            return sorted(endpoints, key=score)
+
+    def _hedge_delay(self, url: str) -> Optional[float]:
+        if TTS_HEDGE_FACTOR <= 0:
+            return None
+        with self._stats_lock:
+            stats = self._stats.get(url)
+        if stats is None or not stats['latency']:
+            return TTS_HEDGE_INITIAL_DELAY
+        return max(TTS_HEDGE_MIN_DELAY, TTS_HEDGE_FACTOR * stats['latency'])
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Rolling latency (seconds), error rate and request count per endpoint url."""
+        with self._stats_lock:
+            return {url: dict(stats) for url, stats in self._stats.items()}
+
+    def _session_on_loop(self) -> aiohttp.ClientSession:
+        """Created on first use, on the loop thread: aiohttp sessions belong to the loop they were made on."""
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def _stream_all(self, endpoints: List[Dict[str, str]], text_chunks: List[str], voice: Voice, arrivals: "queue.Queue") -> None:
+        async def fetch_one(index, text_chunk):
+            audio, failovers = await self._fetch_with_failover(endpoints, text_chunk, voice)
+            arrivals.put((index, audio, failovers))
+
+        try:
+            await asyncio.gather(*(fetch_one(index, chunk) for index, chunk in enumerate(text_chunks)))
+        finally:
+            arrivals.put(None)
+
+    async def _fetch_with_failover(self, endpoints: List[Dict[str, str]], text_chunk: str, voice: Voice) -> Tuple[Optional[bytes], int]:
+        """Tries the ranked endpoints in turn for one chunk. Returns the decoded audio (or None) and how many endpoints failed first."""
+        ranked = self.rank(endpoints)
+        failed = 0
+        while failed < len(ranked):
+            # Hedge to the next endpoint, or to the same one if it's the only one left
+            hedge = ranked[failed + 1] if failed + 1 < len(ranked) else ranked[failed]
+            audio, hedged = await self._fetch_hedged(ranked[failed], hedge, text_chunk, voice)
+            if audio:
+                return audio, failed
+            failed += 2 if hedged and hedge is not ranked[failed] else 1
+        return None, len(ranked)
+
+    async def _fetch_hedged(self, primary: Dict[str, str], hedge: Dict[str, str], text_chunk: str, voice: Voice) -> Tuple[Optional[bytes], bool]:
+        """Requests the chunk from `primary`; if it hasn't answered within the hedge delay of being sent, also from `hedge`.
+        Returns the first successful answer and whether the hedge was sent."""
+        sent = asyncio.Event()
+        first = asyncio.ensure_future(self._fetch_chunk(primary, text_chunk, voice, sent=sent))
+        # The hedge clock starts once the request holds a connection slot: a chunk queued behind the
+        # other chunks of a long story is waiting on this client, not on a slow endpoint
+        slot = asyncio.ensure_future(sent.wait())
+        requests = {first}
+        try:
+            await asyncio.wait({first, slot}, return_when=asyncio.FIRST_COMPLETED)
+            if not first.done():
+                await asyncio.wait({first}, timeout=self._hedge_delay(primary["url"]))
+            if first.done():
+                return first.result(), False
+
+            requests.add(asyncio.ensure_future(self._fetch_chunk(hedge, text_chunk, voice, hedged=True)))
+            pending = set(requests)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.result():
+                        return task.result(), True
+            return None, True
+        finally:
+            # The slower request is no longer needed, and neither is any request of a cancelled chunk
+            slot.cancel()
+            for task in requests:
+                if not task.done():
+                    task.cancel()
+
+    async def _fetch_chunk(self, endpoint: Dict[str, str], text_chunk: str, voice: Voice, hedged: bool = False,
+                           sent: Optional[asyncio.Event] = None) -> Optional[bytes]:
+        session = self._session_on_loop()
+        payload = {"text": text_chunk, "voice": voice.value}
+        with span("http.tts", url=endpoint["url"], hedged=hedged) as request_span:
+            try:
+                audio = await self._request(session, endpoint, payload, request_span, sent)
+            except asyncio.CancelledError:
+                # Lost a hedge race; not a failure of the endpoint
+                request_span.outcome = "cancelled"
+                raise
+            return audio
+
+    async def _request(self, session: aiohttp.ClientSession, endpoint: Dict[str, str], payload: Dict[str, str], request_span,
+                       sent: Optional[asyncio.Event] = None) -> Optional[bytes]:
+        """One chunk from one endpoint, with retries, decoded on arrival. Every attempt feeds the endpoint's rolling stats.
+        `sent` is set once the first attempt holds a connection slot and goes out."""
+        url = endpoint["url"]
+        request_span.bytes_in = len(payload["text"].encode("utf-8"))
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                request_span.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            try:
+                # The timeout starts once a slot is free, so time spent queueing behind other chunks doesn't count
+                async with self._semaphore:
+                    if sent is not None:
+                        sent.set()
+                    started = time.perf_counter()
+                    async with session.post(url, json=payload) as response:
+                        body = await response.read()
+                    latency = time.perf_counter() - started
+                request_span.bytes_out += len(body)
+                request_span.set(status=response.status)
+                if response.status in RETRY_STATUSES:
+                    self._record(url, None)
+                    error = f"HTTP {response.status}"
+                    continue
+                if response.status >= 400:
+                    self._record(url, None)
+                    request_span.fail(f"HTTP {response.status}")
+                    return None
+                # Each chunk is decoded on its own; joining base64 strings first breaks on padded chunks
+                audio = base64.b64decode(json.loads(body)[endpoint["response"]])
+                if not audio:
+                    self._record(url, None)
+                    request_span.fail("empty audio")
+                    return None
+                self._record(url, latency)
+                return audio
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._record(url, None)
+                error = f"{type(e).__name__}: {e}"
+            except (ValueError, KeyError, TypeError) as e:
+                # A malformed response (or base64) won't get better on retry; fall back to the next endpoint
+                self._record(url, None)
+                request_span.fail(f"{type(e).__name__}: {e}")
+                return None
+        request_span.fail(error)
         return None
 
-    # Concatenate and decode audio data from all chunks
-    return base64.b64decode("".join(audio_chunks))
+    def close(self) -> None:
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result(timeout=5)
+            self._session = None
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_client = AsyncTTSClient()
+atexit.register(_client.close)
+
+def _stream_audio_chunks(
+    endpoints: List[Dict[str, str]],
+    text_chunks: List[str],
+    voice: Voice
+) -> Iterator[Tuple[int, Optional[bytes], int]]:
+    """Fetch and decode audio for each text chunk, failing over across endpoints per chunk.
+    Yields (chunk index, audio or None where every endpoint failed, failovers) in arrival order."""
+    return _client.stream(endpoints, text_chunks, voice)
+
+def endpoint_stats() -> Dict[str, Dict[str, float]]:
+    """Rolling latency, error rate and request count of every endpoint used by this process."""
+    return _client.stats()
 
 def _load_endpoints() -> List[Dict[str, str]]:
-    """Load endpoint configurations from a JSON file."""
-    script_dir = os.path.dirname(__file__)
-    json_file_path = os.path.join(script_dir, '../data', 'config.json')
+    """Load endpoint configurations from a JSON file.
+
+    TIKTOK_TTS_ENDPOINTS can point at an alternative file with the same format
+    (e.g. a self-hosted proxy, or the local stand-in used by the benchmarks)."""
+    json_file_path = os.environ.get("TIKTOK_TTS_ENDPOINTS")
+    if not json_file_path:
+        script_dir = os.path.dirname(__file__)
+        json_file_path = os.path.join(script_dir, '../data', 'config.json')
     with open(json_file_path, 'r') as file:
         return load(file)
 
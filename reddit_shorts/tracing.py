@@ -0,0 +1,222 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from reddit_shorts.config import trace_log_path, trace_log_max_bytes
+
+# Structured timing spans for the render pipeline. Every stage (TTS, image, subtitles, encode) and
+# every external call (ffmpeg, ffprobe, Whisper, TTS HTTP) runs inside a span that records its
+# duration, bytes in/out, retries and outcome. Finished spans are appended to a JSON lines log and
+# aggregated in memory for the web app's Prometheus-style /metrics endpoint. Spans started inside
+# another span share its trace id, so one render's spans can be pulled out of the log together.
+
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_metrics = {}  # span name -> aggregated counters
+_metrics_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    started_at: float
+    attrs: dict = field(default_factory=dict)
+    bytes_in: int = 0
+    bytes_out: int = 0
+    retries: int = 0
+    outcome: str = "ok"
+    error: str | None = None
+    duration_s: float | None = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def fail(self, error: str | None = None) -> None:
+        """Marks the span failed for errors that are handled (and not re-raised) inside it."""
+        self.outcome = "error"
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'started_at': round(self.started_at, 6),
+            'duration_s': round(self.duration_s, 6) if self.duration_s is not None else None,
+            'outcome': self.outcome,
+            'error': self.error,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'retries': self.retries,
+            'attrs': self.attrs,
+        }
+
+
+def _metrics_for(name: str) -> dict:
+    """Caller holds _metrics_lock."""
+    metrics = _metrics.get(name)
+    if metrics is None:
+        metrics = _metrics[name] = {
+            'outcomes': {},
+            'buckets': [0] * len(DURATION_BUCKETS),
+            'duration_sum': 0.0,
+            'count': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'retries': 0,
+            'in_flight': 0,
+        }
+    return metrics
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the block as a span named `name`, a child of the current span if there is one. Yields the Span,
+    so the block can add attrs, bytes_in/bytes_out and retries. An exception marks it failed and propagates."""
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        started_at=time.time(),
+        attrs=attrs,
+    )
+    with _metrics_lock:
+        _metrics_for(name)['in_flight'] += 1
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        # Keep an outcome the block set itself (e.g. "cancelled")
+        if current.outcome == "ok":
+            current.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current.duration_s = time.perf_counter() - started
+        _current_span.reset(token)
+        _record(current)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def file_size(path: str | None) -> int:
+    """Size of path in bytes, 0 if it doesn't exist; for bytes_in/bytes_out."""
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _record(finished: Span) -> None:
+    with _metrics_lock:
+        metrics = _metrics_for(finished.name)
+        metrics['in_flight'] -= 1
+        metrics['count'] += 1
+        metrics['duration_sum'] += finished.duration_s
+        metrics['outcomes'][finished.outcome] = metrics['outcomes'].get(finished.outcome, 0) + 1
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if finished.duration_s <= bound:
+                metrics['buckets'][i] += 1
+        metrics['bytes_in'] += finished.bytes_in
+        metrics['bytes_out'] += finished.bytes_out
+        metrics['retries'] += finished.retries
+    _write_log(finished.to_dict())
+
+
+def _write_log(record: dict) -> None:
+    if not trace_log_path:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(trace_log_path), exist_ok=True)
+            if trace_log_max_bytes and file_size(trace_log_path) > trace_log_max_bytes:
+                os.replace(trace_log_path, f"{trace_log_path}.1")  # Keep one rotated log
+            with open(trace_log_path, 'a') as f:
+                f.write(line)
+    except OSError as e:
+        print(f"Warning: Could not write trace log {trace_log_path}: {e}")
+
+
+def traced_ffmpeg_run(stream, name: str, **run_options):
+    """Runs an ffmpeg-python output stream inside a span. bytes_in is the size of the file inputs (plus
+    anything piped in with input=) and bytes_out the size of the output file, both read from the
+    command line the stream compiles to."""
+    args = stream.get_args()
+    inputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-i']
+    output_path = args[-1]
+    with span(name, inputs=len(inputs)) as ffmpeg_span:
+        ffmpeg_span.bytes_in = sum(file_size(path) for path in inputs) + len(run_options.get('input') or b'')
+        result = stream.run(**run_options)
+        ffmpeg_span.bytes_out = file_size(output_path)
+        return result
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(extra_gauges: dict | None = None) -> str:
+    """Aggregated span metrics in the Prometheus text exposition format.
+
+    extra_gauges maps a metric name to (help, {labels tuple: value}) for gauges owned elsewhere
+    (stage slots, the web job queue)."""
+    with _metrics_lock:
+        snapshot = {name: {**m, 'outcomes': dict(m['outcomes']), 'buckets': list(m['buckets'])} for name, m in _metrics.items()}
+
+    lines = [
+        "# HELP shorts_span_duration_seconds Duration of pipeline spans.",
+        "# TYPE shorts_span_duration_seconds histogram",
+    ]
+    for name, m in sorted(snapshot.items()):
+        label = f'span="{_label(name)}"'
+        for bound, count in zip(DURATION_BUCKETS, m['buckets']):
+            lines.append(f'shorts_span_duration_seconds_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'shorts_span_duration_seconds_bucket{{{label},le="+Inf"}} {m["count"]}')
+        lines.append(f'shorts_span_duration_seconds_sum{{{label}}} {m["duration_sum"]:.6f}')
+        lines.append(f'shorts_span_duration_seconds_count{{{label}}} {m["count"]}')
+
+    counters = (
+        ('shorts_span_outcomes_total', 'counter', 'Finished spans by outcome.', lambda m: [((('outcome', o),), n) for o, n in sorted(m['outcomes'].items())]),
+        ('shorts_span_bytes_in_total', 'counter', 'Bytes read by spans (input files, request bodies).', lambda m: [((), m['bytes_in'])]),
+        ('shorts_span_bytes_out_total', 'counter', 'Bytes produced by spans (output files, responses).', lambda m: [((), m['bytes_out'])]),
+        ('shorts_span_retries_total', 'counter', 'Retries and fallbacks inside spans.', lambda m: [((), m['retries'])]),
+        ('shorts_span_in_flight', 'gauge', 'Spans currently running.', lambda m: [((), m['in_flight'])]),
+    )
+    for metric, kind, help_text, values in counters:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, m in sorted(snapshot.items()):
+            for labels, value in values(m):
+                label = ",".join([f'span="{_label(name)}"'] + [f'{key}="{_label(str(val))}"' for key, val in labels])
+                lines.append(f"{metric}{{{label}}} {value}")
+
+    for metric, (help_text, samples) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for labels, value in samples.items():
+            label = ",".join(f'{key}="{_label(str(val))}"' for key, val in labels)
+            lines.append(f"{metric}{{{label}}} {value}" if label else f"{metric} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def span_metrics() -> dict:
+    """Per-span aggregates as plain data (count, outcomes, duration_sum, bytes, retries, in_flight)."""
+    with _metrics_lock:
+        return {name: {key: value for key, value in m.items() if key != 'buckets'} | {'outcomes': dict(m['outcomes'])} for name, m in _metrics.items()}
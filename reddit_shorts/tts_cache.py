@@ -0,0 +1,144 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import unicodedata
+
+# Content-addressed on-disk cache of synthesized TTS audio. Entries are keyed by the normalized
+# text chunk, the voice code and the TTS backend, and hold the decoded audio of one chunk, so a
+# re-render of the same story (different footage, music or A/B variant) needs no HTTP requests.
+# The least recently used entries are evicted once the cache grows past its size cap.
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of a text chunk for cache keys: NFC, with runs of whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text: str, voice_code: str, backend: str) -> str:
+    digest = hashlib.sha256()
+    for part in (backend, voice_code, normalize_text(text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TTSCache:
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> [size, last_used], loaded from disk on first use
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.mp3")
+
+    def _load_index(self) -> None:
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                if not file_name.endswith(".mp3"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, file_name))
+                except OSError:
+                    continue
+                self._index[file_name[:-4]] = [stat.st_size, stat.st_mtime]
+                self._total_bytes += stat.st_size
+
+    def get(self, text: str, voice_code: str, backend: str) -> bytes | None:
+        """Returns the cached audio for a chunk, or None on a miss."""
+        key = cache_key(text, voice_code, backend)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        now = time.time()
+        try:
+            os.utime(path, (now, now))  # mtime doubles as the LRU timestamp, so it survives restarts
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self._load_index()
+            if key in self._index:
+                self._index[key][1] = now
+            else:
+                self._index[key] = [len(audio), now]
+                self._total_bytes += len(audio)
+        return audio
+
+    def put(self, text: str, voice_code: str, backend: str, audio: bytes) -> None:
+        """Stores the audio for a chunk, then evicts least recently used entries if over the size cap."""
+        if not audio or len(audio) > self.max_bytes:
+            return
+        key = cache_key(text, voice_code, backend)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temp file and rename so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write TTS cache entry {path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._load_index()
+            previous = self._index.get(key)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._index[key] = [len(audio), time.time()]
+            self._total_bytes += len(audio)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drops least recently used entries until the cache is back under 90% of its cap. Caller holds the lock."""
+        target = self.max_bytes * 0.9
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            del self._index[key]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import numpy as np
+
+from reddit_shorts.config import cpu_count, whisper_model_size, whisper_model_sizes, whisper_workers, whisper_piece_seconds
+from reddit_shorts.tracing import span, file_size
+
+# Process-wide registry of loaded Whisper models. Loading weights and initialising torch
+# dominates per-video latency at batch volume, so each model is loaded once, on first use,
+# and reused by every render in the process.
+_models = {}
+_model_stats = {}
+_registry_lock = threading.Lock()
+_load_locks = {}
+# Word-level timestamps install hooks on the model's attention blocks while a transcription
+# runs, so calls against the same model instance are serialised.
+_transcribe_locks = {}
+
+# Long narrations are transcribed in pieces on a pool of worker processes, each holding its own
+# resident model and torch limited to its share of the cores, so transcription time for a
+# multi-minute narration drops with the number of cores instead of running on one torch pool.
+SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE; the rate of the arrays Whisper consumes
+QUIET_FRAME_SECONDS = 0.02
+QUIET_SEARCH_SECONDS = 3.0  # how far from the target piece length to look for a pause to cut at
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _resident_memory_bytes() -> int | None:
+    """Current resident set size of this process, or None if it can't be read on this platform."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _lock_for(locks: dict, key: tuple) -> threading.Lock:
+    with _registry_lock:
+        if key not in locks:
+            locks[key] = threading.Lock()
+        return locks[key]
+
+
+def get_whisper_model(name: str | None = None, device: str = "cpu"):
+    """Returns the resident Whisper model `name`, loading it on first use."""
+    name = name or whisper_model_size
+    if name not in whisper_model_sizes:
+        raise ValueError(f"Unsupported Whisper model '{name}'. Choose one of: {', '.join(whisper_model_sizes)}")
+
+    key = (name, device)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock_for(_load_locks, key):
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        print(f"Loading Whisper model '{name}' on {device}...")
+        rss_before = _resident_memory_bytes()
+        started = time.perf_counter()
+        with span("whisper.load", model=name, device=device):
+            import whisper  # Deferred so a background warm-up also absorbs the torch import cost
+            model = whisper.load_model(name, device=device)
+        load_seconds = time.perf_counter() - started
+        rss_after = _resident_memory_bytes()
+
+        parameter_bytes = sum(p.numel() * p.element_size() for p in model.parameters())
+        parameter_bytes += sum(b.numel() * b.element_size() for b in model.buffers())
+
+        _model_stats[key] = {
+            'name': name,
+            'device': device,
+            'load_seconds': round(load_seconds, 3),
+            'parameter_bytes': parameter_bytes,
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'loaded_at': time.time(),
+            'transcriptions': 0,
+        }
+        _models[key] = model
+        print(f"Whisper model '{name}' loaded in {load_seconds:.2f}s ({parameter_bytes / 2**20:.1f} MiB of weights).")
+        return model
+
+
+def transcribe(audio, name: str | None = None, device: str = "cpu", **options) -> dict:
+    """Transcribes `audio` (a path or a 16 kHz float32 array) with the resident model `name`."""
+    model = get_whisper_model(name, device)
+    key = (name or whisper_model_size, device)
+    with _lock_for(_transcribe_locks, key), span("whisper.transcribe", model=key[0], device=device) as transcribe_span:
+        transcribe_span.bytes_in = audio.nbytes if hasattr(audio, 'nbytes') else file_size(audio)
+        result = model.transcribe(audio, **options)
+        transcribe_span.set(segments=len(result.get('segments', [])))
+        _model_stats[key]['transcriptions'] += 1
+    return result
+
+
+def _boundary_cuts(boundaries: list[float], total: float, piece_seconds: float) -> list[float]:
+    """Boundaries to cut at so every piece is at least piece_seconds long (the last one at least half that)."""
+    cuts = []
+    last = 0.0
+    for boundary in sorted(boundaries):
+        if boundary - last >= piece_seconds and total - boundary >= piece_seconds / 2:
+            cuts.append(boundary)
+            last = boundary
+    return cuts
+
+
+def _quiet_cuts(audio: np.ndarray, total: float, piece_seconds: float, sample_rate: int) -> list[float]:
+    """Cuts at the quietest 20 ms frame within QUIET_SEARCH_SECONDS of every piece_seconds."""
+    frame = int(sample_rate * QUIET_FRAME_SECONDS)
+    frames = len(audio) // frame
+    energy = np.sqrt(np.mean(np.square(audio[:frames * frame].reshape(frames, frame), dtype=np.float64), axis=1))
+    cuts = []
+    last = 0.0
+    while total - last > piece_seconds * 1.5:
+        low = max(int((last + piece_seconds - QUIET_SEARCH_SECONDS) / QUIET_FRAME_SECONDS), int(last / QUIET_FRAME_SECONDS) + 1)
+        high = min(int((last + piece_seconds + QUIET_SEARCH_SECONDS) / QUIET_FRAME_SECONDS), frames)
+        if low >= high:
+            break
+        quietest = low + int(np.argmin(energy[low:high]))
+        last = (quietest + 0.5) * QUIET_FRAME_SECONDS  # middle of the quiet frame
+        cuts.append(last)
+    return cuts
+
+
+def split_audio(audio: np.ndarray, piece_seconds: float = whisper_piece_seconds, boundaries: list[float] | None = None,
+                sample_rate: int = SAMPLE_RATE) -> list[tuple[float, np.ndarray]]:
+    """Cuts a narration into (offset seconds, samples) pieces of about piece_seconds: at the given boundaries
+    (e.g. between TTS chunks) when there are any, otherwise at the quietest moment near each piece length."""
+    total = len(audio) / sample_rate
+    if total <= piece_seconds * 1.5:
+        return [(0.0, audio)]
+    cuts = _boundary_cuts(boundaries, total, piece_seconds) if boundaries else _quiet_cuts(audio, total, piece_seconds, sample_rate)
+    edges = [0.0] + cuts + [total]
+    return [(start, audio[int(start * sample_rate):int(end * sample_rate)]) for start, end in zip(edges, edges[1:])]
+
+
+def _words(result: dict, offset: float = 0.0) -> list[tuple[float, float, str]]:
+    return [
+        (word['start'] + offset, word['end'] + offset, word['word'].strip())
+        for segment in result.get('segments', [])
+        for word in segment.get('words', [])
+        if word['word'].strip()
+    ]
+
+
+def _init_worker(name: str, device: str, threads: int) -> None:
+    import torch
+    torch.set_num_threads(threads)
+    get_whisper_model(name, device)
+
+
+def _transcribe_piece(audio: np.ndarray, name: str, device: str, options: dict) -> list[tuple[float, float, str]]:
+    """Runs in a worker process; returns the piece's word timings relative to its start."""
+    return _words(transcribe(audio, name, device, **options))
+
+
+def _worker_ready() -> bool:
+    """No-op task: returns once a worker has started and loaded its model (in _init_worker)."""
+    return True
+
+
+def _get_pool(name: str, device: str, workers: int) -> ProcessPoolExecutor:
+    """Worker pool for `name`, kept for the life of the process so each worker loads its model once."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (name, device, workers):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            threads = max(1, cpu_count // workers)
+            # spawn rather than fork: forking a process that runs render threads can copy held locks
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                        initializer=_init_worker, initargs=(name, device, threads))
+            _pool_key = (name, device, workers)
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drops a broken pool (e.g. a worker killed by the OOM killer), so the next call starts a fresh one."""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_key = None, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def start_whisper_workers(name: str | None = None, device: str = "cpu", workers: int = whisper_workers) -> None:
+    """Starts the transcription workers and waits until each has loaded its model. No-op with one worker."""
+    if workers <= 1:
+        return
+    pool = _get_pool(name or whisper_model_size, device, workers)
+    # Every submit while no worker is idle spawns another, so this starts all of them
+    for future in [pool.submit(_worker_ready) for _ in range(workers)]:
+        future.result()
+
+
+def _transcribe_pieces(pool: ProcessPoolExecutor, pieces: list[tuple[float, np.ndarray]], name: str, device: str,
+                       options: dict) -> list[tuple[float, float, str]]:
+    futures = [(offset, pool.submit(_transcribe_piece, samples, name, device, options)) for offset, samples in pieces]
+    timed_words = []
+    for offset, future in futures:
+        timed_words.extend((start + offset, end + offset, word) for start, end, word in future.result())
+    return timed_words
+
+
+def transcribe_words(audio: np.ndarray, name: str | None = None, device: str = "cpu", boundaries: list[float] | None = None,
+                     workers: int = whisper_workers, **options) -> list[tuple[float, float, str]]:
+    """Word timings (start, end, word) for a 16 kHz narration array, in narration time. A narration
+    longer than one piece is split (see split_audio) and the pieces are transcribed on `workers`
+    worker processes; the word timestamps are shifted by each piece's offset and merged in order."""
+    name = name or whisper_model_size
+    options = {**options, 'word_timestamps': True}
+    pieces = split_audio(audio, boundaries=boundaries)
+    if workers <= 1 or len(pieces) == 1:
+        return _words(transcribe(audio, name, device, **options))
+
+    with span("whisper.transcribe_pieces", model=name, pieces=len(pieces), workers=workers) as pieces_span:
+        pieces_span.bytes_in = audio.nbytes
+        # A worker that dies breaks the whole pool: retry once on a fresh pool, then transcribe here
+        for attempt in range(2):
+            pool = _get_pool(name, device, workers)
+            try:
+                timed_words = _transcribe_pieces(pool, pieces, name, device, options)
+                break
+            except BrokenProcessPool as e:
+                _discard_pool(pool)
+                pieces_span.retries += 1
+                print(f"Whisper worker pool broke ({e}). {'Retrying on a new pool' if attempt == 0 else 'Transcribing in this process'}...")
+        else:
+            timed_words = _words(transcribe(audio, name, device, **options))
+        pieces_span.set(words=len(timed_words))
+    return timed_words
+
+
+def warm_up_whisper_model(name: str | None = None, device: str = "cpu", background: bool = True) -> threading.Thread | None:
+    """Loads `name` ahead of the first render, in this process and in every transcription worker (which
+    transcribe long narrations). With background=True the load runs on a daemon thread, which is returned."""
+    def _warm_up():
+        try:
+            get_whisper_model(name, device)
+            start_whisper_workers(name, device)
+        except Exception as e:
+            print(f"Error warming up Whisper model '{name or whisper_model_size}': {e}")
+
+    if not background:
+        _warm_up()
+        return None
+
+    thread = threading.Thread(target=_warm_up, name="whisper-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def whisper_model_stats() -> list[dict]:
+    """Load time and memory footprint of every resident model, for sizing workers."""
+    return [dict(stats) for stats in _model_stats.values()]
@@ -0,0 +1,11 @@
+import pytest
+
+from reddit_shorts import tracing
+
+
+@pytest.fixture(autouse=True)
+def trace_log(tmp_path, monkeypatch):
+    """Spans from traced code paths go to the test's tmp_path instead of the working tree's temp/traces."""
+    log_path = tmp_path / "traces" / "spans.jsonl"
+    monkeypatch.setattr(tracing, 'trace_log_path', str(log_path))
+    return log_path
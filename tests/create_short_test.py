@@ -0,0 +1,75 @@
+import ffmpeg
+import pytest
+
+import reddit_shorts.create_short as create_short
+from reddit_shorts.render_profiles import get_render_profile
+
+
+@pytest.fixture
+def single_pass(monkeypatch, tmp_path):
+    """Runs _render_single_pass up to the encode and returns the ffmpeg command it would run."""
+    durations = {'title.mp3': 2.0, 'content.mp3': 10.0}
+    monkeypatch.setattr(create_short, 'get_audio_duration', lambda track: durations[track])
+    monkeypatch.setattr(create_short, '_clip_background_video',
+                        lambda video, soundduration, profile, start_ss=None: (ffmpeg.input(video).video, 4.0))
+    monkeypatch.setattr(create_short, 'music_bed', lambda path, duration, volume: 'bed.flac')
+    commands = []
+
+    def fake_encode(main_stream, audio_stream, short_file_path, profile, stdin_bytes=None):
+        commands.append(ffmpeg.get_args(ffmpeg.output(main_stream, audio_stream, short_file_path, **create_short._output_options(profile))))
+        return True
+    monkeypatch.setattr(create_short, '_encode', fake_encode)
+
+    music_path = tmp_path / 'music.mp3'
+    music_path.write_bytes(b'')
+
+    def render(with_music: bool) -> list[str]:
+        plan = {
+            'video_tts_path': 'title.mp3',
+            'content_tts_path': 'content.mp3',
+            'video_tts_chunks': None,
+            'content_tts_chunks': None,
+            'background_video': 'footage.mp4',
+            'music_path': str(music_path) if with_music else None,
+            'music_volume': 0.2,
+            'submission_image_path': None,
+        }
+        assert create_short._render_single_pass(plan, get_render_profile('standard'), None, 'short.mp4')
+        assert plan['video_start'] == 4.0
+        assert len(commands) == 1
+        return commands.pop()
+
+    return render
+
+
+def _inputs(args: list[str]) -> list[str]:
+    return [args[i + 1] for i, arg in enumerate(args) if arg == '-i']
+
+
+def _outputs(args: list[str]) -> list[str]:
+    # Every media file named on the command line that isn't read is written
+    return [arg for arg in args if arg.endswith(('.mp3', '.mp4', '.wav', '.flac')) and arg not in _inputs(args)]
+
+
+def test_single_pass_with_music(single_pass):
+    args = single_pass(with_music=True)
+    graph = args[args.index('-filter_complex') + 1]
+
+    assert sorted(_inputs(args)) == ['aevalsrc=0:d=0.5', 'bed.flac', 'content.mp3', 'footage.mp4', 'title.mp3']
+    assert 'concat=a=1:n=3:v=0' in graph
+    assert 'atrim=end=12.5:start=0' in graph
+    assert graph.index('concat') < graph.index('amix')
+    assert 'amix=dropout_transition=12.5:duration=first:inputs=2' in graph
+    # One encode straight to the short: no intermediate narration, music or mix files
+    assert _outputs(args) == ['short.mp4']
+
+
+def test_single_pass_without_music(single_pass):
+    args = single_pass(with_music=False)
+    graph = args[args.index('-filter_complex') + 1]
+
+    assert sorted(_inputs(args)) == ['aevalsrc=0:d=0.5', 'content.mp3', 'footage.mp4', 'title.mp3']
+    assert 'concat=a=1:n=3:v=0' in graph
+    assert 'amix' not in graph
+    assert 'afade=duration=3:start_time=9.5:type=out' in graph
+    assert _outputs(args) == ['short.mp4']
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import reddit_shorts.footage_proxy as footage_proxy
+
+
+@pytest.fixture(autouse=True)
+def proxy_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(footage_proxy, 'footage_proxy_path', str(tmp_path / 'proxies'))
+    os.makedirs(tmp_path / 'proxies')
+
+
+def write(path, data=b'video', mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_sources_sharing_a_stem_get_their_own_proxy(tmp_path):
+    sources = [tmp_path / 'a' / 'clip.mp4', tmp_path / 'b' / 'clip.mp4', tmp_path / 'a' / 'clip.mov']
+    proxies = [footage_proxy.proxy_path_for(str(source)) for source in sources]
+
+    assert len(set(proxies)) == 3
+    assert all(os.path.basename(proxy).startswith('clip_') for proxy in proxies)
+    # Stable for the same file, however it's spelled
+    assert footage_proxy.proxy_path_for(os.path.join(str(tmp_path), 'a', '..', 'a', 'clip.mp4')) == proxies[0]
+
+
+def test_another_sources_proxy_is_never_used(tmp_path):
+    source = write(tmp_path / 'a' / 'clip.mp4', mtime=1000)
+    other = write(tmp_path / 'b' / 'clip.mp4', mtime=1000)
+    write(footage_proxy.proxy_path_for(source), mtime=2000)
+
+    assert footage_proxy.fresh_proxy_for(source) == footage_proxy.proxy_path_for(source)
+    assert footage_proxy.fresh_proxy_for(other) is None
+
+
+def test_proxy_older_than_its_source_is_stale(tmp_path):
+    source = write(tmp_path / 'clip.mp4', mtime=2000)
+    proxy = write(footage_proxy.proxy_path_for(source), mtime=1000)
+    assert footage_proxy.fresh_proxy_for(source) is None
+
+    os.utime(proxy, (3000, 3000))
+    assert footage_proxy.fresh_proxy_for(source) == proxy
+
+
+def test_empty_or_missing_proxy_is_not_fresh(tmp_path):
+    source = write(tmp_path / 'clip.mp4', mtime=1000)
+    assert footage_proxy.fresh_proxy_for(source) is None
+
+    write(footage_proxy.proxy_path_for(source), data=b'', mtime=2000)
+    assert footage_proxy.fresh_proxy_for(source) is None
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pytest
+
+from web_ui.jobs import JobQueue, QueueFull
+
+
+def wait_for(queue: JobQueue, job_id: str, *statuses: str) -> dict:
+    deadline = time.monotonic() + 5
+    while (job := queue.get(job_id))['status'] not in statuses:
+        assert time.monotonic() < deadline, f"job stuck in {job['status']}"
+        time.sleep(0.01)
+    return job
+
+
+def test_job_goes_from_queued_to_running_to_done():
+    started = threading.Event()
+    release = threading.Event()
+
+    def render(story_id):
+        started.set()
+        release.wait(5)
+        return f"/out/{story_id}.mp4"
+
+    queue = JobQueue(render, max_workers=1)
+    job = queue.submit({'story_id': 'abc'}, story_id='abc')
+    assert job['status'] in ('queued', 'running')
+    assert job['story_id'] == 'abc'
+
+    started.wait(5)
+    running = queue.get(job['id'])
+    assert running['status'] == 'running'
+    assert running['started_at'] is not None and running['finished_at'] is None
+
+    release.set()
+    done = wait_for(queue, job['id'], 'done')
+    assert done['video_path'] == "/out/abc.mp4"
+    assert done['error'] is None
+    assert queue.counts() == {'queued': 0, 'running': 0, 'done': 1, 'failed': 0}
+
+
+def test_failures_are_recorded_with_their_error():
+    def render(story_id):
+        if story_id == 'raises':
+            raise RuntimeError("ffmpeg exploded")
+        return None
+
+    queue = JobQueue(render)
+    raised = queue.submit({'story_id': 'raises'})
+    returned_nothing = queue.submit({'story_id': 'empty'})
+
+    assert wait_for(queue, raised['id'], 'done', 'failed')['error'] == "ffmpeg exploded"
+    assert wait_for(queue, returned_nothing['id'], 'done', 'failed')['error'] == "Video generation failed"
+    assert queue.counts()['failed'] == 2
+
+
+def test_submit_raises_queue_full_at_max_pending():
+    release = threading.Event()
+    queue = JobQueue(lambda: release.wait(5) and "/out/video.mp4", max_workers=1, max_pending=2)
+    jobs = [queue.submit({}), queue.submit({})]
+
+    with pytest.raises(QueueFull):
+        queue.submit({})
+
+    release.set()
+    for job in jobs:
+        wait_for(queue, job['id'], 'done')
+    # Finished jobs no longer count against the bound
+    assert queue.submit({})['status'] in ('queued', 'running', 'done')
+
+
+def test_render_override_is_used_for_that_job_only():
+    queue = JobQueue(lambda: "/out/default.mp4")
+    promoted = queue.submit({'story_id': 'abc'}, render=lambda story_id: f"/out/{story_id}-final.mp4")
+    default = queue.submit({})
+
+    assert wait_for(queue, promoted['id'], 'done')['video_path'] == "/out/abc-final.mp4"
+    assert wait_for(queue, default['id'], 'done')['video_path'] == "/out/default.mp4"
+
+
+def test_oldest_finished_jobs_are_pruned():
+    queue = JobQueue(lambda index: f"/out/{index}.mp4", max_workers=1, keep_finished=2)
+    job_ids = []
+    for index in range(4):
+        job_ids.append(queue.submit({'index': index})['id'])
+        wait_for(queue, job_ids[-1], 'done')
+
+    # Pruning happens on submit, so the last submit saw three finished jobs and dropped the oldest
+    assert queue.get(job_ids[0]) is None
+    assert [queue.get(job_id)['video_path'] for job_id in job_ids[1:]] == ["/out/1.mp4", "/out/2.mp4", "/out/3.mp4"]
+
+    queue.submit({'index': 4})
+    assert queue.get(job_ids[1]) is None
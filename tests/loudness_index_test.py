@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from reddit_shorts import loudness_index
+from reddit_shorts.loudness_index import loudnorm_options, parse_loudnorm_output, voice_loudness
+
+LOUDNORM_STDERR = (
+    "size=N/A time=00:00:41.12 bitrate=N/A speed= 412x\n"
+    "[Parsed_loudnorm_0 @ 0x5581] \n"
+    "{\n"
+    '\t"input_i" : "-19.42",\n'
+    '\t"input_tp" : "-2.95",\n'
+    '\t"input_lra" : "6.30",\n'
+    '\t"input_thresh" : "-29.68",\n'
+    '\t"output_i" : "-24.08",\n'
+    '\t"output_tp" : "-7.60",\n'
+    '\t"output_lra" : "5.80",\n'
+    '\t"output_thresh" : "-34.30",\n'
+    '\t"normalization_type" : "dynamic",\n'
+    '\t"target_offset" : "0.08"\n'
+    "}\n"
+)
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(loudness_index, 'loudness_index_path', str(tmp_path / 'loudness.db'))
+    monkeypatch.setattr(loudness_index, '_local', threading.local())
+
+
+def test_parse_loudnorm_output():
+    assert parse_loudnorm_output(LOUDNORM_STDERR) == {'integrated': -19.42, 'lra': 6.3, 'true_peak': -2.95, 'threshold': -29.68}
+
+
+def test_voices_are_measured_once(index, tmp_path, monkeypatch):
+    measured = []
+
+    def fake_measure(path):
+        measured.append(path)
+        return parse_loudnorm_output(LOUDNORM_STDERR)
+
+    monkeypatch.setattr(loudness_index, 'measure_loudness', fake_measure)
+    assert voice_loudness('en_us_002') is None  # Nothing stored and no narration to measure
+    assert voice_loudness('en_us_002', 'first.mp3')['integrated'] == -19.42
+    assert voice_loudness('en_us_002', 'second.mp3')['integrated'] == -19.42
+    assert measured == ['first.mp3']
+
+
+def test_loudnorm_options_stay_linear():
+    options = loudnorm_options({'integrated': -19.42, 'lra': 14.2, 'true_peak': -2.95, 'threshold': -29.68}, target=-16)
+    assert options['linear'] == 'true'
+    assert options['measured_I'] == -19.42
+    # Linear mode needs a range target at least as wide as the measured range
+    assert options['LRA'] >= 14.2
@@ -0,0 +1,41 @@
+import threading
+import time
+
+import pytest
+
+import reddit_shorts.main as main
+from reddit_shorts.stage_limits import configure_stage_limits, stage_slot
+from reddit_shorts.story_queue import StoryQueue
+
+
+@pytest.fixture(autouse=True)
+def uncapped():
+    yield
+    configure_stage_limits(tts=None, whisper=None, encode=None)
+
+
+def test_batch_renders_every_story_within_the_stage_caps(monkeypatch, tmp_path):
+    stories = [{'id': f"story-{i}", 'title': f"Story {i}", 'selftext': "Body."} for i in range(6)]
+    monkeypatch.setattr(main, 'get_stories_for_batch', lambda **kwargs: stories)
+    queue = StoryQueue(str(tmp_path / 'queue.db'))
+    monkeypatch.setattr(main, 'get_story_queue', lambda: queue)
+
+    encoding = peak = 0
+    lock = threading.Lock()
+
+    def render(story, **kwargs):
+        nonlocal encoding, peak
+        with stage_slot("encode"):
+            with lock:
+                encoding += 1
+                peak = max(peak, encoding)
+            time.sleep(0.05)
+            with lock:
+                encoding -= 1
+        return f"/out/{story['id']}.mp4"
+    monkeypatch.setattr(main, 'run_local_video_generation', render)
+
+    video_files = main.run_batch_video_generation(all=True, workers=6, encode_concurrency=2, render_profile='standard')
+
+    assert video_files == [f"/out/story-{i}.mp4" for i in range(6)]
+    assert peak == 2
@@ -1,4 +1,8 @@
-from reddit_shorts.make_submission_image import generate_reddit_story_image
+from PIL import Image, ImageFont
+
+from reddit_shorts.make_submission_image import (
+    MIN_TITLE_FONT_SIZE, TEMPLATE_PATH, TITLE_FONT_SIZE, TitleCardRenderer, generate_reddit_story_image, wrap_text
+)
 
 
 def test_generate_reddit_story_image():
@@ -16,4 +20,44 @@ def test_generate_reddit_story_image():
         'filter': True
     }
 
-    generate_reddit_story_image(**{**submission_data, **kwargs})
+    card = generate_reddit_story_image(**{**submission_data, **kwargs})
+    with Image.open(TEMPLATE_PATH) as template:
+        assert (card.width, card.height) == template.size
+    assert len(card.rgba) == card.width * card.height * 4
+
+
+def test_title_cards_are_cached_by_their_inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr('reddit_shorts.make_submission_image.title_card_cache_dir', str(tmp_path))
+    renderer = TitleCardRenderer()
+
+    card = renderer.render("My roommate keeps eating my leftovers", "local_story")
+    assert renderer.render("My roommate keeps eating my leftovers", "local_story") is card
+    assert renderer.render("A different title", "local_story").key != card.key
+
+    # The PNG is written once, named by the card's key, and a fresh renderer picks it up from there
+    path = card.png_path()
+    assert path == str(tmp_path / f"{card.key}.png")
+    cached = TitleCardRenderer().render("My roommate keeps eating my leftovers", "local_story")
+    assert cached.rgba == card.rgba
+
+
+def test_wrap_text_keeps_lines_within_width():
+    font = ImageFont.load_default(40)
+    title = "AITA for telling my sister she can't bring her dog to my wedding after she lied about it?"
+    lines = wrap_text(title, font, 400)
+    assert " ".join(lines) == title
+    assert all(font.getlength(line) <= 400 for line in lines)
+    # A word wider than the line still gets a line of its own
+    assert wrap_text("a supercalifragilisticexpialidocious b", font, 100) == ["a", "supercalifragilisticexpialidocious", "b"]
+
+
+def test_long_titles_are_set_smaller_to_fit_the_box():
+    renderer = TitleCardRenderer()
+    short_font, short_lines, _ = renderer.fit_title("Short title", 784, 269)
+    long_title = ("My neighbour keeps parking in my spot and I finally did something about it " * 4)[:300]
+    long_font, long_lines, block_height = renderer.fit_title(long_title, 784, 269)
+
+    assert short_font.size == TITLE_FONT_SIZE and short_lines == ["Short title"]
+    assert MIN_TITLE_FONT_SIZE <= long_font.size < TITLE_FONT_SIZE
+    assert block_height <= 269
+    assert all(long_font.getlength(line) <= 784 for line in long_lines)
@@ -0,0 +1,9 @@
+from reddit_shorts.make_tts import DEFAULT_TIKTOK_VOICE_ENUM, generate_tiktok_tts_for_story
+
+
+def test_reports_the_voice_that_spoke(tmp_path):
+    # Empty text returns before any request is made
+    assert generate_tiktok_tts_for_story("", "", "story", str(tmp_path), voice="en_uk_001")['tts_voice'] == "en_uk_001"
+    # An unknown code is narrated (and normalised) as the default voice, not stored under the bogus code
+    assert generate_tiktok_tts_for_story("", "", "story", str(tmp_path), voice="not_a_voice")['tts_voice'] == DEFAULT_TIKTOK_VOICE_ENUM.value
+    assert generate_tiktok_tts_for_story("", "", "story", str(tmp_path))['tts_voice'] == DEFAULT_TIKTOK_VOICE_ENUM.value
@@ -0,0 +1,92 @@
+import pytest
+
+from reddit_shorts.mp3_frames import audio_frames, iter_frames, mp3_duration
+
+MPEG1_HEADER = b'\xff\xfb\x90\x00'  # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+MPEG1_LENGTH = 417
+MPEG2_HEADER = b'\xff\xf3\x80\x00'  # MPEG-2 Layer III, 64 kbps, 22.05 kHz, stereo: 208-byte frames of 576 samples
+MPEG2_LENGTH = 208
+
+
+def frame(header: bytes = MPEG1_HEADER, length: int = MPEG1_LENGTH, tag: bytes = b'') -> bytes:
+    """One frame: the header, then `tag` where an encoder puts the Xing/Info tag (after 32 bytes of side info), then silence."""
+    body = bytes(32) + tag if tag else b''
+    return header + body + bytes(length - len(header) - len(body))
+
+
+def id3v2(payload_size: int, footer: bool = False) -> bytes:
+    flags = 0x10 if footer else 0x00
+    size = bytes((payload_size >> shift) & 0x7F for shift in (21, 14, 7, 0))  # syncsafe
+    tag = b'ID3\x04\x00' + bytes([flags]) + size + b'T' * payload_size
+    return tag + (b'3DI\x04\x00' + bytes([flags]) + size if footer else b'')
+
+
+def test_frames_are_measured_from_their_headers():
+    data = frame() * 10
+    assert [offset for offset, *_ in iter_frames(data)] == [i * MPEG1_LENGTH for i in range(10)]
+    assert mp3_duration(data) == pytest.approx(10 * 1152 / 44100)
+    assert mp3_duration(frame(MPEG2_HEADER, MPEG2_LENGTH) * 4) == pytest.approx(4 * 576 / 22050)
+
+
+def test_clean_stream_is_returned_as_is():
+    data = frame() * 3
+    frames, duration = audio_frames(data)
+    assert frames is data
+    assert duration == pytest.approx(3 * 1152 / 44100)
+
+
+@pytest.mark.parametrize('footer', [False, True])
+def test_id3v2_tag_is_skipped(footer):
+    tag = id3v2(100, footer=footer)
+    # The tag's payload holds a sync word that must not be mistaken for a frame
+    tag = tag.replace(b'TTTT', b'\xff\xfb\x90\x00', 1)
+    frames, duration = audio_frames(tag + frame() * 2)
+
+    assert frames == frame() * 2
+    assert duration == pytest.approx(2 * 1152 / 44100)
+    assert next(iter_frames(tag + frame()))[0] == len(tag)
+
+
+@pytest.mark.parametrize('tag', [b'Xing', b'Info'])
+def test_leading_vbr_header_frame_is_dropped(tag):
+    data = frame(tag=tag) + frame() * 2
+    frames, duration = audio_frames(data)
+
+    assert frames == frame() * 2
+    assert duration == pytest.approx(2 * 1152 / 44100)
+
+
+def test_only_the_first_frame_can_be_a_vbr_header():
+    data = frame() + frame(tag=b'Info')
+    assert len(list(iter_frames(data))) == 2
+
+
+def test_parser_resyncs_after_garbage():
+    garbage = b'junk\xff\x00\xff\xff not a header'
+    data = frame() + garbage + frame() + b'TAG' + bytes(125)  # trailing ID3v1 tag
+    offsets = [offset for offset, *_ in iter_frames(data)]
+
+    assert offsets == [0, MPEG1_LENGTH + len(garbage)]
+    frames, _ = audio_frames(data)
+    assert frames == frame() * 2
+
+
+def test_truncated_final_frame_is_dropped():
+    data = frame() * 2 + frame()[:200]
+    assert len(list(iter_frames(data))) == 2
+    assert audio_frames(data)[0] == frame() * 2
+
+
+def test_stripped_chunks_concatenate_into_one_stream():
+    first, first_duration = audio_frames(id3v2(20) + frame(tag=b'Xing') + frame() * 2)
+    second, second_duration = audio_frames(frame(tag=b'Info') + frame() * 3)
+
+    joined = first + second
+    assert joined == frame() * 5
+    assert mp3_duration(joined) == pytest.approx(first_duration + second_duration)
+
+
+def test_data_without_frames_is_returned_unchanged():
+    data = b'<html>rate limited</html>'
+    assert audio_frames(data) == (data, 0.0)
+    assert audio_frames(b'') == (b'', 0.0)
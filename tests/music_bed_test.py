@@ -0,0 +1,44 @@
+import pytest
+
+from reddit_shorts import music_bed as music_bed_module
+from reddit_shorts.music_bed import bed_length, music_bed
+
+
+@pytest.fixture
+def track(tmp_path, monkeypatch):
+    monkeypatch.setattr(music_bed_module, 'music_bed_cache_dir', str(tmp_path / 'beds'))
+    monkeypatch.setattr(music_bed_module, 'stream_info', lambda path, codec_type: {'duration': '30.0'})
+    monkeypatch.setattr(music_bed_module, 'file_loudness', lambda path: None)
+    track_path = tmp_path / 'track.mp3'
+    track_path.write_bytes(b'not really audio')
+    return str(track_path)
+
+
+def test_bed_length_rounds_up_to_the_bucket():
+    assert bed_length(12.0, bucket=60) == 60
+    assert bed_length(60.0, bucket=60) == 60
+    assert bed_length(61.0, bucket=60) == 120
+
+
+def test_beds_are_built_once_per_bucket_and_volume(track, monkeypatch):
+    builds = []
+
+    def fake_build(music_path, track_duration, length, volume, loudness, bed_path):
+        builds.append((length, volume))
+        with open(bed_path, 'wb') as f:
+            f.write(b'flac')
+
+    monkeypatch.setattr(music_bed_module, '_build_bed', fake_build)
+    first = music_bed(track, 45.0, 0.2)
+    assert music_bed(track, 50.0, 0.2) == first  # Same bucket: trimmed from the same bed
+    assert music_bed(track, 50.0, 0.35) != first
+    assert music_bed(track, 130.0, 0.2) != first
+    assert builds == [(60, 0.2), (60, 0.35), (180, 0.2)]
+
+
+def test_failed_build_renders_without_music(track, monkeypatch):
+    def failing_build(*args):
+        raise RuntimeError("ffmpeg exited with status 1")
+
+    monkeypatch.setattr(music_bed_module, '_build_bed', failing_build)
+    assert music_bed(track, 45.0, 0.2) is None
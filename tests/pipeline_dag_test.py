@@ -0,0 +1,73 @@
+import functools
+import threading
+import time
+
+import pytest
+
+from reddit_shorts.pipeline_dag import Stage, StageGraph
+
+
+def test_independent_stages_overlap_and_dependents_get_results():
+    def slow(value):
+        time.sleep(0.2)
+        return value
+
+    graph = StageGraph([
+        Stage("a", functools.partial(slow, 1)),
+        Stage("b", functools.partial(slow, 2)),
+        Stage("sum", lambda a, b: a + b, after=("a", "b")),
+    ])
+    started = time.perf_counter()
+    results = graph.run()
+
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    assert time.perf_counter() - started < 0.35
+
+
+def test_one_worker_runs_stages_in_dependency_order():
+    order = []
+    lock = threading.Lock()
+
+    def record(name, **_):
+        with lock:
+            order.append(name)
+
+    graph = StageGraph([
+        Stage("video", functools.partial(record, "video"), after=("tts", "image")),
+        Stage("tts", functools.partial(record, "tts")),
+        Stage("image", functools.partial(record, "image")),
+    ])
+    graph.run(max_workers=1)
+
+    assert order == ["tts", "image", "video"]
+
+
+def test_failure_stops_dependents_and_is_raised():
+    ran = []
+
+    def fail():
+        raise RuntimeError("tts down")
+
+    graph = StageGraph([
+        Stage("tts", fail),
+        Stage("image", lambda: ran.append("image")),
+        Stage("video", lambda tts, image: ran.append("video"), after=("tts", "image")),
+    ])
+    with pytest.raises(RuntimeError, match="tts down"):
+        graph.run()
+    assert "video" not in ran
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        StageGraph([Stage("a", lambda b: b, after=("b",)), Stage("b", lambda a: a, after=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        StageGraph([Stage("a", lambda missing: missing, after=("missing",))])
+
+
+def test_process_stages_run_in_the_pool():
+    graph = StageGraph([
+        Stage("power", functools.partial(pow, 2, 10), executor="process"),
+        Stage("half", lambda power: power // 2, after=("power",)),
+    ])
+    assert graph.run() == {"power": 1024, "half": 512}
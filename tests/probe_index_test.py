@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from reddit_shorts import probe_index
+
+FAKE_PROBE = {
+    'format': {'duration': '12.5', 'format_name': 'mov,mp4', 'bit_rate': '800000'},
+    'streams': [
+        {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 1920, 'height': 1080, 'avg_frame_rate': '30000/1001'},
+        {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'duration': '12.4', 'sample_rate': '44100', 'channels': 2}
+    ]
+}
+
+
+@pytest.fixture
+def probe_calls(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(probe_index, 'probe_index_path', str(tmp_path / 'probe_index.db'))
+    monkeypatch.setattr(probe_index, '_local', threading.local())
+    monkeypatch.setattr(probe_index, '_memory', {})
+    monkeypatch.setattr(probe_index.ffmpeg, 'probe', lambda path: calls.append(path) or FAKE_PROBE)
+    return calls
+
+
+def test_probe_media_is_served_from_the_index(tmp_path, probe_calls):
+    media = tmp_path / 'footage.mp4'
+    media.write_bytes(b'not really a video')
+
+    first = probe_index.probe_media(str(media))
+    probe_index._memory.clear()
+    second = probe_index.probe_media(str(media))
+
+    assert first == second
+    assert len(probe_calls) == 1
+    assert first['streams'][0]['fps'] == 29.97
+
+
+def test_changed_file_is_probed_again(tmp_path, probe_calls):
+    media = tmp_path / 'music.mp3'
+    media.write_bytes(b'one')
+    probe_index.probe_media(str(media))
+    media.write_bytes(b'one more time')
+    probe_index.probe_media(str(media))
+
+    assert len(probe_calls) == 2
+
+
+def test_stream_info_falls_back_to_container_duration(tmp_path, probe_calls):
+    media = tmp_path / 'footage.mp4'
+    media.write_bytes(b'not really a video')
+
+    assert probe_index.stream_info(str(media), 'video')['duration'] == 12.5
+    assert probe_index.stream_info(str(media), 'audio')['duration'] == 12.4
+    assert probe_index.stream_info(str(tmp_path / 'missing.mp4'), 'video') is None
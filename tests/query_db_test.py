@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from reddit_shorts import query_db
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / 'shorts.db')
+    monkeypatch.setattr(query_db, 'shorts_db_path', path)
+    return path
+
+
+def test_bulk_check_and_idempotent_writes(db_path):
+    query_db.write_to_db("s1", "c1")
+    query_db.write_to_db("s1", "c1")
+    query_db.write_many_to_db([("s1", "c2"), ("s2", "c1")])
+
+    assert query_db.check_if_video_exists("s1", "c1")
+    assert not query_db.check_if_video_exists("s1", "c3")
+    pairs = [("s1", "c1"), ("s1", "c3"), ("s2", "c1")] + [("s9", str(i)) for i in range(1000)]
+    assert query_db.existing_videos(pairs) == {("s1", "c1"), ("s2", "c1")}
+    assert sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM uploads").fetchone()[0] == 3
+
+
+def test_existence_check_uses_covering_index(db_path):
+    query_db.create_tables()
+    plan = query_db._connect().execute(
+        "EXPLAIN QUERY PLAN SELECT 1 FROM uploads WHERE submission_id = ? AND top_comment_id = ?", ("s", "c")
+    ).fetchall()
+    assert "COVERING INDEX uploads_pair" in plan[0][-1]
+
+
+def test_legacy_ledger_is_deduplicated(db_path):
+    legacy = sqlite3.connect(db_path)
+    legacy.execute("CREATE TABLE uploads (id INT AUTO_INCREMENT PRIMARY KEY, submission_id VARCHAR(30), top_comment_id VARCHAR(30))")
+    legacy.execute("CREATE TABLE admin (id INT AUTO_INCREMENT PRIMARY KEY, submission_id VARCHAR(30))")
+    legacy.executemany("INSERT INTO uploads (submission_id, top_comment_id) VALUES (?, ?)", [("s1", "c1"), ("s1", "c1"), ("s2", "c2")])
+    legacy.execute("INSERT INTO admin (submission_id) VALUES ('a1')")
+    legacy.commit()
+    legacy.close()
+
+    assert query_db.existing_videos([("s1", "c1"), ("s2", "c2")]) == {("s1", "c1"), ("s2", "c2")}
+    assert query_db.admin_posts(["a1", "s1"]) == {"a1"}
+    assert query_db.check_for_admin_posts("a1")
+    assert query_db._connect().execute("SELECT COUNT(*) FROM uploads").fetchone()[0] == 2
@@ -0,0 +1,45 @@
+import pytest
+
+from reddit_shorts.render_profiles import RENDER_PROFILES, encoder_threads, get_render_profile, set_encode_budget
+
+
+def test_default_profile_is_full_quality():
+    profile = get_render_profile()
+    assert profile.name == 'standard'
+    assert (profile.width, profile.height) == (1080, 1920)
+
+
+def test_draft_profile_is_cheaper_than_standard():
+    draft = RENDER_PROFILES['draft']
+    standard = RENDER_PROFILES['standard']
+    assert draft.width * draft.height < standard.width * standard.height
+    assert draft.crf > standard.crf
+    assert draft.fps is not None
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        get_render_profile('cinema')
+
+
+def test_every_profile_caps_bitrate_with_both_vbv_settings():
+    for profile in RENDER_PROFILES.values():
+        assert (profile.maxrate is None) == (profile.bufsize is None)
+    assert RENDER_PROFILES['capped'].maxrate is not None
+
+
+def test_throughput_mode_splits_cores_between_encodes(monkeypatch):
+    monkeypatch.setattr('reddit_shorts.render_profiles.cpu_count', 16)
+    standard = RENDER_PROFILES['standard']
+    draft = RENDER_PROFILES['draft']
+    try:
+        assert encoder_threads(standard) == 16
+        set_encode_budget(4)
+        assert encoder_threads(standard) == 4
+        # A profile that asks for fewer threads than its share keeps its own count
+        set_encode_budget(2)
+        assert encoder_threads(draft) == draft.threads
+        set_encode_budget(32)
+        assert encoder_threads(standard) == 1
+    finally:
+        set_encode_budget(None)
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import reddit_shorts.main
+from web_ui.jobs import JobQueue
+from web_ui.routes import main_bp
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.register_blueprint(main_bp)
+    app.renders = []
+    app.release = threading.Event()
+    app.release.set()
+
+    def render(**params):
+        app.renders.append(params)
+        app.release.wait(5)
+        return "/out/video.mp4"
+    app.extensions['job_queue'] = JobQueue(render, max_workers=1, max_pending=1)
+    return app
+
+
+def finished(client, status_url: str) -> dict:
+    deadline = time.monotonic() + 5
+    while (job := client.get(status_url).get_json())['status'] in ('queued', 'running'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return job
+
+
+def test_generate_queues_the_story(app):
+    client = app.test_client()
+    response = client.post('/api/generate', json={'title': "A title", 'story': "A story.", 'profile': 'draft'})
+
+    assert response.status_code == 202
+    job = finished(client, response.get_json()['status_url'])
+    assert job['status'] == 'done'
+    assert app.renders[0]['story']['title'] == "A title"
+    assert app.renders[0]['keep_artifacts'] is True
+
+
+@pytest.mark.parametrize('field', ['title', 'story'])
+def test_generate_rejects_bad_words(app, field):
+    script = {'title': "A title", 'story': "A story."}
+    script[field] += " What the fuck."
+    response = app.test_client().post('/api/generate', json=script)
+
+    assert response.status_code == 400
+    assert "aren't allowed" in response.get_json()['error']
+    assert app.extensions['job_queue'].counts()['queued'] == 0
+    assert app.renders == []
+
+
+def test_generate_returns_503_when_the_queue_is_full(app):
+    app.release.clear()
+    client = app.test_client()
+    script = {'title': "A title", 'story': "A story."}
+
+    assert client.post('/api/generate', json=script).status_code == 202
+    response = client.post('/api/generate', json=script)
+    app.release.set()
+
+    assert response.status_code == 503
+    assert "queue is full" in response.get_json()['error']
+
+
+def test_promote_rerenders_the_drafts_story(app, monkeypatch):
+    promoted = []
+    monkeypatch.setattr(reddit_shorts.main, 'run_promote_render', lambda story_id: promoted.append(story_id) or "/out/final.mp4")
+    client = app.test_client()
+    draft = client.post('/api/generate', json={'title': "A title", 'story': "A story.", 'profile': 'draft'}).get_json()
+    draft = finished(client, draft['status_url'])
+
+    response = client.post(draft['promote_url'])
+    assert response.status_code == 202
+    job = finished(client, response.get_json()['status_url'])
+
+    # The promote job renders from the draft's story ID (and so its kept artifacts), not a new story
+    assert promoted == [app.renders[0]['story']['id']]
+    assert job['profile'] == 'standard'
+    assert len(app.renders) == 1
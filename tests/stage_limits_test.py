@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from reddit_shorts.stage_limits import configure_stage_limits, stage_limits, stage_slot, stage_slots_in_use
+
+
+@pytest.fixture(autouse=True)
+def uncapped():
+    yield
+    configure_stage_limits(tts=None, whisper=None, encode=None)
+
+
+def peak_holders(stage: str, threads: int) -> int:
+    """Runs `threads` threads that each hold a slot of `stage` for a moment and returns the most held at once."""
+    holders = peak = 0
+    lock = threading.Lock()
+
+    def hold():
+        nonlocal holders, peak
+        with stage_slot(stage):
+            with lock:
+                holders += 1
+                peak = max(peak, holders)
+            time.sleep(0.05)
+            with lock:
+                holders -= 1
+
+    workers = [threading.Thread(target=hold) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return peak
+
+
+def test_caps_bound_concurrent_holders():
+    configure_stage_limits(tts=3, encode=1)
+
+    assert peak_holders("tts", 8) == 3
+    assert peak_holders("encode", 4) == 1
+
+
+def test_uncapped_stages_run_unrestricted():
+    configure_stage_limits(encode=1)
+
+    assert peak_holders("whisper", 4) == 4
+    assert stage_limits() == {"encode": 1}
+
+
+def test_slots_in_use_are_reported_while_held():
+    configure_stage_limits(encode=2)
+    with stage_slot("encode"):
+        assert stage_slots_in_use() == {"encode": 1}
+    assert stage_slots_in_use() == {"encode": 0}
+
+    configure_stage_limits(encode=0)
+    assert stage_limits() == {}
+
+
+def test_unknown_stage_is_rejected():
+    with pytest.raises(ValueError):
+        configure_stage_limits(upload=2)
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import pytest
+
+from reddit_shorts.get_reddit_stories import _claim_clean_story
+from reddit_shorts.story_queue import _ORDER_SQL, StoryQueue
+from reddit_shorts.story_store import StoryStore
+
+STORIES = "\n".join(f"Title: Story {i}\nStory:\nBody of story {i}.\n" for i in range(20))
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / 'stories.txt'
+    path.write_text(STORIES, encoding='utf-8')
+    return StoryStore(str(path), index_path=str(tmp_path / 'index.json'))
+
+
+@pytest.fixture
+def queue(tmp_path, store):
+    queue = StoryQueue(str(tmp_path / 'queue.db'), claim_timeout=60, max_attempts=2)
+    queue.sync(store)
+    return queue
+
+
+def test_fifo_claims_in_file_order(queue, store):
+    assert [queue.claim(order="fifo") for _ in range(3)] == store.ids()[:3]
+    assert queue.counts()['rendering'] == 3
+
+
+def test_concurrent_claims_never_overlap(queue):
+    claimed = []
+    lock = threading.Lock()
+
+    def worker():
+        while (story_id := queue.claim(order="random")) is not None:
+            with lock:
+                claimed.append(story_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 20
+    assert len(set(claimed)) == 20
+
+
+def test_failures_retry_then_reject(queue):
+    story_id = queue.claim(order="fifo")
+    queue.fail(story_id, "boom")
+    assert queue.state(story_id)['state'] == 'pending'
+
+    assert queue.claim(order="fifo") == story_id
+    queue.fail(story_id, "boom again")
+    assert queue.state(story_id) | {'claimed_by': None} == {
+        'state': 'rejected', 'attempts': 2, 'claimed_by': None, 'reason': "boom again", 'video_path': None
+    }
+
+
+def test_done_stories_survive_restart_and_resync(tmp_path, queue, store):
+    story_id = queue.claim(order="fifo")
+    queue.complete(story_id, "/out/video.mp4")
+
+    reopened = StoryQueue(str(tmp_path / 'queue.db'))
+    with open(store.file_path, 'a', encoding='utf-8') as f:
+        f.write("\nTitle: Appended\nStory:\nNew story.\n")
+    assert reopened.sync(store) == 1
+    assert reopened.state(story_id)['state'] == 'done'
+    assert reopened.counts() == {'pending': 20, 'rendering': 0, 'done': 1, 'rejected': 0}
+
+
+def test_stale_claims_are_requeued(queue):
+    story_id = queue.claim(order="fifo")
+    queue.claim_timeout = -1
+    assert queue.requeue_stale() == 1
+    assert queue.state(story_id)['state'] == 'pending'
+
+
+@pytest.mark.parametrize("order", ["random", "weighted"])
+def test_random_and_weighted_claims_use_an_index(queue, order):
+    plan = queue._connect().execute(
+        f"EXPLAIN QUERY PLAN SELECT story_id FROM story_queue WHERE state = 'pending' ORDER BY {_ORDER_SQL[order]} LIMIT 1"
+    ).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "USING INDEX" in details
+    assert "TEMP B-TREE" not in details  # No sort of the pending stories per claim
+
+
+def test_weighted_claims_prefer_heavy_stories(queue, store):
+    heavy = store.ids()[7]
+    queue.set_weight(heavy, 1e6)
+    assert queue.claim(order="weighted") == heavy
+
+    # A failed story draws a fresh key, with its weight halved, instead of keeping its old place
+    queue.fail(heavy, "boom")
+    zero_weight = store.ids()[3]
+    queue.set_weight(zero_weight, 0)
+    claimed = [queue.claim(order="weighted") for _ in range(20)]
+    assert claimed[-1] == zero_weight
+    assert sorted(claimed) == sorted(store.ids())
+
+
+def test_claim_rereads_a_story_after_the_file_changes_under_the_index(queue, store):
+    first = store.ids()[0]
+    # Swap the first two stories without changing the file's size or mtime, so the index looks current but points at the wrong bytes
+    stat = os.stat(store.file_path)
+    with open(store.file_path, 'r+', encoding='utf-8') as f:
+        lines = f.read().split("\n", 8)
+        f.seek(0)
+        f.write("\n".join(lines[4:8] + lines[:4] + lines[8:]))
+    os.utime(store.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    story = _claim_clean_story(store, queue, "fifo")
+    assert story['id'] == first
+    assert story['title'] == "Story 0"
+    assert queue.state(first)['state'] == 'rendering'
+
+
+def test_kept_alive_claims_are_not_taken_by_another_queue(tmp_path, store):
+    batch = StoryQueue(str(tmp_path / 'queue.db'), claim_timeout=0.2)
+    batch.sync(store)
+    waiting = [batch.claim(order="fifo") for _ in range(3)]
+    other = StoryQueue(str(tmp_path / 'queue.db'), claim_timeout=0.2)
+
+    with batch.keep_alive(waiting):
+        time.sleep(0.5)
+        # Well past the claim timeout, but the claims are still fresh: the other queue picks new stories
+        taken = [other.claim(order="fifo") for _ in range(3)]
+    assert not set(taken) & set(waiting)
+    assert all(batch.state(story_id)['state'] == 'rendering' for story_id in waiting)
+
+    # Once the heartbeat stops, the claims go stale like any dead worker's
+    time.sleep(0.3)
+    assert other.requeue_stale() == 6
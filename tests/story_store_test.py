@@ -0,0 +1,63 @@
+import pytest
+
+from reddit_shorts.story_store import StoryStore, infer_music_type, story_id_for
+
+STORIES = """Title: First story
+Story:
+It was a dark and creepy night.
+
+Title: Second
+Story:
+Line one.
+Line two.
+"""
+
+
+@pytest.fixture
+def stories_file(tmp_path):
+    path = tmp_path / 'stories.txt'
+    path.write_text(STORIES, encoding='utf-8')
+    return path
+
+
+def make_store(stories_file, tmp_path):
+    return StoryStore(str(stories_file), index_path=str(tmp_path / 'index.json'))
+
+
+def test_ids_are_content_hashes_and_stable(stories_file, tmp_path):
+    first = make_store(stories_file, tmp_path).all()
+    second = make_store(stories_file, tmp_path).all()
+
+    assert [s['id'] for s in first] == [s['id'] for s in second]
+    assert first[0]['id'] == story_id_for("First story", "It was a dark and creepy night.")
+    assert first[0]['music_type'] == 'storytime'
+    assert first[1]['selftext'] == "Line one.\nLine two."
+
+
+def test_music_type_comes_from_the_title_only():
+    assert infer_music_type("A Creepy Night") == 'creepy'
+    assert infer_music_type("My work story") == 'storytime'
+    # A creepy body doesn't change the music of a story whose title doesn't say so
+    assert infer_music_type("Second") == 'general'
+
+
+def test_appended_stories_are_indexed(stories_file, tmp_path):
+    store = make_store(stories_file, tmp_path)
+    assert len(store) == 2
+    with open(stories_file, 'a', encoding='utf-8') as f:
+        f.write("Line three.\n\nTitle: Third\nStory:\nNew body.\n")
+
+    assert len(store) == 3
+    assert store.get_at(1)['selftext'] == "Line one.\nLine two.\nLine three."
+    assert store.get_at(2)['title'] == "Third"
+
+
+def test_edited_file_is_reindexed(stories_file, tmp_path):
+    store = make_store(stories_file, tmp_path)
+    old_ids = store.ids()
+    stories_file.write_text(STORIES.replace("Second", "Second, edited") + "\n", encoding='utf-8')
+
+    ids = store.ids()
+    assert ids[0] == old_ids[0]
+    assert ids[1] != old_ids[1]
+    assert store.get(old_ids[1]) is None
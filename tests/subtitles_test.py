@@ -0,0 +1,73 @@
+from reddit_shorts.subtitles import build_word_timings, chunk_boundaries, count_syllables, merge_short_words, time_words, write_ass, write_srt
+import pytest
+
+
+@pytest.fixture
+def chunks():
+    return [
+        {'text': 'I pretended to be a whole agency,', 'duration': 2.0},
+        {'text': ' and actually got the job.', 'duration': 1.5}
+    ]
+
+
+def test_count_syllables():
+    assert count_syllables('agency') == 3
+    assert count_syllables('make') == 1
+    assert count_syllables('job.') == 1
+    assert count_syllables('42') == 1
+
+
+def test_time_words_fills_each_chunk(chunks):
+    timed_words = time_words(chunks)
+
+    assert [word for _, _, word in timed_words] == 'I pretended to be a whole agency, and actually got the job.'.split()
+    assert timed_words[0][0] == 0.0
+    first_chunk_end = max(end for _, end, word in timed_words[:7])
+    assert first_chunk_end <= 2.0
+    assert timed_words[7][0] == pytest.approx(2.0)
+    assert all(start < end for start, end, _ in timed_words)
+
+
+def test_time_words_proportional_weighting(chunks):
+    timed_words = time_words([{'text': 'a bbbb', 'duration': 5.0}], weighting='proportional')
+    assert timed_words == [(0.0, 1.0, 'a'), (1.0, 5.0, 'bbbb')]
+
+    with pytest.raises(ValueError):
+        time_words(chunks, weighting='phoneme')
+
+
+def test_build_word_timings_offsets_content(chunks):
+    title_chunks = [{'text': 'My title', 'duration': 1.0}]
+    timed_words = build_word_timings(title_chunks, chunks, gap=0.5, title_duration=2.0, content_duration=3.5)
+
+    assert timed_words[1][1] == pytest.approx(2.0)
+    assert timed_words[2][0] == pytest.approx(2.5)
+    assert timed_words[-1][1] <= 6.0
+
+
+def test_chunk_boundaries(chunks):
+    boundaries = chunk_boundaries([{'text': 'Title', 'duration': 1.0}], chunks, 0.5, title_duration=1.0, content_duration=3.5)
+    # Middle of the gap after the title, then the end of the first content chunk
+    assert boundaries == pytest.approx([1.25, 3.5])
+    assert chunk_boundaries(None, chunks, 0.5) == pytest.approx([2.0])
+
+
+def test_write_srt_and_ass(tmp_path, chunks):
+    timed_words = time_words(chunks)
+    srt_path = tmp_path / 'subtitles.srt'
+    ass_path = tmp_path / 'subtitles.ass'
+
+    write_srt(timed_words, str(srt_path))
+    write_ass(timed_words, str(ass_path))
+
+    assert srt_path.read_text().startswith('1\n00:00:00,000 --> ')
+    assert ass_path.read_text().count('Dialogue: ') == len(timed_words)
+
+
+def test_merge_short_words():
+    timed_words = [(0.0, 0.1, 'I'), (0.1, 0.2, 'am'), (0.2, 0.8, 'thrilled'), (0.8, 0.9, 'to'), (1.5, 1.6, 'go'), (1.6, 1.7, 'supercalifragilistic')]
+    merged = merge_short_words(timed_words, min_duration=0.25)
+
+    # Short words join the next word until the event is long enough; a pause or the length cap stops the merge
+    assert merged == [(0.0, 0.8, 'I am thrilled'), (0.8, 0.9, 'to'), (1.5, 1.6, 'go'), (1.6, 1.7, 'supercalifragilistic')]
+    assert merge_short_words(timed_words, min_duration=0.0) == timed_words
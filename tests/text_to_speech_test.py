@@ -0,0 +1,234 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from reddit_shorts.tiktok_voice.src import text_to_speech
+from reddit_shorts.tiktok_voice.src.text_to_speech import AsyncTTSClient
+from reddit_shorts.tiktok_voice.src.voice import Voice
+
+
+class FakeEndpoint:
+    """Local TTS endpoint that echoes the text back as audio, after failing the first `failures` requests with 503.
+    Texts in `reject` always get a 400."""
+
+    def __init__(self, failures=0, delay=0.0, reject=(), audio=str.encode):
+        self.failures = failures
+        self.audio = audio
+        self.delay = delay
+        self.reject = set(reject)
+        self.texts = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = set()
+        self.lock = threading.Lock()
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with endpoint.lock:
+                    endpoint.requests += 1
+                    endpoint.texts.append(payload['text'])
+                    endpoint.connections.add(self.client_address)
+                    endpoint.in_flight += 1
+                    endpoint.max_in_flight = max(endpoint.max_in_flight, endpoint.in_flight)
+                    fail = endpoint.failures > 0
+                    endpoint.failures -= fail
+                time.sleep(endpoint.delay)
+                with endpoint.lock:
+                    endpoint.in_flight -= 1
+                rejected = payload['text'] in endpoint.reject
+                body = b"{}" if fail or rejected else json.dumps({'data': base64.b64encode(endpoint.audio(payload['text'])).decode()}).encode()
+                self.send_response(503 if fail else 400 if rejected else 200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.config = {'url': f"http://127.0.0.1:{self.server.server_address[1]}/api", 'response': 'data'}
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def client():
+    client = AsyncTTSClient(concurrency=3, timeout=5, retries=2, backoff=0.01)
+    yield client
+    client.close()
+
+
+def test_chunks_come_back_in_order_over_pooled_connections(client):
+    endpoint = FakeEndpoint(delay=0.02)
+    chunks = [f"chunk {i}." for i in range(12)]
+    try:
+        audio, failovers = client.fetch([endpoint.config], chunks, Voice.US_FEMALE_2)
+    finally:
+        endpoint.stop()
+
+    assert audio == [chunk.encode() for chunk in chunks]
+    assert failovers == 0
+    assert endpoint.max_in_flight <= 3
+    assert len(endpoint.connections) <= 3
+
+
+def test_retries_server_errors_then_gives_up(client):
+    endpoint = FakeEndpoint(failures=2)
+    try:
+        assert client.fetch([endpoint.config], ["hello"], Voice.US_FEMALE_2) == ([b"hello"], 0)
+        endpoint.failures = 3
+        assert client.fetch([endpoint.config], ["again"], Voice.US_FEMALE_2) == ([None], 1)
+    finally:
+        endpoint.stop()
+    assert endpoint.requests == 6
+
+
+def test_many_threads_share_the_cap(client):
+    endpoint = FakeEndpoint(delay=0.01)
+    results = {}
+
+    def story(n):
+        results[n] = client.fetch([endpoint.config], [f"story {n} part {i}" for i in range(4)], Voice.US_FEMALE_2)[0]
+
+    threads = [threading.Thread(target=story, args=(n,)) for n in range(5)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        endpoint.stop()
+
+    assert all(results[n] == [f"story {n} part {i}".encode() for i in range(4)] for n in range(5))
+    assert endpoint.max_in_flight <= 3
+
+
+def test_only_failed_chunks_move_to_the_next_endpoint(client):
+    first, second = FakeEndpoint(reject={"bad chunk"}), FakeEndpoint()
+    try:
+        audio, failovers = client.fetch([first.config, second.config], ["good chunk", "bad chunk"], Voice.US_FEMALE_2)
+    finally:
+        first.stop()
+        second.stop()
+
+    assert audio == [b"good chunk", b"bad chunk"]
+    assert failovers == 1
+    assert second.texts == ["bad chunk"]
+
+
+def test_endpoints_are_ranked_by_rolling_latency(client):
+    slow, fast = FakeEndpoint(delay=0.2), FakeEndpoint()
+    try:
+        client.fetch([slow.config], ["warm up"], Voice.US_FEMALE_2)
+        client.fetch([fast.config], ["warm up"], Voice.US_FEMALE_2)
+        assert client.rank([slow.config, fast.config]) == [fast.config, slow.config]
+        client.fetch([slow.config, fast.config], ["a", "b"], Voice.US_FEMALE_2)
+    finally:
+        slow.stop()
+        fast.stop()
+
+    assert slow.requests == 1
+    assert fast.requests == 3
+
+
+def test_straggler_chunks_are_hedged(client, monkeypatch):
+    monkeypatch.setattr(text_to_speech, "TTS_HEDGE_INITIAL_DELAY", 0.1)
+    straggler, backup = FakeEndpoint(delay=1.0), FakeEndpoint()
+    try:
+        started = time.perf_counter()
+        audio, failovers = client.fetch([straggler.config, backup.config], ["slow chunk"], Voice.US_FEMALE_2)
+        elapsed = time.perf_counter() - started
+    finally:
+        straggler.stop()
+        backup.stop()
+
+    assert audio == [b"slow chunk"]
+    assert failovers == 0
+    assert elapsed < 0.8
+    assert backup.texts == ["slow chunk"]
+
+
+def test_chunks_queued_behind_the_cap_are_not_hedged(client, monkeypatch):
+    # 24 chunks through 3 slots queue for about 0.4s, well past the hedge delay, on an endpoint that answers in 0.05s
+    monkeypatch.setattr(text_to_speech, "TTS_HEDGE_INITIAL_DELAY", 0.15)
+    endpoint = FakeEndpoint(delay=0.05)
+    chunks = [f"chunk {i}." for i in range(24)]
+    try:
+        audio, failovers = client.fetch([endpoint.config], chunks, Voice.US_FEMALE_2)
+    finally:
+        endpoint.stop()
+
+    assert audio == [chunk.encode() for chunk in chunks]
+    assert failovers == 0
+    assert endpoint.requests == len(chunks)
+
+
+def test_abandoned_stream_stops_requesting(client):
+    endpoint = FakeEndpoint(delay=0.05)
+    chunks = [f"chunk {i}." for i in range(24)]
+    try:
+        arrivals = client.stream([endpoint.config], chunks, Voice.US_FEMALE_2)
+        next(arrivals)
+        arrivals.close()
+        time.sleep(0.3)
+    finally:
+        endpoint.stop()
+
+    assert endpoint.requests < len(chunks)
+
+
+# One MPEG-1 Layer III frame at 128 kbps / 44.1 kHz is 417 bytes and 1152 samples long
+FRAME = b"\xff\xfb\x90\x64" + bytes(413)
+INFO_FRAME = b"\xff\xfb\x90\x64" + bytes(32) + b"Info" + bytes(377)
+ID3_TAG = b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10)
+
+
+def mp3_chunk(text):
+    """A chunk the way the endpoints send it: ID3 tag, Info header frame, then one audio frame per word."""
+    return ID3_TAG + INFO_FRAME + FRAME * len(text.split())
+
+
+def test_tts_streams_frames_in_order(client, monkeypatch, tmp_path):
+    endpoint = FakeEndpoint(audio=mp3_chunk)
+    monkeypatch.setattr(text_to_speech, "_client", client)
+    monkeypatch.setattr(text_to_speech, "_load_endpoints", lambda: [endpoint.config])
+    text = "one two three. " * 30  # several chunks of 300 bytes or less
+    output_path = tmp_path / "content.mp3"
+    try:
+        durations = text_to_speech.tts(text, Voice.US_FEMALE_2, str(output_path))
+    finally:
+        endpoint.stop()
+
+    assert len(durations) > 1
+    words = sum(len(chunk.split()) for chunk, _ in durations)
+    # Tags and Info frames are dropped, so the file is one clean run of audio frames
+    assert output_path.read_bytes() == FRAME * words
+    assert all(duration == pytest.approx(len(chunk.split()) * 1152 / 44100) for chunk, duration in durations)
+
+
+def test_failed_tts_leaves_no_partial_track(client, monkeypatch, tmp_path):
+    endpoint = FakeEndpoint(reject={"two."}, audio=mp3_chunk)
+    monkeypatch.setattr(text_to_speech, "_client", client)
+    monkeypatch.setattr(text_to_speech, "_load_endpoints", lambda: [endpoint.config])
+    monkeypatch.setattr(text_to_speech, "_split_text", lambda text: text.split(" "))
+    output_path = tmp_path / "content.mp3"
+    try:
+        with pytest.raises(Exception, match="failed to generate audio"):
+            text_to_speech.tts("one. two. three.", Voice.US_FEMALE_2, str(output_path))
+    finally:
+        endpoint.stop()
+
+    assert not output_path.exists()
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from reddit_shorts import tracing
+
+
+def read_spans(log_path):
+    return [json.loads(line) for line in log_path.read_text().splitlines()]
+
+
+def test_nested_spans_share_a_trace(trace_log):
+    with tracing.span("test.parent", story_id="abc") as parent:
+        with tracing.span("test.child") as child:
+            child.bytes_out = 42
+            child.retries = 1
+
+    child_record, parent_record = read_spans(trace_log)
+    assert child_record['trace_id'] == parent_record['trace_id'] == parent.trace_id
+    assert child_record['parent_id'] == parent_record['span_id']
+    assert parent_record['parent_id'] is None
+    assert parent_record['attrs'] == {'story_id': 'abc'}
+    assert child_record['bytes_out'] == 42 and child_record['retries'] == 1
+    assert child_record['outcome'] == 'ok' and child_record['duration_s'] >= 0
+
+
+def test_exception_marks_span_failed(trace_log):
+    with pytest.raises(RuntimeError):
+        with tracing.span("test.failing"):
+            raise RuntimeError("boom")
+
+    record, = read_spans(trace_log)
+    assert record['outcome'] == 'error'
+    assert record['error'] == 'RuntimeError: boom'
+    assert tracing.span_metrics()['test.failing']['in_flight'] == 0
+
+
+def test_prometheus_export(trace_log):
+    for _ in range(3):
+        with tracing.span("test.export") as exported:
+            exported.bytes_in = 10
+    with tracing.span("test.export") as failed:
+        failed.fail("handled")
+
+    text = tracing.render_prometheus({'shorts_jobs': ("Jobs.", {(('status', 'queued'),): 2})})
+    assert 'shorts_span_duration_seconds_count{span="test.export"} 4' in text
+    assert 'shorts_span_outcomes_total{span="test.export",outcome="ok"} 3' in text
+    assert 'shorts_span_outcomes_total{span="test.export",outcome="error"} 1' in text
+    assert 'shorts_span_bytes_in_total{span="test.export"} 30' in text
+    assert 'shorts_jobs{status="queued"} 2' in text
@@ -0,0 +1,42 @@
+from reddit_shorts.tts_cache import TTSCache, cache_key
+import pytest
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TTSCache(str(tmp_path / 'tts'), max_bytes=100)
+
+
+def test_cache_key_normalizes_whitespace():
+    assert cache_key('Hello  world\n', 'en_us_002', 'tiktok') == cache_key('Hello world', 'en_us_002', 'tiktok')
+    assert cache_key('Hello world', 'en_us_002', 'tiktok') != cache_key('Hello world', 'en_us_006', 'tiktok')
+
+
+def test_get_put_counts_hits_and_misses(cache):
+    assert cache.get('Hello world', 'en_us_002', 'tiktok') is None
+    cache.put('Hello world', 'en_us_002', 'tiktok', b'audio')
+
+    assert cache.get('Hello world', 'en_us_002', 'tiktok') == b'audio'
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['entries'] == 1
+
+
+def test_evicts_least_recently_used(cache):
+    cache.put('first', 'en_us_002', 'tiktok', b'a' * 40)
+    cache.put('second', 'en_us_002', 'tiktok', b'b' * 40)
+    cache.get('first', 'en_us_002', 'tiktok')
+    cache.put('third', 'en_us_002', 'tiktok', b'c' * 40)
+
+    assert cache.get('second', 'en_us_002', 'tiktok') is None
+    assert cache.get('first', 'en_us_002', 'tiktok') == b'a' * 40
+    assert cache.stats()['bytes'] <= 100
+
+
+def test_index_survives_restart(cache):
+    cache.put('Hello world', 'en_us_002', 'tiktok', b'audio')
+    reopened = TTSCache(cache.cache_dir, cache.max_bytes)
+
+    assert reopened.stats()['entries'] == 1
+    assert reopened.get('Hello world', 'en_us_002', 'tiktok') == b'audio'
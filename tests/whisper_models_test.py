@@ -0,0 +1,79 @@
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from reddit_shorts.whisper_models import SAMPLE_RATE, split_audio, transcribe_words
+import reddit_shorts.whisper_models as whisper_models
+
+
+def _tone(seconds: float) -> np.ndarray:
+    return np.full(int(seconds * SAMPLE_RATE), 0.5, dtype=np.float32)
+
+
+def test_short_narration_is_one_piece():
+    audio = _tone(40)
+    pieces = split_audio(audio, piece_seconds=30)
+    assert len(pieces) == 1
+    assert pieces[0][0] == 0.0 and len(pieces[0][1]) == len(audio)
+
+
+def test_split_audio_at_boundaries():
+    audio = _tone(100)
+    pieces = split_audio(audio, piece_seconds=30, boundaries=[10.0, 31.0, 50.0, 64.0, 90.0])
+    # 31 and 64 start pieces of at least 30 s; 90 would leave a 10 s tail
+    assert [offset for offset, _ in pieces] == [0.0, 31.0, 64.0]
+    assert sum(len(samples) for _, samples in pieces) == len(audio)
+
+
+def test_split_audio_at_pauses():
+    audio = np.concatenate([_tone(31.5), np.zeros(int(0.4 * SAMPLE_RATE), dtype=np.float32), _tone(28.1)])
+    pieces = split_audio(audio, piece_seconds=30)
+    assert len(pieces) == 2
+    assert 31.5 <= pieces[1][0] <= 31.9
+
+
+class WorkingPool:
+    def submit(self, fn, samples, name, device, options):
+        class Done:
+            def result(self):
+                return [(0.5, 1.0, f"word{len(samples)}")]
+        return Done()
+
+
+def test_transcribe_words_offsets_pieces(monkeypatch):
+    monkeypatch.setattr(whisper_models, '_get_pool', lambda name, device, workers: WorkingPool())
+    audio = _tone(100)
+    words = transcribe_words(audio, "tiny.en", boundaries=[31.0, 64.0], workers=2)
+    assert [(start, end) for start, end, _ in words] == [(0.5, 1.0), (31.5, 32.0), (64.5, 65.0)]
+
+
+class BrokenPool:
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        class Broken:
+            def result(self):
+                raise BrokenProcessPool("A worker was killed")
+        return Broken()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_broken_pool_is_replaced(monkeypatch):
+    broken = BrokenPool()
+    pools = [broken, WorkingPool()]
+    monkeypatch.setattr(whisper_models, '_get_pool', lambda name, device, workers: pools.pop(0))
+
+    words = transcribe_words(_tone(100), "tiny.en", boundaries=[31.0, 64.0], workers=2)
+    assert len(words) == 3
+    assert broken.shut_down
+
+
+def test_falls_back_to_this_process_when_pools_keep_breaking(monkeypatch):
+    monkeypatch.setattr(whisper_models, '_get_pool', lambda name, device, workers: BrokenPool())
+    result = {'segments': [{'words': [{'start': 40.0, 'end': 40.5, 'word': ' hello'}]}]}
+    monkeypatch.setattr(whisper_models, 'transcribe', lambda audio, name, device, **options: result)
+
+    assert transcribe_words(_tone(100), "tiny.en", boundaries=[31.0, 64.0], workers=2) == [(40.0, 40.5, 'hello')]
@@ -8,5 +8,23 @@ def create_app():
     # Import and register blueprints
     from .routes import main_bp
     app.register_blueprint(main_bp)
+
+    # Renders run on a bounded background pool; /api/generate only enqueues them
+    from reddit_shorts.config import web_render_workers, web_max_pending_jobs
+    from reddit_shorts.main import run_local_video_generation
+    from .jobs import JobQueue
+    app.extensions['job_queue'] = JobQueue(run_local_video_generation, max_workers=web_render_workers, max_pending=web_max_pending_jobs)
+
+    # In throughput mode every render worker's encode gets an equal share of the cores
+    from reddit_shorts.config import encode_throughput
+    if encode_throughput:
+        from reddit_shorts.render_profiles import set_encode_budget
+        set_encode_budget(web_render_workers)
+
+    # Load the Whisper model off the request path so the first /api/generate doesn't pay for it
+    from reddit_shorts.config import whisper_warm_up_on_start
+    if whisper_warm_up_on_start:
+        from reddit_shorts.whisper_models import warm_up_whisper_model
+        warm_up_whisper_model(background=True)
     
     return app 
\ No newline at end of file
@@ -0,0 +1,84 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue already holds its maximum number of pending jobs."""
+
+
+class JobQueue:
+    """Runs render jobs on a bounded pool of background threads, so requests return immediately.
+
+    Jobs are tracked in memory: queued -> running -> done | failed. Finished jobs are kept
+    (newest `keep_finished`) so clients can poll for the result after the render completes."""
+
+    def __init__(self, render, max_workers: int = 2, max_pending: int = 20, keep_finished: int = 200):
+        self._render = render
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="render-job")
+        self._max_pending = max_pending
+        self._keep_finished = keep_finished
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, params: dict, render=None, **extra) -> dict:
+        """Queues a render of `params` and returns the new job's status. Extra fields are stored on the job as-is.
+        `render` overrides the queue's render callable for this job (e.g. to promote a draft)."""
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if pending >= self._max_pending:
+                raise QueueFull(f"{pending} jobs are already queued or running")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'video_path': None,
+                'error': None,
+                **extra,
+            }
+            self._prune()
+        self._executor.submit(self._run, job_id, params, render or self._render)
+        return self.get(job_id)
+
+    def counts(self) -> dict:
+        """Number of tracked jobs per status."""
+        with self._lock:
+            counts = {status: 0 for status in ('queued', 'running', 'done', 'failed')}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, params: dict, render) -> None:
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            video_path = render(**params)
+            if video_path:
+                self._update(job_id, status='done', video_path=video_path, finished_at=time.time())
+            else:
+                self._update(job_id, status='failed', error="Video generation failed", finished_at=time.time())
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+
+    def _prune(self) -> None:
+        """Forgets the oldest finished jobs beyond keep_finished. Caller holds the lock."""
+        finished = [job for job in self._jobs.values() if job['status'] in ('done', 'failed')]
+        if len(finished) <= self._keep_finished:
+            return
+        finished.sort(key=lambda job: job['finished_at'] or 0)
+        for job in finished[:len(finished) - self._keep_finished]:
+            del self._jobs[job['id']]
@@ -1,8 +1,14 @@
 import os
-from flask import Blueprint, request, jsonify, send_file, send_from_directory
+from flask import Blueprint, Response, current_app, request, jsonify, send_file, send_from_directory, url_for
 from reddit_shorts.tiktok_voice.src.voice import Voice
-from reddit_shorts.main import run_local_video_generation
+from reddit_shorts.tiktok_voice.src.text_to_speech import endpoint_stats
 from reddit_shorts.config import footage, music
+from reddit_shorts.get_reddit_stories import build_story, check_bad_words
+from reddit_shorts.render_profiles import RENDER_PROFILES, DEFAULT_RENDER_PROFILE
+from .jobs import QueueFull
+from reddit_shorts.whisper_models import whisper_model_stats
+from reddit_shorts.stage_limits import stage_limits, stage_slots_in_use
+from reddit_shorts.tracing import render_prometheus
 
 # Set the static folder when creating the blueprint
 # It should be relative to the blueprint's root path.
@@ -168,43 +174,132 @@ def get_music():
         })
     return jsonify(tracks)
 
+@main_bp.route('/api/whisper', methods=['GET'])
+def get_whisper_models():
+    """Return load time and memory footprint of the resident Whisper models"""
+    return jsonify(whisper_model_stats())
+
+@main_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Pipeline span metrics, stage slot usage and job queue depth in the Prometheus text format"""
+    job_counts = current_app.extensions['job_queue'].counts()
+    gauges = {
+        'shorts_jobs': ("Render jobs tracked by the web queue, by status.", {(('status', status),): count for status, count in job_counts.items()}),
+        'shorts_stage_slots_in_use': ("Slots held per capped pipeline stage.", {(('stage', stage),): count for stage, count in stage_slots_in_use().items()}),
+        'shorts_stage_slots_limit': ("Configured slots per capped pipeline stage.", {(('stage', stage),): limit for stage, limit in stage_limits().items()}),
+    }
+    tts_endpoints = endpoint_stats()
+    gauges['shorts_tts_endpoint_latency_seconds'] = (
+        "Rolling latency of successful TTS requests, per endpoint.",
+        {(('endpoint', url),): round(stats['latency'], 4) for url, stats in tts_endpoints.items()}
+    )
+    gauges['shorts_tts_endpoint_error_rate'] = (
+        "Rolling share of failed TTS requests, per endpoint.",
+        {(('endpoint', url),): round(stats['errors'], 4) for url, stats in tts_endpoints.items()}
+    )
+    return Response(render_prometheus(gauges), mimetype='text/plain; version=0.0.4')
+
 @main_bp.route('/api/generate', methods=['POST'])
 def generate_video():
-    """Generate a video from the provided script and settings"""
-    data = request.json
-    
-    # Create a story entry in stories.txt format
-    story_content = f"""Title: {data['title']}
-Story:
-{data['story']}
-"""
-    
-    # Temporarily save the story
-    with open('stories.txt', 'w', encoding='utf-8') as f:
-        f.write(story_content)
-    
-    # Set up generation parameters
+    """Queue a video render from the provided script and settings; poll /api/jobs/<id> for the result"""
+    data = request.json or {}
+    if not data.get('title') or not data.get('story'):
+        return jsonify({"error": "Both 'title' and 'story' are required"}), 400
+    # Same bad word check stories from stories.txt go through
+    if check_bad_words(data['title']) or check_bad_words(data['story']):
+        return jsonify({"error": "The title or story contains words that aren't allowed"}), 400
+
+    profile = data.get('profile') or DEFAULT_RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        return jsonify({"error": f"Unknown profile '{profile}'. Choose one of: {', '.join(RENDER_PROFILES)}"}), 400
+
+    # The UI sends the footage file name; resolve it against the configured footage
+    background_video = data.get('background_video', None)
+    if background_video:
+        background_video = next((path for path in footage if os.path.basename(path) == background_video), background_video)
+
+    # Set up generation parameters. The story travels with the job instead of through stories.txt,
+    # so concurrent requests can't overwrite each other's story.
+    story = build_story(data['title'], data['story'])
     params = {
+        'story': story,
         'filter': data.get('filter', False),
         'voice': data.get('voice', 'en_us_002'),  # Default TikTok voice
-        'background_video': data.get('background_video', None),
-        'background_music': data.get('background_music', None)
+        'background_video': background_video,
+        'background_music': data.get('background_music', None),
+        'render_profile': profile,
+        # Drafts keep their TTS tracks and subtitles so /api/jobs/<id>/promote can re-render without them
+        'keep_artifacts': profile == 'draft',
     }
-    
+    if 'subtitles' in data:
+        params['subtitles'] = bool(data['subtitles'])
+
     try:
-        # Generate the video
-        video_path = run_local_video_generation(**params)
-        
-        if video_path and os.path.exists(video_path):
-            # Return the video file
-            return send_file(
-                video_path,
-                mimetype='video/mp4',
-                as_attachment=True,
-                download_name=os.path.basename(video_path)
-            )
-        else:
-            return jsonify({"error": "Video generation failed"}), 500
-            
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        job = current_app.extensions['job_queue'].submit(params, story_id=story['id'], profile=profile)
+    except QueueFull as e:
+        return jsonify({"error": f"Render queue is full ({e}). Try again later."}), 503
+
+    return jsonify(_job_response(job)), 202, {'Location': url_for('main.get_job', job_id=job['id'])}
+
+def _job_response(job: dict) -> dict:
+    response = {
+        "job_id": job['id'],
+        "status": job['status'],
+        "created_at": job['created_at'],
+        "started_at": job['started_at'],
+        "finished_at": job['finished_at'],
+        "status_url": url_for('main.get_job', job_id=job['id']),
+        "profile": job.get('profile'),
+    }
+    if job['status'] == 'done':
+        response["video_url"] = url_for('main.get_job_video', job_id=job['id'])
+        if job.get('profile') == 'draft':
+            response["promote_url"] = url_for('main.promote_job', job_id=job['id'])
+    if job['error']:
+        response["error"] = job['error']
+    return response
+
+@main_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status of a render job"""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(_job_response(job))
+
+@main_bp.route('/api/jobs/<job_id>/video', methods=['GET'])
+def get_job_video(job_id):
+    """Download the video rendered by a finished job"""
+    job = current_app.extensions['job_queue'].get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] != 'done' or not job['video_path'] or not os.path.exists(job['video_path']):
+        return jsonify({"error": f"Video not available (job is {job['status']})"}), 409
+    return send_file(
+        job['video_path'],
+        mimetype='video/mp4',
+        as_attachment=True,
+        download_name=os.path.basename(job['video_path'])
+    )
+
+@main_bp.route('/api/jobs/<job_id>/promote', methods=['POST'])
+def promote_job(job_id):
+    """Queue a full-quality render of a finished draft, reusing its TTS, subtitles, footage segment and music"""
+    from reddit_shorts.main import run_promote_render
+    job = current_app.extensions['job_queue'].get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] != 'done' or job.get('profile') != 'draft':
+        return jsonify({"error": "Only finished draft renders can be promoted"}), 409
+
+    try:
+        promoted = current_app.extensions['job_queue'].submit(
+            {'story_id': job['story_id']},
+            render=run_promote_render,
+            story_id=job['story_id'],
+            profile=DEFAULT_RENDER_PROFILE
+        )
+    except QueueFull as e:
+        return jsonify({"error": f"Render queue is full ({e}). Try again later."}), 503
+
+    return jsonify(_job_response(promoted)), 202, {'Location': url_for('main.get_job', job_id=promoted['id'])}